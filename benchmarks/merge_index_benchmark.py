@@ -0,0 +1,110 @@
+"""
+Benchmarks joining dbt models with Tableau tables through dbt_tableau.merge_index.mergeIndex
+against the nested loop previously used by dbt_tabcatalog.merge_dbt_tableau_tables.
+
+Usage: python benchmarks/merge_index_benchmark.py [--tables 100000] [--models 20000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dbt_tableau.merge_index import mergeIndex
+
+DATABASES=["PRODUCTION", "ANALYTICS", "FINANCE", "MARKETING", "RAW"]
+SCHEMAS_PER_DATABASE=20
+ACCOUNT="xy12345.eu-west-1"
+
+def make_models(model_count: int) -> list:
+    models = []
+    for i in range(model_count):
+        database = DATABASES[i % len(DATABASES)]
+        schema = f"SCHEMA_{i % SCHEMAS_PER_DATABASE}"
+        models.append({
+            "uniqueId": f"model.project.model_{i}",
+            "projectId": 1,
+            "database": database.lower(),
+            "schema": schema.lower(),
+            "name": f"model_{i}",
+            "alias": f"table_{i}",
+            "description": f"Model {i}"
+        })
+    return models
+
+def make_tables(table_count: int, model_count: int, seed: int = 42) -> list:
+    # Half of the tables are built by a dbt model, using every fullName format Tableau reports
+    rng = random.Random(seed)
+    tables = []
+    for i in range(table_count):
+        model_number = rng.randrange(model_count) if i % 2 == 0 else model_count + i
+        database = DATABASES[model_number % len(DATABASES)]
+        schema = f"SCHEMA_{model_number % SCHEMAS_PER_DATABASE}"
+        name = f"TABLE_{model_number}"
+        full_name = [
+            f"[{database}].[{schema}].[{name}]",
+            f'"{database}"."{schema}"."{name}"',
+            f"{database}.{schema}.{name}",
+            f"[{schema}].[{name}]",
+            name
+        ][i % 5]
+        tables.append({
+            "luid": f"luid-{i}",
+            "name": name,
+            "schema": schema,
+            "fullName": full_name,
+            "databaseName": database,
+            "hostName": f"{ACCOUNT}.snowflakecomputing.com"
+        })
+    return tables
+
+def nested_loop_merge(tables: list, models: list) -> int:
+    merged_count = 0
+    for table in tables:
+        for model in models:
+            if (
+                model["alias"].lower() == table["name"].lower()
+                and model["schema"].lower() == table["schema"].lower()
+                and model["database"].lower() == table["databaseName"].lower()
+            ):
+                merged_count += 1
+                break
+    return merged_count
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tables", type=int, default=100000)
+    parser.add_argument("--models", type=int, default=20000)
+    parser.add_argument(
+        "--nested-loop-sample",
+        type=int,
+        default=500,
+        help="number of tables joined with the nested loop, extrapolated to --tables"
+    )
+    args = parser.parse_args()
+
+    models = make_models(args.models)
+    tables = make_tables(args.tables, args.models)
+
+    start = time.perf_counter()
+    index = mergeIndex(models, accounts_by_project={"1": ACCOUNT})
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    merged_count = sum(1 for _ in index.merge_tables(tables))
+    merge_seconds = time.perf_counter() - start
+
+    sample = tables[:args.nested_loop_sample]
+    start = time.perf_counter()
+    nested_loop_merge(sample, models)
+    nested_loop_seconds = (time.perf_counter() - start) * args.tables / max(len(sample), 1)
+
+    print(f"tables: {args.tables}, models: {args.models}, merged: {merged_count}")
+    print(f"mergeIndex build:        {build_seconds:8.3f}s")
+    print(f"mergeIndex merge:        {merge_seconds:8.3f}s")
+    print(f"nested loop (estimated): {nested_loop_seconds:8.3f}s")
+
+if __name__ == "__main__":
+    main()
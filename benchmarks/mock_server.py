@@ -0,0 +1,509 @@
+"""
+Local stand-in for the Tableau REST/Metadata API and the dbt Discovery API, serving a
+synthetic catalog so syncs can be benchmarked without a production site.
+
+Serves the endpoints used by tableauClient and dbt_metadata_api: signin, metadata
+GraphQL (the queries of tableauClient), table and column PUTs, tags and
+dataQualityWarnings, and the dbt models(jobId[, runId]) and environment applied models queries.
+GET /__stats returns request counts per endpoint family, POST /__reset clears them.
+The dbt Cloud runs endpoint lists the finished runs of the job; POST /__run finishes
+a new run, which builds every tenth model (see syntheticCatalog.models).
+
+Usage: python benchmarks/mock_server.py --tables 10000 --columns 10 --workbooks 500 [--port 0]
+The first line printed is the base URL the server listens on.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Path of the dbt Discovery API on the mock server
+DBT_GRAPHQL_PATH="/dbt/graphql"
+MOCK_SITE_ID="mock-site-id"
+MOCK_TOKEN_PREFIX="mock-token-"
+
+class syntheticCatalog:
+    """
+    Deterministic catalog of N tables x M columns x W workbooks and the dbt models
+    building them. Tables and columns are generated from their index when they are
+    requested, so even large catalogs only keep published changes in memory.
+    args:
+        match_ratio: share of Tableau tables built by a dbt model.
+        unchanged_ratio: share of matched tables whose descriptions Tableau already holds.
+    """
+    def __init__(
+        self,
+        tables: int,
+        columns: int = 10,
+        workbooks: int = 100,
+        databases: int = 1,
+        match_ratio: float = 1.0,
+        unchanged_ratio: float = 0.0,
+        job_id: int = 1,
+        environment_id: int = 1
+    ):
+        self.table_count=tables
+        self.column_count=columns
+        self.workbook_count=workbooks
+        self.databases=["PRODUCTION"] + [f"DATABASE_{i}" for i in range(1, databases)]
+        self.match_ratio=match_ratio
+        self.unchanged_ratio=unchanged_ratio
+        self.job_id=job_id
+        self.environment_id=environment_id
+        # Descriptions published to the mock server, keyed by luid
+        self.descriptions={}
+        self.data_quality_warnings={}
+        # Finished runs of the job, the first one built every model
+        self.runs=[]
+        self._lock=threading.Lock()
+        self.add_run()
+
+    def database_tables(self, database_index: int) -> range:
+        return range(database_index, self.table_count, len(self.databases))
+
+    def is_matched(self, table_index: int) -> bool:
+        return (table_index * 7919 % 1000) < self.match_ratio * 1000
+
+    def is_unchanged(self, table_index: int) -> bool:
+        return (table_index * 104729 % 1000) < self.unchanged_ratio * 1000
+
+    def dbt_table_description(self, table_index: int) -> str:
+        return f"dbt documentation of table {table_index}"
+
+    def dbt_column_description(self, table_index: int, column_index: int) -> str:
+        return f"dbt documentation of column {column_index} of table {table_index}"
+
+    def table(self, table_index: int) -> dict:
+        luid = f"table-{table_index}"
+        initial = self.dbt_table_description(table_index) if self.is_unchanged(table_index) else ""
+        return {
+            "name": f"TABLE_{table_index}",
+            "schema": f"SCHEMA_{table_index % 50}",
+            "id": f"table-id-{table_index}",
+            "luid": luid,
+            "fullName": f"[{self.databases[table_index % len(self.databases)]}].[SCHEMA_{table_index % 50}].[TABLE_{table_index}]",
+            "tableauDescription": self.descriptions.get(luid, initial),
+            "description": self.descriptions.get(luid, initial)
+        }
+
+    def columns(self, table_index: int) -> list:
+        unchanged = self.is_unchanged(table_index)
+        columns = []
+        for column_index in range(self.column_count):
+            luid = f"column-{table_index}-{column_index}"
+            initial = self.dbt_column_description(table_index, column_index) if unchanged else ""
+            columns.append({
+                "name": f"COLUMN_{column_index}",
+                "id": f"column-id-{table_index}-{column_index}",
+                "luid": luid,
+                "description": self.descriptions.get(luid, initial),
+                "remoteType": "STR",
+                "isNullable": True
+            })
+        return columns
+
+    def workbooks(self, table_index: int) -> list:
+        if self.workbook_count == 0:
+            return []
+        workbook_index = table_index % self.workbook_count
+        # Every workbook reads the tables sharing its index modulo the workbook count
+        upstream_tables = [
+            {"id": f"table-id-{i}", "luid": f"table-{i}", "name": f"TABLE_{i}"}
+            for i in range(workbook_index, min(self.table_count, workbook_index + 5 * self.workbook_count), self.workbook_count)
+        ]
+        return [{
+            "id": f"workbook-id-{workbook_index}",
+            "luid": f"workbook-{workbook_index}",
+            "name": f"Workbook {workbook_index}",
+            "description": "",
+            "projectName": "Benchmarks",
+            "vizportalUrlId": str(workbook_index),
+            "tags": [],
+            "owner": {"id": "owner", "name": "Owner", "username": "owner@example.com"},
+            "upstreamTables": upstream_tables
+        }]
+
+    def model(self, table_index: int) -> dict:
+        return {
+            "uniqueId": f"model.benchmarks.table_{table_index}",
+            "packageName": "benchmarks",
+            "runId": 1,
+            "accountId": 1,
+            "projectId": 1,
+            "environmentId": self.environment_id,
+            "jobId": self.job_id,
+            "executionTime": 1.0,
+            "status": "success",
+            "executeCompletedAt": "2024-01-01T00:00:00.000Z",
+            "database": self.databases[table_index % len(self.databases)].lower(),
+            "schema": f"schema_{table_index % 50}",
+            "name": f"table_{table_index}",
+            "alias": f"table_{table_index}",
+            "description": self.dbt_table_description(table_index),
+            "meta": {},
+            "stats": [],
+            "columns": [
+                {"name": f"column_{i}", "description": self.dbt_column_description(table_index, i)}
+                for i in range(self.column_count)
+            ]
+        }
+
+    def models(self, run_id: int = None) -> list:
+        """
+        Returns the models of the latest run, or the models built by run_id: run R
+        builds every tenth model starting at R % 10, as a selective job run would.
+        """
+        if run_id is None:
+            return [self.model(i) for i in range(self.table_count) if self.is_matched(i)]
+        models = []
+        for i in range(run_id % 10, self.table_count, 10):
+            if self.is_matched(i):
+                model = self.model(i)
+                model["runId"] = run_id
+                models.append(model)
+        return models
+
+    def add_run(self) -> dict:
+        """
+        Finishes a new run of the job, building the models returned by models(run_id).
+        """
+        with self._lock:
+            run = {
+                "id": len(self.runs) + 1,
+                "job_definition_id": self.job_id,
+                "environment_id": self.environment_id,
+                "status": 10,
+                "status_humanized": "Success",
+                "is_complete": True,
+                "finished_at": time.strftime("%Y-%m-%d %H:%M:%S.000000+00:00", time.gmtime())
+            }
+            self.runs.append(run)
+        return run
+
+    def publish_description(self, luid: str, description: str):
+        with self._lock:
+            self.descriptions[luid] = description
+
+def _page(items: list, first: int, after) -> dict:
+    offset = int(after) if after else 0
+    nodes = items[offset:offset + first]
+    end = offset + len(nodes)
+    return {
+        "nodes": nodes,
+        "pageInfo": {"hasNextPage": end < len(items), "endCursor": str(end)}
+    }
+
+def _table_index(luid: str) -> int:
+    return int(luid.rsplit("-", 1)[1])
+
+class mockHandler(BaseHTTPRequestHandler):
+    """
+    Request handler of the mock server. The catalog, options and counters live on
+    the server instance.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body, content_type: str = "application/json", headers: dict = None):
+        if not isinstance(body, (bytes, str)):
+            body = json.dumps(body)
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _handle(self):
+        server = self.server
+        path = urlsplit(self.path).path
+        body = self._read_body()
+        if path == "/__stats":
+            return self._send(200, server.stats())
+        if path == "/__reset":
+            server.reset_stats()
+            return self._send(200, {})
+        if path == "/__run":
+            return self._send(200, server.catalog.add_run())
+
+        family = server.endpoint_family(self.command, path, body)
+        server.count(family)
+        if server.latency:
+            time.sleep(max(0.0, random.gauss(server.latency, server.latency * 0.2)))
+        if server.throttled():
+            server.count("throttled")
+            return self._send(429, {"error": "throttled"}, headers={"Retry-After": "1"})
+        if server.failure_rate and random.random() < server.failure_rate:
+            server.count("failed")
+            return self._send(500, {"error": "injected failure"})
+
+        handler = getattr(self, "_" + family, None)
+        if handler is None:
+            return self._send(404, {"error": f"unsupported endpoint {self.command} {path}"})
+        return handler(path, body)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+    def _signin(self, path, body):
+        if not self.server.signed_in_tokens:
+            self.server.signed_in_tokens = 0
+        self.server.signed_in_tokens += 1
+        return self._send(200, {"credentials": {
+            "token": f"{MOCK_TOKEN_PREFIX}{self.server.signed_in_tokens}",
+            "site": {"id": MOCK_SITE_ID, "contentUrl": "mock"},
+            "user": {"id": "mock-user"},
+            "estimatedTimeToExpiration": "4:00:00"
+        }})
+
+    def _metadata_graphql(self, path, body):
+        catalog = self.server.catalog
+        request = json.loads(body or b"{}")
+        variables = request.get("variables") or {}
+        operation = re.search(r"query\s+(\w+)", request.get("query", ""))
+        operation = operation.group(1) if operation else ""
+
+        if operation == "getDatabasesPage":
+            names = (variables.get("filter") or {}).get("nameWithin")
+            databases = [
+                {"name": name, "id": f"database-{i}"}
+                for i, name in enumerate(catalog.databases) if not names or name in names
+            ]
+            data = {"databasesConnection": _page(databases, variables["first"], variables.get("after"))}
+        elif operation == "getDatabaseTablesPage":
+            database_index = _table_index(variables["id"])
+            table_indexes = catalog.database_tables(database_index)
+            names = (variables.get("tableFilter") or {}).get("nameWithin")
+            if names:
+                named = {int(name[len("TABLE_"):]) for name in names if re.fullmatch(r"TABLE_\d+", name)}
+                table_indexes = [i for i in table_indexes if i in named]
+            offset = int(variables.get("after") or 0)
+            page = table_indexes[offset:offset + variables["first"]]
+            end = offset + len(page)
+            data = {"databases": [{"tablesConnection": {
+                "nodes": [catalog.table(i) for i in page],
+                "pageInfo": {"hasNextPage": end < len(table_indexes), "endCursor": str(end)}
+            }}]}
+        elif operation == "getColumnsForTables":
+            data = {"databaseTables": [
+                {"luid": luid, "columnsConnection": _page(catalog.columns(_table_index(luid)), variables["first"], None)}
+                for luid in variables["luids"]
+            ]}
+        elif operation == "getColumnsPage":
+            luid = variables["luid"]
+            data = {"databaseTables": [{"columnsConnection": _page(
+                catalog.columns(_table_index(luid)), variables["first"], variables.get("after")
+            )}]}
+        elif operation == "getDownstreamWorkbooksForTables":
+            data = {"databaseTables": [
+                {"luid": luid, "downstreamWorkbooks": catalog.workbooks(_table_index(luid))}
+                for luid in variables["luids"]
+            ]}
+        else:
+            return self._send(200, {"errors": [{"message": f"unsupported query {operation}"}]})
+        return self._send(200, {"data": data})
+
+    def _dbt_graphql(self, path, body):
+        catalog = self.server.catalog
+        request = json.loads(body or b"{}")
+        query = request.get("query", "")
+        if "getAppliedModels" in query:
+            variables = request.get("variables") or {}
+            models = catalog.models()
+            page = _page(models, variables.get("first") or 500, variables.get("after"))
+            edges = [{"node": {
+                "uniqueId": model["uniqueId"],
+                "packageName": model["packageName"],
+                "accountId": model["accountId"],
+                "projectId": model["projectId"],
+                "environmentId": model["environmentId"],
+                "database": model["database"],
+                "schema": model["schema"],
+                "name": model["name"],
+                "alias": model["alias"],
+                "description": model["description"],
+                "meta": model["meta"],
+                "executionInfo": {
+                    "lastRunId": model["runId"],
+                    "lastJobDefinitionId": model["jobId"],
+                    "lastRunStatus": model["status"],
+                    "executionTime": model["executionTime"],
+                    "executeCompletedAt": model["executeCompletedAt"]
+                },
+                "catalog": {"columns": model["columns"], "stats": model["stats"]}
+            }} for model in page["nodes"]]
+            return self._send(200, {"data": {"environment": {"applied": {"models": {
+                "edges": edges, "pageInfo": page["pageInfo"]
+            }}}}})
+        if "models(jobId" in query:
+            run_id = re.search(r"runId:\s*(\d+)", query)
+            return self._send(200, {"data": {"models": catalog.models(int(run_id.group(1)) if run_id else None)}})
+        return self._send(200, {"errors": [{"message": "unsupported dbt query"}]})
+
+    def _dbt_runs(self, path, body):
+        query = parse_qs(urlsplit(self.path).query)
+        limit = int(query.get("limit", ["100"])[0])
+        return self._send(200, {"data": list(reversed(self.server.catalog.runs))[:limit]})
+
+    def _table_update(self, path, body):
+        description = re.search(rb'description="([^"]*)"', body)
+        if description is not None:
+            self.server.catalog.publish_description(path.rsplit("/", 1)[1], description.group(1).decode("utf-8"))
+        return self._send(200, "<tsResponse/>", "application/xml")
+
+    _column_update = _table_update
+
+    def _tags(self, path, body):
+        return self._send(200, "<tsResponse><tags/></tsResponse>", "application/xml")
+
+    def _data_quality_warnings(self, path, body):
+        catalog = self.server.catalog
+        luid = path.rsplit("/", 1)[1]
+        if self.command == "GET":
+            warning = catalog.data_quality_warnings.get(luid)
+            warning_list = {"dataQualityWarning": [warning]} if warning else {}
+            return self._send(200, {"dataQualityWarningList": warning_list})
+        if self.command == "POST":
+            catalog.data_quality_warnings[luid] = {"id": f"warning-{luid}"}
+            return self._send(201, "<tsResponse/>", "application/xml")
+        if self.command == "DELETE":
+            catalog.data_quality_warnings.pop(luid.replace("warning-", "", 1), None)
+            return self._send(204, b"", "application/xml")
+        return self._send(200, "<tsResponse/>", "application/xml")
+
+class mockServer(ThreadingHTTPServer):
+    """
+    Threaded mock server with injectable latency, throttling and failures.
+    args:
+        latency: mean seconds added to every request.
+        max_requests_per_second: requests above this rate get a 429 with Retry-After.
+        failure_rate: share of requests answered with a 500.
+    """
+    daemon_threads = True
+    request_queue_size = 512
+
+    def __init__(
+        self,
+        address,
+        catalog: syntheticCatalog,
+        latency: float = 0.0,
+        max_requests_per_second: float = 0.0,
+        failure_rate: float = 0.0
+    ):
+        super().__init__(address, mockHandler)
+        self.catalog=catalog
+        self.latency=latency
+        self.max_requests_per_second=max_requests_per_second
+        self.failure_rate=failure_rate
+        self.signed_in_tokens=0
+        self._counts=Counter()
+        self._lock=threading.Lock()
+        self._window_start=time.monotonic()
+        self._window_requests=0
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def endpoint_family(self, method: str, path: str, body: bytes) -> str:
+        if path == DBT_GRAPHQL_PATH:
+            return "dbt_graphql"
+        if path.endswith("/auth/signin"):
+            return "signin"
+        if path.startswith("/api/v2/accounts/") and path.rstrip("/").endswith("/runs"):
+            return "dbt_runs"
+        if path.endswith("/api/metadata/graphql"):
+            return "metadata_graphql"
+        if "/dataQualityWarnings/" in path:
+            return "data_quality_warnings"
+        if path.endswith("/tags"):
+            return "tags"
+        if "/columns/" in path:
+            return "column_update"
+        if "/tables/" in path:
+            return "table_update"
+        return "unknown"
+
+    def count(self, family: str):
+        with self._lock:
+            self._counts[family] += 1
+
+    def throttled(self) -> bool:
+        if not self.max_requests_per_second:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= 1.0:
+                self._window_start = now
+                self._window_requests = 0
+            self._window_requests += 1
+            return self._window_requests > self.max_requests_per_second
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+        counts["total"] = sum(
+            count for family, count in counts.items() if family not in ("throttled", "failed")
+        )
+        return counts
+
+    def reset_stats(self):
+        with self._lock:
+            self._counts.clear()
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Mock Tableau and dbt Discovery API server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--tables", type=int, default=1000)
+    parser.add_argument("--columns", type=int, default=10)
+    parser.add_argument("--workbooks", type=int, default=100)
+    parser.add_argument("--databases", type=int, default=1)
+    parser.add_argument("--match-ratio", type=float, default=1.0)
+    parser.add_argument("--unchanged-ratio", type=float, default=0.0)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--max-requests-per-second", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    catalog = syntheticCatalog(
+        args.tables,
+        args.columns,
+        args.workbooks,
+        args.databases,
+        args.match_ratio,
+        args.unchanged_ratio
+    )
+    server = mockServer(
+        (args.host, args.port),
+        catalog,
+        args.latency_ms / 1000,
+        args.max_requests_per_second,
+        args.failure_rate
+    )
+    print(server.base_url, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Measures the memory held by the dbt models, Tableau tables, merged tables and merged
+columns of a sync on the synthetic catalog of benchmarks/mock_server.py, stored as
+the dicts returned by the APIs (as the sync used to) and as the slotted records of
+dbt_tableau.records.
+
+Usage: python benchmarks/record_memory_benchmark.py [--tables 20000] [--columns 10]
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+from collections import defaultdict
+from operator import itemgetter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dbt_tableau.merge_index import mergeIndex
+from dbt_tableau.records import modelRecord, tableRecord
+from dbt_tableau.tableau import tableauClient
+from mock_server import syntheticCatalog
+
+def held_bytes(build):
+    """
+    Returns what build() returns and the bytes it still holds once built.
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+def dict_merge_tables(index: mergeIndex, tables: list) -> list:
+    # Previous mergeIndex.merge_tables: a copy of the table updated with the model
+    merged_tables = []
+    for table in tables:
+        model = index.match_table(table)
+        if model is not None:
+            merged_entry = table.copy()
+            merged_entry.update(model)
+            merged_tables.append(merged_entry)
+    return merged_tables
+
+def dict_merge_columns(merged_table: dict, tableau_columns: list) -> list:
+    # Previous tableauClient.merge_column_metadata
+    column_map = defaultdict(dict)
+    tableau_descriptions = {elem.get("name", "").upper(): elem.get("description") for elem in tableau_columns}
+    for columns in (tableau_columns, merged_table["columns"]):
+        for elem in columns:
+            column_map[elem.get("name", "").upper()].update(elem)
+    for name, description in tableau_descriptions.items():
+        column_map[name]["tableauDescription"] = description
+    return sorted(column_map.values(), key=itemgetter("name"))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tables", type=int, default=20000)
+    parser.add_argument("--columns", type=int, default=10)
+    args = parser.parse_args()
+
+    catalog = syntheticCatalog(args.tables, args.columns)
+    # Serialized like the API responses, so every variant parses its own strings
+    models_json = json.dumps([catalog.model(i) for i in range(args.tables)])
+    tables_json = json.dumps([dict(catalog.table(i), databaseName="PRODUCTION") for i in range(args.tables)])
+    columns_json = json.dumps([catalog.columns(i) for i in range(args.tables)])
+    tableau_client = tableauClient.__new__(tableauClient)
+
+    results = []
+    for variant in ("dict", "record"):
+        if variant == "dict":
+            models, models_bytes = held_bytes(lambda: json.loads(models_json))
+            tables, tables_bytes = held_bytes(lambda: json.loads(tables_json))
+        else:
+            models, models_bytes = held_bytes(lambda: [modelRecord(model) for model in json.loads(models_json)])
+            tables, tables_bytes = held_bytes(lambda: [tableRecord(table) for table in json.loads(tables_json)])
+        index = mergeIndex(models)
+        if variant == "dict":
+            merged_tables, merged_bytes = held_bytes(lambda: dict_merge_tables(index, tables))
+        else:
+            merged_tables, merged_bytes = held_bytes(lambda: list(index.merge_tables(tables)))
+        tableau_columns = json.loads(columns_json)
+        merge_columns = dict_merge_columns if variant == "dict" else tableau_client.merge_column_metadata
+        merged_columns, columns_bytes = held_bytes(lambda: [
+            merge_columns(merged_table, tableau_columns[i]) for i, merged_table in enumerate(merged_tables)
+        ])
+        results.append((variant, models_bytes, tables_bytes, merged_bytes, columns_bytes))
+        del models, tables, index, merged_tables, tableau_columns, merged_columns
+
+    print(f"tables: {args.tables}, columns per table: {args.columns}")
+    print(f"{'':8}{'models':>12}{'tables':>12}{'merged':>12}{'columns':>12}{'total':>12}")
+    for variant, *sizes in results:
+        print(f"{variant:8}" + "".join(f"{size / 1024 / 1024:10.1f}MB" for size in sizes + [sum(sizes)]))
+
+if __name__ == "__main__":
+    main()
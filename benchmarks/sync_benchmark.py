@@ -0,0 +1,135 @@
+"""
+Runs main.py against benchmarks/mock_server.py at increasing catalog sizes and
+reports wall time, HTTP request count and peak memory of each sync.
+
+Usage: python benchmarks/sync_benchmark.py [--sizes 1000,10000,100000] [--columns 10] [--latency-ms 0]
+
+Each size gets a fresh mock server, so the first run publishes every description
+(a cold sync). --unchanged-ratio simulates the steady state of a site where most
+descriptions are already up to date.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+REPO_ROOT=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MOCK_SERVER_PATH=os.path.join(REPO_ROOT, "benchmarks", "mock_server.py")
+MAIN_PATH=os.path.join(REPO_ROOT, "main.py")
+
+def start_mock_server(args: argparse.Namespace, tables: int):
+    """
+    Starts the mock server in a subprocess and returns it with its base URL.
+    """
+    process = subprocess.Popen(
+        [
+            sys.executable, MOCK_SERVER_PATH,
+            "--tables", str(tables),
+            "--columns", str(args.columns),
+            "--workbooks", str(max(1, tables // args.tables_per_workbook)),
+            "--unchanged-ratio", str(args.unchanged_ratio),
+            "--latency-ms", str(args.latency_ms),
+            "--max-requests-per-second", str(args.max_requests_per_second),
+            "--failure-rate", str(args.failure_rate)
+        ],
+        stdout=subprocess.PIPE,
+        text=True
+    )
+    base_url = process.stdout.readline().strip()
+    if not base_url:
+        process.kill()
+        raise RuntimeError("Mock server did not start")
+    return process, base_url
+
+def get_stats(base_url: str) -> dict:
+    with urllib.request.urlopen(f"{base_url}/__stats", timeout=30) as response:
+        return json.load(response)
+
+def run_sync(args: argparse.Namespace, base_url: str, log_path: str) -> dict:
+    """
+    Runs main.py against the mock server and returns its exit code, wall time and peak RSS.
+    """
+    env = dict(
+        os.environ,
+        TABLEAU_SERVER=base_url,
+        TABLEAU_SITE="mock",
+        TABLEAU_PAT_NAME="benchmark",
+        TABLEAU_PAT="benchmark",
+        TABLEAU_DATABASES="PRODUCTION",
+        TABLEAU_MAX_CONCURRENCY=str(args.concurrency),
+        METADATA_API_URL=f"{base_url}/dbt/graphql",
+        DBT_API_PAT="benchmark",
+        DBT_JOB_ID="1",
+        PYTHONPATH=REPO_ROOT
+    )
+    # Settings of a local .env must not leak into the benchmark
+    for name in ("DBT_ENVIRONMENT_ID", "SYNC_STATE_PATH", "TABLEAU_TOKEN_CACHE_PATH"):
+        env.pop(name, None)
+    if args.environment:
+        env["DBT_ENVIRONMENT_ID"] = "1"
+
+    with open(log_path, "w") as log_file:
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, MAIN_PATH], cwd=REPO_ROOT, env=env, stdout=log_file, stderr=subprocess.STDOUT
+        )
+        _, status, usage = os.wait4(process.pid, 0)
+        wall_seconds = time.perf_counter() - start
+    return {
+        "exit_code": os.waitstatus_to_exitcode(status),
+        "wall_seconds": round(wall_seconds, 2),
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        "peak_rss_mb": round(usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    }
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark main.py against the mock Tableau server.")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma separated table counts")
+    parser.add_argument("--columns", type=int, default=10, help="columns per table")
+    parser.add_argument("--tables-per-workbook", type=int, default=20)
+    parser.add_argument("--unchanged-ratio", type=float, default=0.0)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latency added to each mock request")
+    parser.add_argument("--max-requests-per-second", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=16, help="TABLEAU_MAX_CONCURRENCY of the sync")
+    parser.add_argument("--environment", action="store_true", help="load models with DBT_ENVIRONMENT_ID")
+    parser.add_argument("--json", help="also write the results to this JSON file")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    log_directory = tempfile.mkdtemp(prefix="sync_benchmark_")
+    results = []
+    print(f"{'tables':>8} {'columns':>8} {'wall s':>9} {'requests':>9} {'peak MB':>8} {'exit':>5}")
+    for tables in (int(size) for size in args.sizes.split(",")):
+        server, base_url = start_mock_server(args, tables)
+        try:
+            log_path = os.path.join(log_directory, f"main_{tables}.log")
+            result = run_sync(args, base_url, log_path)
+            stats = get_stats(base_url)
+        finally:
+            server.terminate()
+            server.wait()
+        result.update({
+            "tables": tables,
+            "columns": tables * args.columns,
+            "requests": stats.get("total", 0),
+            "requests_by_endpoint": stats,
+            "log": log_path
+        })
+        results.append(result)
+        print(
+            f"{tables:>8} {result['columns']:>8} {result['wall_seconds']:>9} "
+            f"{result['requests']:>9} {result['peak_rss_mb']:>8} {result['exit_code']:>5}"
+        )
+    print(f"Logs written to {log_directory}")
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(results, json_file, indent=1)
+
+if __name__ == "__main__":
+    main()
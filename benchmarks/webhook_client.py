@@ -0,0 +1,96 @@
+"""
+Posts sample dbt Cloud "job run completed" webhooks to a local listener
+(python main.py --listen), signed like dbt Cloud signs them.
+
+Usage:
+    python benchmarks/webhook_client.py --secret s3cret --job-id 1 --run-id 101
+    python benchmarks/webhook_client.py --secret s3cret --runs 20 --duplicates 1
+    python benchmarks/webhook_client.py --secret wrong --run-id 101   # expect 401
+
+--runs N posts N runs at once (run ids run-id .. run-id + N - 1), as a burst
+of jobs finishing together would. --duplicates D delivers each run D more
+times, as dbt Cloud does when a delivery timed out.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dbt_tableau.webhooks import sign_payload, EVENT_RUN_COMPLETED, DEFAULT_WEBHOOK_PATH
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Post sample dbt Cloud webhooks to a local listener.")
+    parser.add_argument("--url", default=f"http://127.0.0.1:8080{DEFAULT_WEBHOOK_PATH}", help="webhook endpoint")
+    parser.add_argument("--secret", default=os.getenv("DBT_WEBHOOK_SECRET"), help="webhook secret (default: DBT_WEBHOOK_SECRET)")
+    parser.add_argument("--job-id", type=int, default=1)
+    parser.add_argument("--environment-id", type=int, default=1)
+    parser.add_argument("--run-id", type=int, default=1, help="id of the first run")
+    parser.add_argument("--runs", type=int, default=1, help="number of runs posted at once")
+    parser.add_argument("--duplicates", type=int, default=0, help="extra deliveries of every run")
+    parser.add_argument("--status", default="Success", help="runStatus of the runs")
+    args = parser.parse_args()
+    if not args.secret:
+        parser.error("--secret or DBT_WEBHOOK_SECRET is required")
+    return args
+
+def run_completed_payload(job_id: int, run_id: int, environment_id: int, status: str) -> dict:
+    """
+    Returns a "job run completed" payload shaped like the ones dbt Cloud sends.
+    """
+    now = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+    return {
+        "accountId": 1,
+        "webhookId": "wsu_mock",
+        "eventId": f"wev_{uuid.uuid4().hex}",
+        "timestamp": now,
+        "eventType": EVENT_RUN_COMPLETED,
+        "webhookName": "tableau catalog",
+        "data": {
+            "jobId": str(job_id),
+            "jobName": f"Job {job_id}",
+            "runId": str(run_id),
+            "environmentId": str(environment_id),
+            "environmentName": "Production",
+            "runStatus": status,
+            "runStatusCode": 10 if status == "Success" else 20,
+            "runStatusMessage": "None",
+            "runReason": "Triggered by webhook_client",
+            "runStartedAt": now,
+            "runFinishedAt": now
+        }
+    }
+
+def post(url: str, secret: str, payload: dict) -> int:
+    body = json.dumps(payload).encode("utf-8")
+    response = requests.post(
+        url,
+        data=body,
+        headers={"Content-Type": "application/json", "Authorization": sign_payload(secret, body)},
+        timeout=30
+    )
+    return response.status_code
+
+def main():
+    args = parse_args()
+    payloads = [
+        run_completed_payload(args.job_id, args.run_id + i, args.environment_id, args.status)
+        for i in range(args.runs)
+    ]
+    payloads = [payload for payload in payloads for _ in range(1 + args.duplicates)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(32, len(payloads))) as executor:
+        statuses = list(executor.map(lambda payload: post(args.url, args.secret, payload), payloads))
+    for payload, status in zip(payloads, statuses):
+        print(f"run {payload['data']['runId']}: HTTP {status}")
+    print(f"posted {len(payloads)} webhooks in {time.perf_counter() - start:.2f}s")
+    sys.exit(0 if all(status == 200 for status in statuses) else 1)
+
+if __name__ == "__main__":
+    main()
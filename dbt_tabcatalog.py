@@ -1,15 +1,33 @@
 from datetime import datetime
+import sys
+import argparse
 import json
 import yaml
 from yaml.loader import SafeLoader
 from operator import itemgetter
 from collections import defaultdict
-import requests
-from itertools import groupby
+from concurrent.futures import ThreadPoolExecutor
 import base64
+from dbt_tableau.http_session import create_session
+from dbt_tableau.retry import retryPolicy
+from dbt_tableau.credentials import credentialManager
+from dbt_tableau.sync_state import syncStateStore, ASPECT_DESCRIPTION, ASPECT_CERTIFICATION, ASPECT_DQ_WARNING, ASPECT_TAGS
+from dbt_tableau.dbt_metadata_api import filter_models_since_watermarks, latest_models
+from dbt_tableau.merge_index import mergeIndex
+from dbt_tableau.records import modelRecord, tableRecord, columnRecord
+from dbt_tableau.workbook_registry import workbookRegistry
+from dbt_tableau.tableau import tableauClient
+from dbt_tableau.tracing import spanTracer
+from dbt_tableau.run_journal import runJournal, dbt_runs_key, JOURNAL_TABLE_DESCRIPTION, JOURNAL_TABLE_DQ_WARNING, JOURNAL_TABLE_CERTIFICATION, JOURNAL_TABLE_TAGS, JOURNAL_COLUMN_DESCRIPTIONS, JOURNAL_COLUMN_TAGS
+from dbt_tableau.sharding import parse_shard, shard_tables, shard_path, shard_workbooks_path, write_shard_workbooks, read_shard_workbooks
+from dbt_tableau.sync_plan import syncPlan, apply_plan, OP_TABLE_DESCRIPTION, OP_TABLE_CERTIFICATION, OP_TABLE_TAGS, OP_DQ_WARNING_CREATE, OP_DQ_WARNING_UPDATE, OP_DQ_WARNING_DELETE, OP_COLUMN_DESCRIPTION, OP_COLUMN_TAGS, OP_EXPOSURES_COMMIT
 CONFIG='settings.yml'
 tableau_API_VERSION='3.17'
 
+#pooled keep-alive http session shared by all dbt Cloud, tableau and github requests (throttled and failed idempotent requests are retried with backoff)
+#requests sent without a timeout get the 60 seconds default of the session (DEFAULT_TIMEOUT) instead of waiting forever
+session = create_session(retry_policy=retryPolicy(), adaptive_concurrency=True)
+
 #helper function to create xml formatted strings
 def xmlesc(txt):
     txt = txt.replace("&", "&amp;")
@@ -20,6 +38,24 @@ def xmlesc(txt):
     txt = txt.replace("\n", "&#xA;")
     return txt
 
+#helper function returns True if an aspect of a tableau table/column changed since it was last published (always True without a sync state store)
+def sync_state_changed(luid, aspect, content):
+    return sync_state is None or not sync_state.is_current(luid, aspect, content)
+
+#helper function records a published aspect of a tableau table/column in the sync state store
+def record_sync_state(luid, aspect, content, parent_luid=None):
+    if sync_state is not None:
+        sync_state.record(luid, aspect, content, parent_luid)
+
+#helper function returns True if an operation on a tableau table was not completed by this run (or by the interrupted run being resumed) for the job of its dbt model
+def journal_pending(merged_table, operation):
+    return run_journal is None or not run_journal.is_done(merged_table['luid'], str(merged_table['jobId']) + ':' + operation)
+
+#helper function records a completed operation on a tableau table in the run journal
+def journal_record(merged_table, operation):
+    if run_journal is not None:
+        run_journal.record(merged_table['luid'], str(merged_table['jobId']) + ':' + operation)
+
 #helper function to get full table name in the format [DATABASE].[SCHEMA].[TABLE]
 def get_full_table_name(merged_table):
     full_table_name = '[' + merged_table['database'].upper() + '].[' + merged_table['schema'].upper() + '].[' + merged_table['name'].upper() + ']'
@@ -35,7 +71,7 @@ def dbt_get_account_id(dbt_cloud_api, dbt_token):
         'Authorization': 'Token ' + dbt_token
     }
     try:
-        response = requests.request("GET", url, headers=headers, data=payload)
+        response = session.request("GET", url, headers=headers, data=payload)
         response_json = json.loads(response.text)
         if 'errors' in response_json.keys():
             raise Exception(response_json['errors'][0]['message'])
@@ -56,7 +92,7 @@ def dbt_get_projects(dbt_account_id, dbt_cloud_api, dbt_project_filter, database
       'Authorization': 'Token '+ dbt_token
     }
     try:
-        response = requests.request("GET", url, headers=headers, data=payload)
+        response = session.request("GET", url, headers=headers, data=payload)
         response_json = json.loads(response.text)
         if 'errors' in response_json.keys():
             raise Exception(response_json['errors'][0]['message'])
@@ -84,7 +120,7 @@ def dbt_get_jobs(dbt_account_id, dbt_cloud_api, dbt_token):
       'Authorization': 'Token '+ dbt_token
     }
     try:
-        response = requests.request("GET", url, headers=headers, data=payload)
+        response = session.request("GET", url, headers=headers, data=payload)
         response_json = json.loads(response.text)
         if 'errors' in response_json.keys():
             raise Exception(response_json['errors'][0]['message'])
@@ -122,16 +158,24 @@ def dbt_get_models_for_job(dbt_metadata_api, dbt_token, job_id):
       'Content-Type': 'application/json'
     }
     try:
-        response = requests.request("POST", url, headers=headers, data=payload)
+        response = session.request("POST", url, headers=headers, data=payload, timeout=3600)
         response_json = json.loads(response.text)
         if 'errors' in response_json.keys():
             raise Exception(response_json['errors'][0]['message'])
-        dbt_models = response_json['data']['models']
+        dbt_models = [modelRecord(dbt_model) for dbt_model in response_json['data']['models']]
         print('retreived ' + str(len(dbt_models)) + ' dbt models for jobId: ' + str(job_id))
     except Exception as e:
         print('Error getting dbt models for job id: ' + str(job_id) + ' ' + str(e))
     return dbt_models
 
+#returns the dbt models of many jobs, fetched concurrently, with one model per uniqueId (the latest executed when several jobs build it) and all the models of the jobs
+def dbt_get_models_for_jobs(dbt_metadata_api, dbt_token, dbt_jobs, fetch_workers):
+    with ThreadPoolExecutor(max_workers=max(1, fetch_workers)) as executor:
+        job_models = list(executor.map(lambda dbt_job: dbt_get_models_for_job(dbt_metadata_api, dbt_token, dbt_job['id']), dbt_jobs))
+    all_dbt_models = [dbt_model for dbt_models in job_models for dbt_model in dbt_models]
+    print('retrieved ' + str(len(all_dbt_models)) + ' dbt models for ' + str(len(dbt_jobs)) + ' jobs')
+    return latest_models(all_dbt_models), all_dbt_models
+
 #authenticates with tableau server/cloud and returns credentials object
 def authenticate_tableau(tableau_server, tableau_site_name, tableau_token_name, tableau_token):
     url = tableau_server + "/api/" + tableau_API_VERSION + "/auth/signin"
@@ -150,7 +194,7 @@ def authenticate_tableau(tableau_server, tableau_site_name, tableau_token_name,
         'Accept': 'application/json'
     }
     try:
-        response = requests.request("POST", url, headers=headers, data=payload)
+        response = session.request("POST", url, headers=headers, data=payload)
         response_json = json.loads(response.text)
         if 'error' in response_json.keys():
             raise Exception(response_json['error'])
@@ -183,7 +227,7 @@ def tableau_get_databases(tableau_server, database_type_filter, database_name_fi
     auth_headers = {'accept': 'application/json', 'content-type': 'application/json',
                                    'x-tableau-auth': tableau_creds['token']}
     try:
-        metadata_query = requests.post(tableau_server + '/api/metadata/graphql', headers=auth_headers, verify=True,
+        metadata_query = session.post(tableau_server + '/api/metadata/graphql', headers=auth_headers, verify=True,
                                        json={"query": mdapi_query})
         tableau_databases = json.loads(metadata_query.text)['data']['databases']
     except Exception as e:
@@ -230,7 +274,7 @@ def tableau_get_downstream_workbooks(tableau_server, merged_table, tableau_creds
     auth_headers = {'accept': 'application/json', 'content-type': 'application/json',
                                    'x-tableau-auth': tableau_creds['token']}
     try:
-        metadata_query = requests.post(tableau_server + '/api/metadata/graphql', headers=auth_headers, verify=True,
+        metadata_query = session.post(tableau_server + '/api/metadata/graphql', headers=auth_headers, verify=True,
                                        json={"query": mdapi_query})
         downstream_workbooks = json.loads(metadata_query.text)['data']['databaseTables'][0]['downstreamWorkbooks']
     except Exception as e:
@@ -238,6 +282,57 @@ def tableau_get_downstream_workbooks(tableau_server, merged_table, tableau_creds
     print('retrieved ' + str(len(downstream_workbooks)) + ' downstream tableau workbooks')
     return downstream_workbooks
 
+#returns a dict of downstream workbooks keyed by workbook luid for a list of tables (tables are requested in chunks from the metadata API)
+def tableau_get_downstream_workbooks_for_tables(tableau_server, merged_tables, tableau_creds, chunk_size=50):
+    print('getting downstream workbooks for ' + str(len(merged_tables)) + ' tableau tables...')
+    table_luids = list(dict.fromkeys(map(lambda t: t['luid'], merged_tables)))
+    downstream_workbooks = {}
+
+    mdapi_query = '''query get_downstream_workbooks($luids: [String]) {
+  databaseTables(filter: {luidWithin: $luids}) {
+    luid
+    downstreamWorkbooks {
+      id
+      luid
+      name
+      description
+      projectName
+      vizportalUrlId
+      tags {
+        id
+        name
+      }
+      owner {
+        id
+        name
+        username
+      }
+      upstreamTables
+      {
+        id
+        luid
+        name
+      }
+    }
+  }
+}'''
+    auth_headers = {'accept': 'application/json', 'content-type': 'application/json',
+                                   'x-tableau-auth': tableau_creds['token']}
+    try:
+        for i in range(0, len(table_luids), chunk_size):
+            metadata_query = session.post(tableau_server + '/api/metadata/graphql', headers=auth_headers, verify=True,
+                                           json={"query": mdapi_query, "variables": {'luids': table_luids[i:i + chunk_size]}})
+            for table in json.loads(metadata_query.text)['data']['databaseTables']:
+                for workbook in table['downstreamWorkbooks']:
+                    if workbook['luid'] not in downstream_workbooks:
+                        workbook['downstreamOfTables'] = []
+                        downstream_workbooks[workbook['luid']] = workbook
+                    downstream_workbooks[workbook['luid']]['downstreamOfTables'].append(table['luid'])
+    except Exception as e:
+        print('Error getting downstream workbooks from tableau metadata API ' + str(e))
+    print('retrieved ' + str(len(downstream_workbooks)) + ' downstream tableau workbooks')
+    return downstream_workbooks
+
 
 
 #returns a list of tableau databases (including database hostnames and tables)
@@ -265,7 +360,7 @@ def tableau_get_databaseServers(tableau_server, database_type_filter, database_n
     auth_headers = {'accept': 'application/json', 'content-type': 'application/json',
                                    'x-tableau-auth': tableau_creds['token']}
     try:
-        metadata_query = requests.post(tableau_server + '/api/metadata/graphql', headers=auth_headers, verify=True,
+        metadata_query = session.post(tableau_server + '/api/metadata/graphql', headers=auth_headers, verify=True,
                                        json={"query": mdapi_query})
 
         response_json = json.loads(metadata_query.text)
@@ -277,6 +372,70 @@ def tableau_get_databaseServers(tableau_server, database_type_filter, database_n
         print('Error getting databases from tableau metadata API: ' + str(e))
     return tableau_databaseServers
 
+#returns a list of tableau database servers like tableau_get_databaseServers, but requests servers and tables page by page (first/after cursors) to stay below the metadata API node limit
+def tableau_get_databaseServers_paged(tableau_server, database_type_filter, database_name_filter, tableau_creds, page_size=500):
+    print('getting database server list from tableau metadata API with database type: ' + database_type_filter + '...')
+    tableau_databaseServers = []
+    server_filter = {'connectionType': database_type_filter}
+    if len(database_name_filter)>0:
+        server_filter['nameWithin'] = database_name_filter
+
+    servers_query = '''query get_databaseServers($filter: DatabaseServer_Filter, $first: Int, $after: String) {
+  databaseServersConnection(filter: $filter, first: $first, after: $after) {
+    nodes {
+      name
+      id
+      hostName
+    }
+    pageInfo {
+      hasNextPage
+      endCursor
+    }
+  }
+}'''
+    tables_query = '''query get_databaseServer_tables($id: ID, $first: Int, $after: String) {
+  databaseServers(filter: {id: $id}) {
+    tablesConnection(first: $first, after: $after) {
+      nodes {
+        id
+        luid
+        name
+        schema
+      }
+      pageInfo {
+        hasNextPage
+        endCursor
+      }
+    }
+  }
+}'''
+    auth_headers = {'accept': 'application/json', 'content-type': 'application/json',
+                                   'x-tableau-auth': tableau_creds['token']}
+    try:
+        page_info = {'hasNextPage': True, 'endCursor': None}
+        while page_info['hasNextPage']:
+            variables = {'filter': server_filter, 'first': page_size, 'after': page_info['endCursor']}
+            metadata_query = session.post(tableau_server + '/api/metadata/graphql', headers=auth_headers, verify=True,
+                                          json={"query": servers_query, "variables": variables})
+            servers_connection = json.loads(metadata_query.text)['data']['databaseServersConnection']
+            tableau_databaseServers.extend(servers_connection['nodes'])
+            page_info = servers_connection['pageInfo']
+
+        for database_server in tableau_databaseServers:
+            database_server['tables'] = []
+            page_info = {'hasNextPage': True, 'endCursor': None}
+            while page_info['hasNextPage']:
+                variables = {'id': database_server['id'], 'first': page_size, 'after': page_info['endCursor']}
+                metadata_query = session.post(tableau_server + '/api/metadata/graphql', headers=auth_headers, verify=True,
+                                              json={"query": tables_query, "variables": variables})
+                tables_connection = json.loads(metadata_query.text)['data']['databaseServers'][0]['tablesConnection']
+                database_server['tables'].extend(tableRecord(table) for table in tables_connection['nodes'])
+                page_info = tables_connection['pageInfo']
+        print('retrieved ' + str(len(tableau_databaseServers)) + ' tableau database servers')
+    except Exception as e:
+        print('Error getting databases from tableau metadata API: ' + str(e))
+    return tableau_databaseServers
+
 #returns a list of tableau columns for a given table
 def get_tableau_columns(tableau_server, merged_table, tableau_creds):
     full_table_name = get_full_table_name(merged_table)
@@ -290,39 +449,120 @@ def get_tableau_columns(tableau_server, merged_table, tableau_creds):
         'Accept': 'application/json'
     }
     try:
-        response = requests.request("GET", get_columns_url, headers=headers, data=payload)
+        response = session.request("GET", get_columns_url, headers=headers, data=payload)
         tableau_columns = json.loads(response.text)['columns']['column']
     except Exception as e:
         print('Error getting columns from tableau metadata API ' + str(e))
     print('retrieved ' + str(len(tableau_columns)) + ' columns for tableau table: ' + full_table_name)
     return tableau_columns
 
-#publishes tableau column descriptions for a given table and list of columns
-def publish_tableau_column_descriptions(tableau_server, merged_table, tableau_columns, tableau_creds):
-    full_table_name = get_full_table_name(merged_table)
+#returns a dict of tableau columns keyed by table luid for a list of tables (tables are requested in chunks from the metadata API)
+def tableau_get_columns_for_tables(tableau_server, merged_tables, tableau_creds, chunk_size=100, column_page_size=1000):
+    print('getting columns for ' + str(len(merged_tables)) + ' tableau tables...')
+    table_luids = list(dict.fromkeys(map(lambda t: t['luid'], merged_tables)))
+    tables_per_query = max(1, min(chunk_size, 20000 // column_page_size))
+    tableau_columns = {luid: [] for luid in table_luids}
+    columns_fields = '''luid
+    columnsConnection(first: $first, after: $after) {
+      nodes {
+        luid
+        name
+        description
+      }
+      pageInfo {
+        hasNextPage
+        endCursor
+      }
+    }'''
+    chunk_query = '''query get_columns($luids: [String], $first: Int, $after: String) {
+  databaseTables(filter: {luidWithin: $luids}) {
+    ''' + columns_fields + '''
+  }
+}'''
+    page_query = '''query get_columns_page($luid: String!, $first: Int, $after: String) {
+  databaseTables(filter: {luid: $luid}) {
+    ''' + columns_fields + '''
+  }
+}'''
+    auth_headers = {'accept': 'application/json', 'content-type': 'application/json',
+                                   'x-tableau-auth': tableau_creds['token']}
 
-    print('publishing tableau column descriptions for table: ' + full_table_name + '...')
-    d = defaultdict(dict)
+    def add_columns(table):
+        for column in table['columnsConnection']['nodes']:
+            tableau_columns[table['luid']].append(columnRecord(id=column['luid'], name=column['name'], description=column['description'], parentTableId=table['luid']))
+        return table['columnsConnection']['pageInfo']
+
+    try:
+        for i in range(0, len(table_luids), tables_per_query):
+            variables = {'luids': table_luids[i:i + tables_per_query], 'first': column_page_size, 'after': None}
+            metadata_query = session.post(tableau_server + '/api/metadata/graphql', headers=auth_headers, verify=True,
+                                           json={"query": chunk_query, "variables": variables})
+            for table in json.loads(metadata_query.text)['data']['databaseTables']:
+                page_info = add_columns(table)
+                #page through tables with more columns than fit in a single page
+                while page_info['hasNextPage']:
+                    variables = {'luid': table['luid'], 'first': column_page_size, 'after': page_info['endCursor']}
+                    metadata_query = session.post(tableau_server + '/api/metadata/graphql', headers=auth_headers, verify=True,
+                                                   json={"query": page_query, "variables": variables})
+                    page_info = add_columns(json.loads(metadata_query.text)['data']['databaseTables'][0])
+    except Exception as e:
+        print('Error getting columns from tableau metadata API ' + str(e))
+    print('retrieved columns for ' + str(len(tableau_columns)) + ' tableau tables')
+    return tableau_columns
+
+#returns the merged columns of a table whose description differs from the one held by tableau (and from the last published one) and the number of unchanged columns
+def get_changed_column_descriptions(merged_table, tableau_columns):
+    d = defaultdict(columnRecord)
+    #descriptions currently held by tableau, used to skip columns whose description is unchanged
+    tableau_descriptions = {column['name']: column.get('description') for column in tableau_columns}
     for l in (tableau_columns, merged_table['columns']):
         for elem in l:
             d[elem['name']].update(elem)
     merged_columns = sorted(d.values(), key=itemgetter("name"))
+    changed_columns = []
+    skipped_count = 0
     for column in merged_columns:
-        if 'description' in column.keys():
-            url = tableau_server + "/api/" + tableau_API_VERSION + "/sites/" + tableau_creds['site']['id'] + "/tables/" + column['parentTableId'] + "/columns/" + column['id']
-            payload = "<tsRequest>\n  <column description=\"" + column['description'] + " \">\n  </column>\n</tsRequest>"
-            headers = {
-                'X-tableau-Auth': tableau_creds['token'],
-                'Content-Type': 'text/plain'
-            }
-            try:
-                response = requests.request("PUT", url, headers=headers, data=payload).text
-            except Exception as e:
-                print('Error publishing tableau column descriptions ' + str(e))
-    #print('published tableau column descriptions for table ' + full_table_name)
-    return
+        if 'description' in column.keys() and column['description'] is not None:
+            if not sync_state_changed(column['id'], ASPECT_DESCRIPTION, column['description']):
+                skipped_count += 1
+                continue
+            if (tableau_descriptions.get(column['name']) or '').strip() == column['description'].strip():
+                skipped_count += 1
+                #plan mode is a dry run and leaves the sync state unchanged
+                if sync_plan is None:
+                    record_sync_state(column['id'], ASPECT_DESCRIPTION, column['description'], column['parentTableId'])
+                continue
+            changed_columns.append(column)
+    return changed_columns, skipped_count
+
+#publishes tableau column descriptions for a given table and list of columns, returns True if no column failed
+def publish_tableau_column_descriptions(tableau_server, merged_table, tableau_columns, tableau_creds):
+    full_table_name = get_full_table_name(merged_table)
+
+    print('publishing tableau column descriptions for table: ' + full_table_name + '...')
+    changed_columns, skipped_count = get_changed_column_descriptions(merged_table, tableau_columns)
+    changed_count = 0
+    failed_count = 0
+    for column in changed_columns:
+        url = tableau_server + "/api/" + tableau_API_VERSION + "/sites/" + tableau_creds['site']['id'] + "/tables/" + column['parentTableId'] + "/columns/" + column['id']
+        payload = "<tsRequest>\n  <column description=\"" + column['description'] + " \">\n  </column>\n</tsRequest>"
+        headers = {
+            'X-tableau-Auth': tableau_creds['token'],
+            'Content-Type': 'text/plain'
+        }
+        try:
+            response = session.request("PUT", url, headers=headers, data=payload)
+            response.raise_for_status()
+            changed_count += 1
+            if sync_plan is None:
+                record_sync_state(column['id'], ASPECT_DESCRIPTION, column['description'], column['parentTableId'])
+        except Exception as e:
+            failed_count += 1
+            print('Error publishing tableau column descriptions ' + str(e))
+    print('column descriptions for table ' + full_table_name + ' changed: ' + str(changed_count) + ' skipped: ' + str(skipped_count) + ' failed: ' + str(failed_count))
+    return failed_count == 0
 
-#publishes tableau column tags for a given table and list of columns
+#publishes tableau column tags for a given table and list of columns, returns True if the tags of every column were published
 def publish_tableau_column_tags(tableau_server, tableau_columns, merged_table, tableau_creds):
     tag = merged_table['packageName']
     full_table_name = get_full_table_name(merged_table)
@@ -331,34 +571,37 @@ def publish_tableau_column_tags(tableau_server, tableau_columns, merged_table, t
         'X-tableau-Auth': tableau_creds['token'],
         'Content-Type': 'text/plain'
     }
+    published = True
     for tableau_column in tableau_columns:
+        #columns already tagged by an earlier run are skipped, like in plan mode
+        if not sync_state_changed(tableau_column['id'], ASPECT_TAGS, tag):
+            continue
         url = tableau_server + "/api/" + tableau_API_VERSION + "/sites/" + tableau_creds['site']['id'] + "/columns/" + tableau_column['id'] + "/tags"
         payload = "<tsRequest>\n  <tags>\n <tag label=\"" + tag + "\"/>\n  </tags>\n</tsRequest>"
 
         try:
-            column_tags_response = requests.request("PUT", url, headers=headers, data=payload).text
+            if session.request("PUT", url, headers=headers, data=payload).ok:
+                record_sync_state(tableau_column['id'], ASPECT_TAGS, tag, merged_table['luid'])
+            else:
+                published = False
         except Exception as e:
             print('Error publishing tableau column tags ' + str(e))
+            published = False
     #print('published tableau column tags: ' + tag + ' for table: ' + full_table_name)
-    return column_tags_response
+    return published
 
-#returns a list of merged (i.e. matched database/schema/table name) tableau database tables and dbt models
-def merge_dbt_tableau_tables(tableau_database, dbt_models):
+#returns the key of a dbt model (or merged table) within all the models fetched: a model built by jobs of several environments is a separate model in each
+def dbt_model_key(dbt_model):
+    return (str(dbt_model.get('environmentId')), dbt_model['uniqueId'])
+
+#returns a list of merged (i.e. matched database/schema/table name) tableau database tables and dbt models, looked up in a mergeIndex built once for all tableau databases
+def merge_dbt_tableau_tables(tableau_database, dbt_model_index):
     print('merging dbt models with tableau tables for tableau database: ' + tableau_database['name'] + '...')
-    d = defaultdict(dict)
-    m = defaultdict(dict)
-    for table in tableau_database['tables']:
-        d[table['name'].lower()].update(table)
-        for model in dbt_models:
-            model_database_account = dbt_projects[0]['connection']['details']['account']
-            if model['name'].lower() == table['name'].lower() and model['schema'].lower() == table['schema'].lower() and model['database'].lower() == tableau_database['name'].lower() and tableau_database['hostName'].lower().startswith(model_database_account.lower()): #if table/schema/database/hostname match
-                m[model['name'].lower()].update(table)
-                m[table['name'].lower()].update(model)
-    merged_tables = sorted(m.values(), key=itemgetter("name"))
+    merged_tables = sorted(dbt_model_index.merge_tables(tableau_database['tables'], tableau_database['name'], tableau_database['hostName']), key=itemgetter("name"))
     print('merged ' + str(len(merged_tables)) + ' dbt models and tableau tables in tableau database: ' + tableau_database['name'])
     return merged_tables
 
-#publishes tableau table tags for a given table
+#publishes tableau table tags for a given table, returns True if the tags were published
 def publish_tableau_table_tags(tableau_server, merged_table, tableau_creds):
     full_table_name = get_full_table_name(merged_table)
     tag = merged_table['packageName']
@@ -369,14 +612,15 @@ def publish_tableau_table_tags(tableau_server, merged_table, tableau_creds):
     }
     url = tableau_server + "/api/" + tableau_API_VERSION + "/sites/" + tableau_creds['site']['id'] + "/tables/" + merged_table['luid'] + "/tags"
     payload = "<tsRequest>\n  <tags>\n <tag label=\"" + tag + "\"/>\n  </tags>\n</tsRequest>"
+    published = False
     try:
-        table_tags_response = requests.request("PUT", url, headers=headers, data=payload).text
+        published = session.request("PUT", url, headers=headers, data=payload).ok
     except Exception as e:
         print('Error publishing tableau table tag ' + str(e))
     #print('published table tag ' + tag + ' for tableau table: ' + full_table_name)
-    return table_tags_response
+    return published
 
-#publishes tableau table description for a given table
+#publishes tableau table description for a given table, returns True if the description was published
 def publish_tableau_table_description(tableau_server, merged_table, description_text, tableau_creds):
     full_table_name = get_full_table_name(merged_table)
     print('publishing description for tableau table ' + full_table_name + '...')
@@ -386,24 +630,21 @@ def publish_tableau_table_description(tableau_server, merged_table, description_
         'X-tableau-Auth': tableau_creds['token'],
         'Content-Type': 'text/plain'
     }
+    published = False
     try:
-        table_description_response = requests.request("PUT", url, headers=headers, data=payload).text
+        published = session.request("PUT", url, headers=headers, data=payload).ok
     except Exception as e:
         print('Error publishing tableau table description ' + str(e))
     #print('published tableau table description for table ' + full_table_name )
-    return table_description_response
+    return published
 
-#sets tableau table quality warning for a given table if dbt model status was not a success
+#sets tableau table quality warning for a given table if dbt model status was not a success, returns True if the warning was set
 def set_tableau_table_quality_warning(tableau_server, merged_table, isSevere, tableau_creds):
     full_table_name = get_full_table_name(merged_table)
     print('updating table data quality warning for tableau table: ' + full_table_name + '...')
     url = tableau_server+"/api/" + tableau_API_VERSION + "/sites/"+ tableau_creds['site']['id']+"/dataQualityWarnings/table/" + merged_table['luid']
     dbt_model_status = merged_table['status']
-    dbt_model_status='failed' #TEST FLAG
-    dbt_cloud_base_url = 'https://cloud.getdbt.com/next/deploy/' + str(merged_table['accountId']) + '/projects/' + str(merged_table['projectId'])
-    message = 'dbt model status: *' + dbt_model_status + "*&#xA;" \
-              + xmlesc('"dbt job":' + dbt_cloud_base_url + "/jobs/" + str(merged_table['jobId'])) \
-              + xmlesc(' | "dbt run":' + dbt_cloud_base_url + "/runs/" + str(merged_table['runId']))
+    message = make_table_quality_warning_message(merged_table, dbt_model_status)
             #+ 'dbt model uniqueId: *' + str(dbt_model['uniqueId']) \
             #+ "*&#xA;" + 'dbt runId: *' + str(dbt_model['runId']) + "*&#xA;" + 'dbt jobId: *' + str(dbt_model['jobId']) \
             #+ "*&#xA;" + 'data quality warning last updated: *'+ str(datetime.utcnow().strftime("%Y-%m-%d %H:%MUTC")) +  "*&#xA;" \
@@ -416,39 +657,33 @@ def set_tableau_table_quality_warning(tableau_server, merged_table, isSevere, ta
         'X-tableau-Auth': tableau_creds['token'],
         'Content-Type': 'plain/text'
     }
-    existing_dq_warning=requests.request('get', url, headers=json_headers).text
+    existing_dq_warning=session.request('get', url, headers=json_headers).text
     existing_dq_warning_object = json.loads(existing_dq_warning)
     payload = '<tsRequest>\n  <dataQualityWarning type="WARNING" isActive="true" message="'+ message + '" isSevere="'+ str(isSevere).lower() + '"/>\n   </tsRequest>'
+    published = False
     try:
         if existing_dq_warning_object['dataQualityWarningList']=={} and dbt_model_status!='success': #create new dq warning
-            response = requests.request("POST", url, headers=plain_headers, data=payload).text
+            published = session.request("POST", url, headers=plain_headers, data=payload).ok
+        elif existing_dq_warning_object['dataQualityWarningList']=={}: #successful model without a warning, nothing to change
+            published = True
         else:
             existing_dq_warning_object_id = existing_dq_warning_object['dataQualityWarningList']['dataQualityWarning'][0]['id']
             dq_warning_url = tableau_server + "/api/" + tableau_API_VERSION + "/sites/" + tableau_creds['site']['id'] + "/dataQualityWarnings/" + existing_dq_warning_object_id
             if dbt_model_status != 'success': #update existing dq warning
-                response = requests.request("PUT", dq_warning_url, headers=plain_headers, data=payload).text
+                published = session.request("PUT", dq_warning_url, headers=plain_headers, data=payload).ok
             else: #delete existing dq warning
-                response = requests.request("DELETE", dq_warning_url, headers=plain_headers).text
+                published = session.request("DELETE", dq_warning_url, headers=plain_headers).ok
     except Exception as e:
         print('Error setting data quality warning on tableau table '  + full_table_name + str(e))
     #print('updated table data quality warning for tableau table: ' + full_table_name)
-    return
+    return published
 
-#sets tableau table certification for a given table based on dbt meta config for the dbt model
+#sets tableau table certification for a given table based on dbt meta config for the dbt model, returns True if the certification was set
 def set_tableau_table_certification(tableau_server, merged_table, dbt_meta_certification_flag, certification_note, tableau_creds):
     full_table_name = get_full_table_name(merged_table)
     print('updating table certification for tableau table: ' + full_table_name + '...')
 
-    if dbt_meta_certification_flag=='':
-        isCertified = True
-        certification_note = xmlesc(certification_note)
-    elif dbt_meta_certification_flag in merged_table['meta']:
-        isCertified = merged_table['meta'][dbt_meta_certification_flag]
-        certification_note = xmlesc(certification_note)
-        #+ '\nmodel: *' + merged_table['uniqueId'] + '*' )
-    else:
-        isCertified = False
-        certification_note = ""
+    isCertified, certification_note = make_table_certification(merged_table, dbt_meta_certification_flag, certification_note)
 
     url = tableau_server+"/api/" + tableau_API_VERSION + "/sites/"+ tableau_creds['site']['id']+"/tables/" + merged_table['luid']
     payload = '<tsRequest>\n  <table isCertified="'+ str(isCertified).lower() + '"\n   certificationNote="'+ certification_note + '"  >\n  </table>\n</tsRequest>'
@@ -456,12 +691,78 @@ def set_tableau_table_certification(tableau_server, merged_table, dbt_meta_certi
         'X-tableau-Auth': tableau_creds['token'],
         'Content-Type': 'text/plain'
     }
+    published = False
     try:
-        response = requests.request("PUT", url, headers=headers, data=payload).text
+        published = session.request("PUT", url, headers=headers, data=payload).ok
     except Exception as e:
         print('Error certifying tableau table ' + str(e))
     #print('updated table certification for tableau table: ' + full_table_name)
-    return
+    return published
+
+#returns the data quality warnings currently set on a tableau table
+def tableau_get_table_quality_warnings(tableau_server, merged_table, tableau_creds):
+    url = tableau_server+"/api/" + tableau_API_VERSION + "/sites/"+ tableau_creds['site']['id']+"/dataQualityWarnings/table/" + merged_table['luid']
+    json_headers = {
+        'X-tableau-Auth': tableau_creds['token'],
+        'Accept': 'application/json'
+    }
+    existing_dq_warning_object = json.loads(session.request('get', url, headers=json_headers).text)
+    if existing_dq_warning_object['dataQualityWarningList']=={}:
+        return []
+    return existing_dq_warning_object['dataQualityWarningList']['dataQualityWarning']
+
+#adds the tableau writes needed to sync a merged table and its columns to a sync plan instead of publishing them (only reads are made)
+def plan_tableau_table_operations(sync_plan, tableau_server, merged_table, tableau_columns, table_state, isSevere, dbt_meta_certification_flag, certification_note, tableau_creds):
+    full_table_name = get_full_table_name(merged_table)
+    luid = merged_table['luid']
+    tag = merged_table['packageName']
+    if sync_state_changed(luid, ASPECT_DESCRIPTION, table_state[ASPECT_DESCRIPTION]):
+        sync_plan.add(OP_TABLE_DESCRIPTION, luid, full_table_name, {'description': make_table_description(merged_table)}, ASPECT_DESCRIPTION, table_state[ASPECT_DESCRIPTION])
+    if sync_state_changed(luid, ASPECT_DQ_WARNING, table_state[ASPECT_DQ_WARNING]):
+        dbt_model_status = merged_table['status']
+        existing_dq_warnings = tableau_get_table_quality_warnings(tableau_server, merged_table, tableau_creds)
+        params = {'message': make_table_quality_warning_message(merged_table, str(dbt_model_status)), 'is_severe': isSevere}
+        if dbt_model_status != 'success' and len(existing_dq_warnings)==0: #create new dq warning
+            sync_plan.add(OP_DQ_WARNING_CREATE, luid, full_table_name, params, ASPECT_DQ_WARNING, table_state[ASPECT_DQ_WARNING])
+        elif dbt_model_status != 'success': #update existing dq warning
+            params['warning_id'] = existing_dq_warnings[0]['id']
+            sync_plan.add(OP_DQ_WARNING_UPDATE, luid, full_table_name, params, ASPECT_DQ_WARNING, table_state[ASPECT_DQ_WARNING])
+        elif len(existing_dq_warnings)>0: #delete existing dq warning
+            sync_plan.add(OP_DQ_WARNING_DELETE, luid, full_table_name, {'warning_id': existing_dq_warnings[0]['id']}, ASPECT_DQ_WARNING, table_state[ASPECT_DQ_WARNING])
+        #a successful model without a warning needs no change. Plan mode is a dry run, so its state is only recorded by the next sync
+    if sync_state_changed(luid, ASPECT_CERTIFICATION, table_state[ASPECT_CERTIFICATION]):
+        isCertified, note = make_table_certification(merged_table, dbt_meta_certification_flag, certification_note)
+        sync_plan.add(OP_TABLE_CERTIFICATION, luid, full_table_name, {'is_certified': isCertified, 'certification_note': note}, ASPECT_CERTIFICATION, table_state[ASPECT_CERTIFICATION])
+    if sync_state_changed(luid, ASPECT_TAGS, table_state[ASPECT_TAGS]):
+        sync_plan.add(OP_TABLE_TAGS, luid, full_table_name, {'tags': [tag]}, ASPECT_TAGS, table_state[ASPECT_TAGS])
+    changed_columns, skipped_count = get_changed_column_descriptions(merged_table, tableau_columns)
+    for column in changed_columns:
+        sync_plan.add(OP_COLUMN_DESCRIPTION, column['id'], full_table_name + '.[' + column['name'] + ']', {'description': xmlesc(column['description'])}, ASPECT_DESCRIPTION, column['description'], column['parentTableId'])
+    for tableau_column in tableau_columns:
+        if sync_state_changed(tableau_column['id'], ASPECT_TAGS, tag):
+            sync_plan.add(OP_COLUMN_TAGS, tableau_column['id'], full_table_name + '.[' + tableau_column['name'] + ']', {'tags': [tag]}, ASPECT_TAGS, tag, luid)
+
+#helper function returns whether a tableau table should be certified based on the dbt meta config of its model, and the (xml escaped) certification note
+def make_table_certification(merged_table, dbt_meta_certification_flag, certification_note):
+    if dbt_meta_certification_flag=='':
+        isCertified = True
+        certification_note = xmlesc(certification_note)
+    elif dbt_meta_certification_flag in merged_table['meta']:
+        isCertified = merged_table['meta'][dbt_meta_certification_flag]
+        certification_note = xmlesc(certification_note)
+        #+ '\nmodel: *' + merged_table['uniqueId'] + '*' )
+    else:
+        isCertified = False
+        certification_note = ""
+    return isCertified, certification_note
+
+#helper function makes tableau table data quality warning message
+def make_table_quality_warning_message(merged_table, dbt_model_status):
+    dbt_cloud_base_url = 'https://cloud.getdbt.com/next/deploy/' + str(merged_table['accountId']) + '/projects/' + str(merged_table['projectId'])
+    message = 'dbt model status: *' + dbt_model_status + "*&#xA;" \
+              + xmlesc('"dbt job":' + dbt_cloud_base_url + "/jobs/" + str(merged_table['jobId'])) \
+              + xmlesc(' | "dbt run":' + dbt_cloud_base_url + "/runs/" + str(merged_table['runId']))
+    return message
 
 #helper function makes tableau table description
 def make_table_description(dbt_model):
@@ -484,14 +785,11 @@ def make_table_description(dbt_model):
         table_description = line1 + "&#xA;" + line3 + "&#xA;" + line4
     return table_description
 
-def generate_dbt_exposures(dbt_account_id, dbt_cloud_api, dbt_token, github_token, downstream_workbooks, tableau_server, tableau_site, dbt_exposure_maturity):
+def generate_dbt_exposures(dbt_account_id, dbt_cloud_api, dbt_token, github_token, workbook_registry, tableau_server, tableau_site, dbt_exposure_maturity, sync_plan=None):
     print('generating dbt exposures for downstream workbooks...')
-    temp = groupby(downstream_workbooks, lambda x: x['dbt_projectId'])
-    workbooks_grouped_by_project = [list(group) for key, group in temp]
-
-    for project in workbooks_grouped_by_project:
+    for project_id, project_workbooks in workbook_registry.workbooks_by_project().items():
         exposures_list = []
-        for workbook in project:
+        for workbook in project_workbooks:
             url=tableau_server + '/#/site/' + tableau_site + '/workbooks/'+ workbook['vizportalUrlId']
             workbook_name = workbook['name']
             description = workbook['description']
@@ -505,8 +803,11 @@ def generate_dbt_exposures(dbt_account_id, dbt_cloud_api, dbt_token, github_toke
 
         dict_file = {'version': 2,
                      'exposures': exposures_list}
-        write_dbt_project_exposures_file(dict_file, str(project[0]['dbt_projectId']))
-        write_github_exposures_file(dbt_account_id, dbt_cloud_api, dbt_token, github_token, dict_file, str(project[0]['dbt_projectId']))
+        if sync_plan is not None: #commit the exposures when the plan is applied
+            sync_plan.add(OP_EXPOSURES_COMMIT, None, 'dbt project ' + str(project_id), {'dbt_account_id': dbt_account_id, 'project_id': str(project_id), 'exposures': dict_file})
+            continue
+        write_dbt_project_exposures_file(dict_file, str(project_id))
+        write_github_exposures_file(dbt_account_id, dbt_cloud_api, dbt_token, github_token, dict_file, str(project_id))
     return
 
 
@@ -516,9 +817,9 @@ def write_github_exposures_file(dbt_account_id, dbt_cloud_api, dbt_token, github
         'Authorization': 'Token ' + dbt_token
     }
     url = 'https://cloud.getdbt.com/api/v3/accounts/' + str(dbt_account_id) + '/projects/' + str(project_id)
-
+    published = False
     try:
-        response = requests.request("get", url, headers=headers)
+        response = session.request("get", url, headers=headers)
         response_json=json.loads(response.text)
         repository = response_json['data']['repository']
 
@@ -536,7 +837,7 @@ def write_github_exposures_file(dbt_account_id, dbt_cloud_api, dbt_token, github
         payload = json.loads('{"message": "auto generated by tableau dbt integration", "content":"' + base64_bytes.decode('utf-8') + '"}')
 
         #check if exposures file already exists
-        response = requests.request("get", git_url, headers=headers)
+        response = session.request("get", git_url, headers=headers)
 
         #if exposures file exists in github then update headers to includ sha
         if response.status_code == 200:
@@ -544,12 +845,13 @@ def write_github_exposures_file(dbt_account_id, dbt_cloud_api, dbt_token, github
             sha = response_json['sha']
             payload['sha'] = sha
 
-        response = requests.put(git_url, headers=headers, data=json.dumps(payload))
+        response = session.put(git_url, headers=headers, data=json.dumps(payload))
         print(response.text)
+        published = response.ok
 
     except Exception as e:
         print(e)
-    return
+    return published
 
 def write_dbt_project_exposures_file(dict_file, project_name):
     print('writing dbt exposures to file for project: ' + project_name + '...')
@@ -561,13 +863,6 @@ def write_dbt_project_exposures_file(dict_file, project_name):
         print('Error writing dbt exposures ' + str(e))
     return
 
-def remove_duplicate_workbooks(workbooks):
-    print('removing duplicate workbooks: ...')
-    res_list = [i for n, i in enumerate(workbooks)
-                if i not in workbooks[n + 1:]]
-    print('done')
-    return res_list
-
 #read project yaml file
 class app_settings:
     try:
@@ -581,6 +876,8 @@ class app_settings:
             dbt_project_filter = data['DBT']['DBT_PROJECT_FILTER']
             dbt_generate_exposures = data['DBT']['DBT_GENERATE_EXPOSURES']
             dbt_exposures_maturity = data['DBT']['DBT_EXPOSURES_MATURITY']
+            dbt_incremental = data['DBT'].get('DBT_INCREMENTAL', False)
+            dbt_fetch_workers = data['DBT'].get('DBT_FETCH_WORKERS', 8)
 
             tableau_token = data['TABLEAU']['TABLEAU_TOKEN']
             tableau_token_name = data['TABLEAU']['TABLEAU_TOKEN_NAME']
@@ -589,6 +886,17 @@ class app_settings:
             tableau_server = data['TABLEAU']['TABLEAU_SERVER']
             tableau_certification_note = data['TABLEAU']['TABLEAU_CERTIFICATION_NOTE']
             tableau_dq_warning_isSevere = data['TABLEAU']['TABLEAU_DQ_WARNING_IS_SEVERE']
+            tableau_sync_state_path = data['TABLEAU'].get('TABLEAU_SYNC_STATE_PATH', '')
+            tableau_token_cache_path = data['TABLEAU'].get('TABLEAU_TOKEN_CACHE_PATH', '')
+            tableau_sync_mode = data['TABLEAU'].get('TABLEAU_SYNC_MODE', 'sync')
+            tableau_sync_plan_path = data['TABLEAU'].get('TABLEAU_SYNC_PLAN_PATH', 'tableau_sync_plan.json')
+            tableau_apply_workers = data['TABLEAU'].get('TABLEAU_APPLY_WORKERS', 32)
+            tableau_metrics_path = data['TABLEAU'].get('TABLEAU_METRICS_PATH', '')
+            tableau_metrics_port = data['TABLEAU'].get('TABLEAU_METRICS_PORT', '')
+            tableau_trace_path = data['TABLEAU'].get('TABLEAU_TRACE_PATH', '')
+            tableau_shard_workbooks_dir = data['TABLEAU'].get('TABLEAU_SHARD_WORKBOOKS_DIR', 'shards')
+            tableau_run_journal_path = data['TABLEAU'].get('TABLEAU_RUN_JOURNAL_PATH', '.tableau_run_journal.jsonl')
+            tableau_profile_dir = data['TABLEAU'].get('TABLEAU_PROFILE_DIR', '')
 
             database_type_filter = data['DATABASE']['DATABASE_TYPE_FILTER']
             database_name_filter = data['DATABASE']['DATABASE_NAME_FILTER']
@@ -599,40 +907,226 @@ class app_settings:
     except Exception as e:
         print("failed to read yaml file " + str(e))
 
+#applies a sync plan saved by a previous run in plan mode, returns True if every operation was applied
+def apply_saved_sync_plan(settings):
+    sync_plan = syncPlan.load(settings.tableau_sync_plan_path)
+    print(sync_plan.summary(settings.tableau_apply_workers))
+    plan_sync_state = syncStateStore(settings.tableau_sync_state_path) if settings.tableau_sync_state_path else None
+    tableau_client = tableauClient(settings.tableau_server, settings.tableau_site, settings.tableau_token_name, settings.tableau_token,
+                                   session=session, state_store=plan_sync_state, token_cache_path=settings.tableau_token_cache_path or None)
+    tableau_creds = tableau_client.authenticate()
+
+    def commit_exposures(operation, creds):
+        params = operation['params']
+        write_dbt_project_exposures_file(params['exposures'], params['project_id'])
+        return write_github_exposures_file(params['dbt_account_id'], settings.dbt_cloud_api, settings.dbt_token, settings.github_token, params['exposures'], params['project_id'])
+
+    result = apply_plan(sync_plan, tableau_client, tableau_creds, settings.tableau_apply_workers, {OP_EXPOSURES_COMMIT: commit_exposures})
+    #move the dbt watermarks forward once all of the planned changes were published
+    if plan_sync_state is not None:
+        if result['failed']==0:
+            for watermark in sync_plan.watermarks:
+                plan_sync_state.set_watermark(watermark['job_id'], watermark['environment_id'], watermark)
+        plan_sync_state.close()
+    print('applied ' + str(result['applied']) + ' operations, failed: ' + str(result['failed']))
+    return result['failed']==0
+
+#writes the request metrics of the run (latency, errors, retries and payload sizes per endpoint) and prints their summary
+def write_request_metrics(settings):
+    print(session.metrics.summary())
+    if settings.tableau_metrics_path:
+        session.metrics.write(settings.tableau_metrics_path)
+
+#writes the timing spans of each stage as opentelemetry (OTLP) json when tracing or profiling is enabled
+def write_stage_trace(settings, tracer):
+    if settings.tableau_trace_path or tracer.profile_dir:
+        tracer.write(settings.tableau_trace_path or tracer.profile_dir + '/trace.json')
+
+#returns the command line options of the script
+def parse_command_line():
+    parser = argparse.ArgumentParser(description='Sync dbt Cloud metadata to the tableau catalog. Settings are read from settings.yml')
+    parser.add_argument('--shard', type=parse_shard, metavar='i/N', help='only sync the tables of shard i of N (see run_shards.py)')
+    parser.add_argument('--reduce-exposures', type=int, metavar='N', help='generate the exposures of a run sharded N ways from the workbook files of its shards')
+    parser.add_argument('--resume', action='store_true', help='skip the writes completed by the interrupted previous run (see TABLEAU_RUN_JOURNAL_PATH)')
+    parser.add_argument('--profile', action='store_true', help='write a cProfile dump and tracemalloc allocation sites per stage to ./profile')
+    return parser.parse_args()
+
+#reduce step of a sharded run: generates the dbt exposures once from the workbook files written by all shards. In plan mode the exposure commit is added to a plan saved at TABLEAU_SYNC_PLAN_PATH, next to the plans of the shards
+def reduce_shard_exposures(settings, shard_count):
+    workbook_paths = [shard_workbooks_path(settings.tableau_shard_workbooks_dir, (index, shard_count)) for index in range(shard_count)]
+    workbook_registry = read_shard_workbooks(workbook_paths)
+    sync_plan = None
+    if settings.tableau_sync_mode == 'plan':
+        #planned for the site the shards planned their writes for
+        shard_plan = syncPlan.load(shard_path(settings.tableau_sync_plan_path, (0, shard_count)))
+        sync_plan = syncPlan(settings.tableau_server, shard_plan.site_id)
+    if len(workbook_registry)>0:
+        dbt_account_id = dbt_get_account_id(settings.dbt_cloud_api, settings.dbt_token)
+        generate_dbt_exposures(dbt_account_id, settings.dbt_cloud_api, settings.dbt_token, settings.github_token, workbook_registry, settings.tableau_server, settings.tableau_site, settings.dbt_exposures_maturity, sync_plan)
+    if sync_plan is not None:
+        sync_plan.save(settings.tableau_sync_plan_path)
+        print(sync_plan.summary(settings.tableau_apply_workers))
+
 #MAIN PROGRAM
 settings = app_settings()
+command_line = parse_command_line()
+#sharded run (--shard i/N): only the merged tables whose luid hashes to shard i are published, and the downstream workbooks are written to a shard file instead of generating exposures
+shard = command_line.shard
+if shard is not None:
+    #tables always fall into the same shard, so every shard keeps its own sync state, watermarks and plan
+    settings.tableau_sync_state_path = shard_path(settings.tableau_sync_state_path, shard) if settings.tableau_sync_state_path else ''
+    settings.tableau_sync_plan_path = shard_path(settings.tableau_sync_plan_path, shard)
+    settings.tableau_run_journal_path = shard_path(settings.tableau_run_journal_path, shard) if settings.tableau_run_journal_path else ''
+#timing spans of each stage. --profile (or TABLEAU_PROFILE_DIR) also writes a cProfile dump and tracemalloc allocation sites per stage
+tracer = spanTracer(profile_dir=settings.tableau_profile_dir or ('profile' if command_line.profile else None), metrics=session.metrics)
+#serves the request metrics while the run is in progress
+if settings.tableau_metrics_port:
+    session.metrics.serve(int(settings.tableau_metrics_port))
+#apply mode: publish a reviewed sync plan without reading dbt or tableau metadata
+if settings.tableau_sync_mode == 'apply':
+    with tracer.span('tableau.apply_plan', profile=True):
+        plan_applied = apply_saved_sync_plan(settings)
+    write_request_metrics(settings)
+    write_stage_trace(settings, tracer)
+    sys.exit(0 if plan_applied else 1)
+#reduce mode (--reduce-exposures N): generate the exposures of a run sharded N ways
+if command_line.reduce_exposures:
+    with tracer.span('dbt.generate_exposures', profile=True):
+        reduce_shard_exposures(settings, command_line.reduce_exposures)
+    write_request_metrics(settings)
+    write_stage_trace(settings, tracer)
+    sys.exit(0)
 
 dbt_account_id = dbt_get_account_id(settings.dbt_cloud_api, settings.dbt_token)
 dbt_projects = dbt_get_projects(dbt_account_id, settings.dbt_cloud_api, settings.dbt_project_filter, settings.database_account_filter, settings.dbt_token)
 dbt_jobs = dbt_get_jobs(dbt_account_id, settings.dbt_cloud_api, settings.dbt_token)
-tableau_creds = authenticate_tableau(settings.tableau_server, settings.tableau_site, settings.tableau_token_name, settings.tableau_token)
-tableau_databases = tableau_get_databaseServers(settings.tableau_server, settings.database_type_filter, settings.database_name_filter, tableau_creds)
-all_downstream_workbooks=[]
-
-for dbt_job in dbt_jobs:
-    dbt_models = dbt_get_models_for_job(settings.dbt_metadata_api,settings. dbt_token, dbt_job['id'])
-
-    if len(dbt_models)>0:
-        for tableau_database in tableau_databases:
-            merged_tables = merge_dbt_tableau_tables(tableau_database, dbt_models)
-
-            for merged_table in merged_tables:
-                tableau_columns = get_tableau_columns(settings.tableau_server, merged_table, tableau_creds)
-                table_description=make_table_description(merged_table)
-                publish_tableau_table_description(settings.tableau_server, merged_table, table_description, tableau_creds)
-                set_tableau_table_quality_warning(settings.tableau_server, merged_table, settings.tableau_dq_warning_isSevere, tableau_creds)
-                set_tableau_table_certification(settings.tableau_server, merged_table, settings.dbt_meta_certification_flag, settings.tableau_certification_note, tableau_creds)
-                publish_tableau_table_tags(settings.tableau_server, merged_table, tableau_creds)
-                publish_tableau_column_descriptions(settings.tableau_server, merged_table, tableau_columns, tableau_creds)
-                publish_tableau_column_tags(settings.tableau_server, tableau_columns, merged_table, tableau_creds)
-
-                if settings.dbt_generate_exposures:
-                    downstream_workbooks = tableau_get_downstream_workbooks(settings.tableau_server, merged_table, tableau_creds)
-                    for workbook in downstream_workbooks:
-                        workbook['dbt_projectId'] = merged_table['projectId']
-                        workbook['dbt_environmentId'] = merged_table['environmentId']
-                        all_downstream_workbooks.append(workbook)
-
-if len(all_downstream_workbooks)>0:
-    all_downstream_workbooks = remove_duplicate_workbooks(all_downstream_workbooks)
-    generate_dbt_exposures(dbt_account_id, settings.dbt_cloud_api, settings.dbt_token, settings.github_token, all_downstream_workbooks, settings.tableau_server, settings.tableau_site, settings.dbt_exposures_maturity)
+#reuses a cached tableau session token if one is still valid, and signs in again (updating tableau_creds in place) when tableau rejects the token
+tableau_credentials = credentialManager(lambda: authenticate_tableau(settings.tableau_server, settings.tableau_site, settings.tableau_token_name, settings.tableau_token),
+                                        settings.tableau_server.rstrip('/') + '|' + settings.tableau_site + '|' + settings.tableau_token_name, settings.tableau_token_cache_path or None)
+session.credential_manager = tableau_credentials
+tableau_creds = tableau_credentials.get_credentials()
+sync_state = syncStateStore(settings.tableau_sync_state_path) if settings.tableau_sync_state_path else None
+if sync_state is not None:
+    sync_state.bind_site(settings.tableau_server, tableau_creds['site']['id'])
+#plan mode: only collect the writes into a sync plan, saved for review and applied later in apply mode
+sync_plan = syncPlan(settings.tableau_server, tableau_creds['site']['id']) if settings.tableau_sync_mode == 'plan' else None
+with tracer.span('tableau.fetch_databases', profile=True):
+    tableau_databases = tableau_get_databaseServers_paged(settings.tableau_server, settings.database_type_filter, settings.database_name_filter, tableau_creds)
+run_failed = False
+#warehouse account of each dbt project, used to match dbt models to tableau database servers by host name
+dbt_project_accounts = {str(dbt_project['id']): dbt_project['connection']['details']['account'] for dbt_project in dbt_projects}
+#downstream workbooks of all jobs and databases, stored once per workbook luid
+workbook_registry = workbookRegistry()
+
+#the models of all jobs are fetched concurrently and merged and published once, so a model built by several jobs is only published for its latest run
+with tracer.span('dbt.fetch_models', profile=True, **{'dbt.jobs': len(dbt_jobs)}) as stage:
+    dbt_models, all_dbt_models = dbt_get_models_for_jobs(settings.dbt_metadata_api, settings.dbt_token, dbt_jobs, settings.dbt_fetch_workers)
+    stage.set_attribute('dbt.models', len(dbt_models))
+#journal of the writes completed by this run, flushed in batches. --resume skips the writes completed by the previous run if it was interrupted, as long as the dbt runs of the models are the same
+run_journal = None
+if sync_plan is None and settings.tableau_run_journal_path:
+    run_journal = runJournal(settings.tableau_run_journal_path, settings.tableau_server + '|' + settings.tableau_site + '|' + ','.join(sorted(str(dbt_job['id']) for dbt_job in dbt_jobs)) + '|' + dbt_runs_key(all_dbt_models), resume=command_line.resume)
+#(environment, uniqueId) of the models to publish, None to publish all of them
+changed_model_keys = None
+if settings.dbt_incremental and sync_state is not None:
+    #only publish models executed since the last fully synced run of their job. The watermarks of every job move forward, including the runs superseded by a later run of another job.
+    #all models are still merged, so the exposures are generated from the workbooks downstream of every model and not only of the changed ones
+    changed_dbt_models, new_watermarks = filter_models_since_watermarks(all_dbt_models, sync_state.get_watermarks())
+    changed_model_ids = set(id(dbt_model) for dbt_model in changed_dbt_models)
+    changed_model_keys = set(dbt_model_key(dbt_model) for dbt_model in dbt_models if id(dbt_model) in changed_model_ids)
+    print(str(len(changed_model_keys)) + ' of ' + str(len(dbt_models)) + ' dbt models to publish')
+del all_dbt_models
+
+if len(dbt_models)>0:
+    with tracer.span('dbt.index_models', profile=True, **{'dbt.models': len(dbt_models)}):
+        dbt_model_index = mergeIndex(dbt_models, accounts_by_project=dbt_project_accounts)
+    for tableau_database in tableau_databases:
+        with tracer.span('merge', profile=True, **{'tableau.database': tableau_database['name']}):
+            merged_tables = list(shard_tables(merge_dbt_tableau_tables(tableau_database, dbt_model_index), shard))
+        #tables of unchanged models (incremental mode) and tables whose writes were all completed by the resumed run are skipped
+        pending_tables = [merged_table for merged_table in merged_tables if (changed_model_keys is None or dbt_model_key(merged_table) in changed_model_keys) and any(journal_pending(merged_table, operation) for operation in (JOURNAL_TABLE_DESCRIPTION, JOURNAL_TABLE_DQ_WARNING, JOURNAL_TABLE_CERTIFICATION, JOURNAL_TABLE_TAGS, JOURNAL_COLUMN_DESCRIPTIONS, JOURNAL_COLUMN_TAGS))]
+        with tracer.span('tableau.fetch_columns', profile=True, **{'tableau.tables': len(pending_tables)}):
+            tableau_columns_by_table = tableau_get_columns_for_tables(settings.tableau_server, pending_tables, tableau_creds)
+
+        with tracer.span('tableau.publish', profile=True, **{'tableau.tables': len(pending_tables)}):
+            for merged_table in pending_tables:
+                tableau_columns = tableau_columns_by_table.get(merged_table['luid'], [])
+                #the dbt inputs of each published aspect, hashed by the sync state store to skip unchanged writes
+                table_state = {
+                    ASPECT_DESCRIPTION: [merged_table['description'], merged_table['stats']],
+                    ASPECT_DQ_WARNING: [merged_table['status'], merged_table['jobId'], merged_table['runId'], settings.tableau_dq_warning_isSevere],
+                    ASPECT_CERTIFICATION: [merged_table['meta'], settings.dbt_meta_certification_flag, settings.tableau_certification_note],
+                    ASPECT_TAGS: merged_table['packageName']
+                }
+                if sync_plan is not None:
+                    plan_tableau_table_operations(sync_plan, settings.tableau_server, merged_table, tableau_columns, table_state, settings.tableau_dq_warning_isSevere,
+                                                  settings.dbt_meta_certification_flag, settings.tableau_certification_note, tableau_creds)
+                    continue
+                if journal_pending(merged_table, JOURNAL_TABLE_DESCRIPTION) and sync_state_changed(merged_table['luid'], ASPECT_DESCRIPTION, table_state[ASPECT_DESCRIPTION]):
+                    table_description=make_table_description(merged_table)
+                    if publish_tableau_table_description(settings.tableau_server, merged_table, table_description, tableau_creds):
+                        record_sync_state(merged_table['luid'], ASPECT_DESCRIPTION, table_state[ASPECT_DESCRIPTION])
+                        journal_record(merged_table, JOURNAL_TABLE_DESCRIPTION)
+                    else:
+                        run_failed = True
+                if journal_pending(merged_table, JOURNAL_TABLE_DQ_WARNING) and sync_state_changed(merged_table['luid'], ASPECT_DQ_WARNING, table_state[ASPECT_DQ_WARNING]):
+                    if set_tableau_table_quality_warning(settings.tableau_server, merged_table, settings.tableau_dq_warning_isSevere, tableau_creds):
+                        record_sync_state(merged_table['luid'], ASPECT_DQ_WARNING, table_state[ASPECT_DQ_WARNING])
+                        journal_record(merged_table, JOURNAL_TABLE_DQ_WARNING)
+                    else:
+                        run_failed = True
+                if journal_pending(merged_table, JOURNAL_TABLE_CERTIFICATION) and sync_state_changed(merged_table['luid'], ASPECT_CERTIFICATION, table_state[ASPECT_CERTIFICATION]):
+                    if set_tableau_table_certification(settings.tableau_server, merged_table, settings.dbt_meta_certification_flag, settings.tableau_certification_note, tableau_creds):
+                        record_sync_state(merged_table['luid'], ASPECT_CERTIFICATION, table_state[ASPECT_CERTIFICATION])
+                        journal_record(merged_table, JOURNAL_TABLE_CERTIFICATION)
+                    else:
+                        run_failed = True
+                if journal_pending(merged_table, JOURNAL_TABLE_TAGS) and sync_state_changed(merged_table['luid'], ASPECT_TAGS, table_state[ASPECT_TAGS]):
+                    if publish_tableau_table_tags(settings.tableau_server, merged_table, tableau_creds):
+                        record_sync_state(merged_table['luid'], ASPECT_TAGS, table_state[ASPECT_TAGS])
+                        journal_record(merged_table, JOURNAL_TABLE_TAGS)
+                    else:
+                        run_failed = True
+                if journal_pending(merged_table, JOURNAL_COLUMN_DESCRIPTIONS):
+                    if publish_tableau_column_descriptions(settings.tableau_server, merged_table, tableau_columns, tableau_creds):
+                        journal_record(merged_table, JOURNAL_COLUMN_DESCRIPTIONS)
+                    else:
+                        run_failed = True
+                if journal_pending(merged_table, JOURNAL_COLUMN_TAGS):
+                    if publish_tableau_column_tags(settings.tableau_server, tableau_columns, merged_table, tableau_creds):
+                        journal_record(merged_table, JOURNAL_COLUMN_TAGS)
+                    else:
+                        run_failed = True
+
+        if settings.dbt_generate_exposures and len(merged_tables)>0:
+            merged_tables_by_luid = {merged_table['luid']: merged_table for merged_table in merged_tables}
+            with tracer.span('tableau.fetch_downstream_workbooks', profile=True, **{'tableau.tables': len(merged_tables)}):
+                downstream_workbooks = tableau_get_downstream_workbooks_for_tables(settings.tableau_server, merged_tables, tableau_creds)
+            workbook_registry.add_downstream_workbooks(downstream_workbooks, merged_tables_by_luid)
+
+#move the job watermarks forward once all of the changes were published
+if settings.dbt_incremental and sync_state is not None and not run_failed:
+    for (job_id, environment_id), watermark in new_watermarks.items():
+        if sync_plan is not None: #stored when the plan is applied
+            sync_plan.watermarks.append(dict(watermark, job_id=job_id, environment_id=environment_id))
+        else:
+            sync_state.set_watermark(job_id, environment_id, watermark)
+
+if shard is not None: #exposures are generated by the reduce step over the workbook files of all shards
+    write_shard_workbooks(shard_workbooks_path(settings.tableau_shard_workbooks_dir, shard), workbook_registry, shard)
+elif len(workbook_registry)>0:
+    with tracer.span('dbt.generate_exposures', profile=True, **{'tableau.workbooks': len(workbook_registry)}):
+        generate_dbt_exposures(dbt_account_id, settings.dbt_cloud_api, settings.dbt_token, settings.github_token, workbook_registry, settings.tableau_server, settings.tableau_site, settings.dbt_exposures_maturity, sync_plan)
+
+if sync_plan is not None:
+    sync_plan.save(settings.tableau_sync_plan_path)
+    print(sync_plan.summary(settings.tableau_apply_workers))
+
+if sync_state is not None:
+    sync_state.close()
+#the journal is removed once every write landed, and kept for --resume otherwise
+if run_journal is not None:
+    run_journal.close(completed=not run_failed)
+
+write_request_metrics(settings)
+write_stage_trace(settings, tracer)
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any
+
+from dbt_tableau.tableau import (
+    tableauClient,
+    format_table_references,
+    PUBLISH_UPDATED,
+    PUBLISH_FAILED,
+    PUBLISH_UNCHANGED
+)
+
+# Default number of Tableau API requests allowed in flight at once
+DEFAULT_MAX_CONCURRENCY=100
+
+logger = logging.getLogger(__name__)
+
+class asyncTableauClient:
+    """
+    asyncio counterpart of tableauClient. Every call is executed by the wrapped
+    tableauClient on a dedicated thread pool, and a semaphore caps the number of
+    requests in flight across all coroutines sharing this client.
+    """
+    def __init__(
+        self,
+        tableau_client: tableauClient,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY
+    ):
+        self.tableau_client=tableau_client
+        self.max_concurrency=max_concurrency
+        self._executor=ThreadPoolExecutor(
+            max_workers=max_concurrency,
+            thread_name_prefix="tableau"
+        )
+        self._semaphore=None
+
+    async def _run(self, method, *args) -> Any:
+        """
+        Runs a blocking tableauClient method on the thread pool once a concurrency slot is free.
+        """
+        # The semaphore is created lazily so that it is bound to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, method, *args)
+
+    async def authenticate(self) -> dict:
+        """
+        Authenticates with Tableau server and returns the authentication object.
+        """
+        return await self._run(self.tableau_client.authenticate)
+
+    async def get_databases(self, tableau_creds: dict, databases: list) -> List[Dict[str, Any]]:
+        """
+        Retrieves the metadata of all the tables within specified databases.
+        """
+        return await self._run(self.tableau_client.get_databases, tableau_creds, databases)
+
+    async def get_column_metadata(self, merged_table: dict, tableau_creds: dict) -> list:
+        """
+        Retrieves all columns for a table within the Tableau catalog.
+        """
+        return await self._run(self.tableau_client.get_column_metadata, merged_table, tableau_creds)
+
+    async def get_columns_for_tables(self, merged_tables: list, tableau_creds: dict) -> Dict[str, list]:
+        """
+        Retrieves the columns of many tables, keyed by table luid.
+        """
+        return await self._run(
+            self.tableau_client.get_columns_for_tables, merged_tables, tableau_creds
+        )
+
+    async def get_downstream_workbooks(self, merged_table: dict, tableau_creds: dict) -> list:
+        """
+        Fetches the Tableau workbooks that sit downstream of a specified table.
+        """
+        return await self._run(
+            self.tableau_client.get_downstream_workbooks, merged_table, tableau_creds
+        )
+
+    async def get_downstream_workbooks_for_tables(
+        self,
+        merged_tables: list,
+        tableau_creds: dict
+        ) -> Dict[str, dict]:
+        """
+        Fetches the Tableau workbooks downstream of many tables, keyed by workbook luid.
+        """
+        return await self._run(
+            self.tableau_client.get_downstream_workbooks_for_tables, merged_tables, tableau_creds
+        )
+
+    async def publish_column_descriptions(
+        self,
+        merged_table: dict,
+        tableau_columns: list,
+        tableau_creds: dict
+        ) -> tuple:
+        """
+        Publishes column descriptions to Tableau catalog, issuing one concurrent
+        request per changed column. Returns the same (success, failure, unchanged)
+        counts as tableauClient.publish_column_descriptions.
+        """
+        full_table_name = format_table_references(merged_table)
+        logger.info("Publishing Tableau column descriptions for table: %s", full_table_name)
+
+        merged_columns = self.tableau_client.merge_column_metadata(merged_table, tableau_columns)
+        results = await asyncio.gather(*(
+            self._run(
+                self.tableau_client.publish_column_description, merged_table, column, tableau_creds
+            )
+            for column in merged_columns
+        ))
+        success_count = results.count(PUBLISH_UPDATED)
+        failure_count = results.count(PUBLISH_FAILED)
+        unchanged_count = results.count(PUBLISH_UNCHANGED)
+
+        logger.info("Completed publishing descriptions for %s", full_table_name)
+        logger.info(
+            "Success: %s, Failures: %s, Skipped (unchanged): %s",
+            success_count, failure_count, unchanged_count
+        )
+
+        return success_count, failure_count, unchanged_count
+
+    async def publish_table_description(
+        self,
+        merged_table: dict,
+        description_text: str,
+        tableau_creds: dict
+        ) -> str:
+        """
+        Updates a table description in Tableau's catalog with dbt documentation
+        unless it is unchanged. Returns the publish status.
+        """
+        return await self._run(
+            self.tableau_client.publish_table_description,
+            merged_table,
+            description_text,
+            tableau_creds
+        )
+
+    def close(self):
+        """
+        Shuts down the thread pool used to execute requests.
+        """
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,167 @@
+import json
+import logging
+import os
+import stat
+import threading
+import time
+from typing import Callable, Optional
+
+# Default location of the on-disk Tableau session token cache
+DEFAULT_TOKEN_CACHE_PATH=os.path.join(os.path.expanduser("~"), ".tableau_token_cache.json")
+# Lifetime assumed for a session token when Tableau does not report one (the server default is 240 minutes)
+DEFAULT_TOKEN_TTL=120 * 60
+# Tokens this close to their expiry are not reused
+EXPIRY_MARGIN=5 * 60
+
+logger = logging.getLogger(__name__)
+
+# Serializes the read-modify-write of the cache file by the credential managers
+# of one process, e.g. the sites of a multi-site run signing in at once
+_cache_file_lock=threading.Lock()
+
+def parse_time_to_expiration(value: Optional[str]) -> Optional[float]:
+    """
+    Parses the estimatedTimeToExpiration (HHH:MM:SS) of a Tableau sign-in response into seconds.
+    """
+    if not value:
+        return None
+    try:
+        hours, minutes, seconds = (int(part) for part in value.split(":"))
+    except ValueError:
+        return None
+    return hours * 3600 + minutes * 60 + seconds
+
+class credentialManager:
+    """
+    Owns the Tableau session token of one server, site and personal access token.
+    The token is cached on disk with its expiry in a file only readable by the
+    current user, so short CLI invocations reuse it instead of signing in again
+    (a new PAT sign-in also ends the previous session of the same token).
+    When a request is rejected with 401 the session is renewed once and the
+    credentials dict handed out earlier is updated in place, so every holder of
+    it picks up the new token.
+    """
+    def __init__(
+        self,
+        sign_in: Callable[[], dict],
+        cache_key: str,
+        cache_path: Optional[str] = DEFAULT_TOKEN_CACHE_PATH,
+        token_ttl: float = DEFAULT_TOKEN_TTL
+    ):
+        """
+        args:
+            sign_in: signs in to Tableau and returns the credentials of the response.
+            cache_key: identifies the server, site and token name in the cache file.
+            cache_path: path of the token cache. None disables caching.
+            token_ttl: token lifetime in seconds if the sign-in response has none.
+        """
+        self.sign_in=sign_in
+        self.cache_key=cache_key
+        self.cache_path=cache_path
+        self.token_ttl=token_ttl
+        self.credentials=None
+        self.expires_at=0.0
+        self._previous_tokens=set()
+        self._lock=threading.Lock()
+
+    def get_credentials(self) -> dict:
+        """
+        Returns valid Tableau credentials, from memory, the token cache or a new sign-in.
+        """
+        with self._lock:
+            if self.credentials is None or self._expiring():
+                cached = self._read_cache()
+                if cached is not None:
+                    self._set_credentials(cached["credentials"], cached["expires_at"])
+                    logger.info("Reusing cached Tableau session token")
+                else:
+                    self._renew()
+            return self.credentials
+
+    def refresh(self, rejected_token: str) -> Optional[str]:
+        """
+        Renews the session after rejected_token got a 401 and returns the new token.
+        If another thread already renewed it, the current token is returned
+        without signing in again. Returns None if the rejected token is not ours.
+        """
+        with self._lock:
+            if self.credentials is None:
+                return None
+            if self.credentials["token"] != rejected_token:
+                return self.credentials["token"] if rejected_token in self._previous_tokens else None
+            logger.warning("Tableau session token was rejected, signing in again")
+            self._renew()
+            return self.credentials["token"]
+
+    def invalidate(self):
+        """
+        Drops the cached token, e.g. after signing out.
+        """
+        with self._lock:
+            self.expires_at=0.0
+            with _cache_file_lock:
+                cache = self._load_cache_file()
+                if cache.pop(self.cache_key, None) is not None:
+                    self._write_cache_file(cache)
+
+    def _renew(self):
+        credentials = self.sign_in()
+        ttl = parse_time_to_expiration(credentials.get("estimatedTimeToExpiration"))
+        self._set_credentials(credentials, time.time() + (ttl if ttl is not None else self.token_ttl))
+        self._write_cache()
+
+    def _set_credentials(self, credentials: dict, expires_at: float):
+        if self.credentials is None:
+            self.credentials = credentials
+        else:
+            # Update in place so callers holding the dict see the new token
+            self._previous_tokens.add(self.credentials["token"])
+            self.credentials.clear()
+            self.credentials.update(credentials)
+        self.expires_at = expires_at
+
+    def _expiring(self) -> bool:
+        return time.time() >= self.expires_at - EXPIRY_MARGIN
+
+    def _read_cache(self) -> Optional[dict]:
+        cached = self._load_cache_file().get(self.cache_key)
+        if cached is None or time.time() >= cached["expires_at"] - EXPIRY_MARGIN:
+            return None
+        return cached
+
+    def _write_cache(self):
+        if self.cache_path is None:
+            return
+        with _cache_file_lock:
+            cache = self._load_cache_file()
+            # Drop expired entries of other sites while the file is rewritten
+            cache = {key: value for key, value in cache.items() if value["expires_at"] > time.time()}
+            cache[self.cache_key] = {"credentials": self.credentials, "expires_at": self.expires_at}
+            self._write_cache_file(cache)
+
+    def _load_cache_file(self) -> dict:
+        if self.cache_path is None or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            mode = os.stat(self.cache_path).st_mode
+            if os.name == "posix" and mode & (stat.S_IRWXG | stat.S_IRWXO):
+                logger.warning(
+                    "Ignoring Tableau token cache %s readable by other users", self.cache_path
+                )
+                return {}
+            with open(self.cache_path) as cache_file:
+                return json.load(cache_file)
+        except (OSError, ValueError) as e:
+            logger.warning("Could not read Tableau token cache %s: %s", self.cache_path, str(e))
+            return {}
+
+    def _write_cache_file(self, cache: dict):
+        # The file is created with owner-only permissions before any token is written to it
+        temp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            file_descriptor = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(file_descriptor, "w") as cache_file:
+                json.dump(cache, cache_file)
+            os.replace(temp_path, self.cache_path)
+        except OSError as e:
+            logger.warning("Could not write Tableau token cache %s: %s", self.cache_path, str(e))
@@ -1,22 +1,122 @@
+import asyncio
 import json
 import logging
-from typing import List, Dict, Any
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple, Iterator
 import requests
+from dbt_tableau.http_session import pooledSession
+from dbt_tableau.metrics import instrumented_request
+from dbt_tableau.records import modelRecord
+
+# GraphQL query paging through the applied state of an environment's models
+APPLIED_MODELS_QUERY = """
+query getAppliedModels(
+    $environmentId: BigInt!,
+    $first: Int,
+    $after: String,
+    $filter: ModelAppliedFilter
+) {
+    environment(id: $environmentId) {
+        applied {
+            models(first: $first, after: $after, filter: $filter) {
+                edges {
+                    node {
+                        uniqueId
+                        packageName
+                        accountId
+                        projectId
+                        environmentId
+                        database
+                        schema
+                        name
+                        alias
+                        description
+                        meta
+                        executionInfo {
+                            lastRunId
+                            lastJobDefinitionId
+                            lastRunStatus
+                            executionTime
+                            executeCompletedAt
+                        }
+                        catalog {
+                            columns {
+                                name
+                                description
+                            }
+                            stats {
+                                id
+                                value
+                            }
+                        }
+                    }
+                }
+                pageInfo {
+                    hasNextPage
+                    endCursor
+                }
+            }
+        }
+    }
+}
+"""
+
+def _post(
+    session: Optional[requests.Session],
+    url: str,
+    retry_read_timeouts: bool = True,
+    **kwargs) -> requests.Response:
+    """
+    Posts to the dbt API with session (or a one-off connection without one), recording
+    the request in the metrics registry unless a pooledSession already does.
+    args:
+        retry_read_timeouts: False keeps the retry policy of a pooledSession from
+            sending a request again after it timed out, e.g. a request with a long timeout.
+    """
+    if isinstance(session, pooledSession):
+        if not retry_read_timeouts and session.retry_policy is not None:
+            kwargs["retry_policy"] = session.retry_policy.without_read_timeout_retries()
+        return session.post(url, **kwargs)
+    http = session if session is not None else requests
+    return instrumented_request(http.request, "POST", url, **kwargs)
+
+def _get(session: Optional[requests.Session], url: str, **kwargs) -> requests.Response:
+    """
+    GET counterpart of _post.
+    """
+    if isinstance(session, pooledSession):
+        return session.get(url, **kwargs)
+    http = session if session is not None else requests
+    return instrumented_request(http.request, "GET", url, **kwargs)
+
+def _model_record_hook(node: Dict[str, Any]):
+    return modelRecord(node) if "uniqueId" in node else node
 
 def get_models_for_job(
     discovery_api_url: str,
     api_key: str,
-    job_id: int) -> List[Dict[str, Any]]:
+    job_id: int,
+    session: requests.Session = None,
+    run_id: Optional[int] = None) -> List[modelRecord]:
     """
-    Retrieve all dbt models associated with a specific dbt job using the dbt Metadata API.
+    Retrieve all dbt models associated with a specific dbt job using the dbt Metadata API,
+    as modelRecords. Pass a pooled session (e.g. tableauClient.session) to reuse its
+    keep-alive connections.
+    args:
+        run_id: only return the models built by this run of the job, e.g. the run
+            of a "job run completed" webhook. Defaults to the latest run.
     """
     logging.info("Getting dbt models for job id: %s", str(job_id))
     headers = {"Content-Type": "application/json", "Authorization": f"Token {api_key}"}
+    run_filter = f", runId: {int(run_id)}" if run_id is not None else ""
     # GraphQL query to retrieve model details
     query = (
     """
     query {
-        models(jobId: %d) {
+        models(jobId: %d%s) {
             uniqueId
             packageName
             runId
@@ -46,15 +146,19 @@ def get_models_for_job(
         }
     }
     """
-         % job_id
+         % (job_id, run_filter)
     )
 
     payload = {"query": query, "variables": {}}
     try:
-        response = requests.post(
-            discovery_api_url, headers=headers, json=payload, timeout=3600
+        # A response not received within the hour is not waited for again
+        response = _post(
+            session, discovery_api_url, headers=headers, json=payload, timeout=3600,
+            retry_read_timeouts=False
         )
-        response_json = response.json()
+        # The response is buffered and parsed whole; the saving is that models are built as slotted
+        # modelRecords instead of dicts, which keeps them several times smaller
+        response_json = response.json(object_hook=_model_record_hook)
         models = response_json["data"]["models"]
         logging.info("Retrieved %d dbt models for job id: %d", len(models), job_id)
         return models
@@ -68,3 +172,308 @@ def get_models_for_job(
     except json.JSONDecodeError as e:
         logging.error("Invalid JSON response from dbt Cloud API: %s", str(e))
         raise
+
+def get_completed_runs(
+    api_base_url: str,
+    api_key: str,
+    account_id: int,
+    job_id: int,
+    after_run_id: Optional[int] = None,
+    session: requests.Session = None,
+    limit: int = 100) -> List[Dict[str, Any]]:
+    """
+    Returns the finished runs (succeeded, errored or cancelled) of a job newer
+    than after_run_id, oldest first, from the dbt Cloud Administrative API.
+    Pages back through the runs of the job until after_run_id, so no run is
+    missed however many ran since. Without after_run_id, only the latest page
+    is looked at.
+    args:
+        api_base_url: dbt Cloud base URL, e.g. https://cloud.getdbt.com.
+        limit: runs requested per page.
+    """
+    url = f"{api_base_url.rstrip('/')}/api/v2/accounts/{account_id}/runs/"
+    headers = {"Accept": "application/json", "Authorization": f"Token {api_key}"}
+    runs = []
+    offset = 0
+    while True:
+        params = {"job_definition_id": job_id, "order_by": "-id", "limit": limit, "offset": offset}
+        response = _get(session, url, headers=headers, params=params, timeout=60)
+        response.raise_for_status()
+        page = response.json()["data"]
+        runs.extend(
+            run for run in page
+            if run.get("is_complete") and (after_run_id is None or run["id"] > after_run_id)
+        )
+        if after_run_id is None or len(page) < limit or any(run["id"] <= after_run_id for run in page):
+            break
+        offset += len(page)
+    return sorted(runs, key=lambda run: run["id"])
+
+async def get_models_for_job_async(
+    discovery_api_url: str,
+    api_key: str,
+    job_id: int,
+    semaphore: asyncio.Semaphore = None,
+    session: requests.Session = None,
+    run_id: Optional[int] = None) -> List[modelRecord]:
+    """
+    asyncio counterpart of get_models_for_job. The request runs on a worker thread
+    so the event loop stays free; pass a semaphore to count it against a shared
+    concurrency limit.
+    """
+    if semaphore is None:
+        return await asyncio.to_thread(
+            get_models_for_job, discovery_api_url, api_key, job_id, session, run_id
+        )
+    async with semaphore:
+        return await asyncio.to_thread(
+            get_models_for_job, discovery_api_url, api_key, job_id, session, run_id
+        )
+
+def _parse_execute_completed_at(value: Optional[str]) -> Optional[datetime]:
+    """
+    Parses an executeCompletedAt timestamp returned by the dbt Metadata API.
+    """
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+def watermark_key(model: Dict[str, Any]) -> Tuple[str, str]:
+    """
+    Returns the (job id, environment id) key a model's watermark is stored under.
+    """
+    return str(model["jobId"]), str(model["environmentId"])
+
+def filter_models_since_watermarks(
+    models: List[Dict[str, Any]],
+    watermarks: Dict[Tuple[str, str], Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], Dict[Tuple[str, str], Dict[str, Any]]]:
+    """
+    Keeps only the models that were executed after the stored watermark of their
+    job/environment. Models of a job/environment without a watermark are all kept.
+    args:
+        models: models returned by get_models_for_job.
+        watermarks: watermarks keyed by (job id, environment id), as returned by
+            syncStateStore.get_watermarks.
+
+    Returns: the changed models and the new watermarks (the latest executeCompletedAt
+        and its runId per job/environment), to be stored once the changed models
+        have been synced.
+    """
+    changed_models = []
+    new_watermarks = {}
+    for model in models:
+        completed_at = _parse_execute_completed_at(model.get("executeCompletedAt"))
+        key = watermark_key(model)
+        watermark = watermarks.get(key)
+
+        if watermark is None:
+            changed_models.append(model)
+        elif completed_at is not None and str(model["runId"]) != str(watermark["runId"]) and (
+            completed_at > _parse_execute_completed_at(watermark["executeCompletedAt"])
+        ):
+            changed_models.append(model)
+
+        if completed_at is not None and (
+            key not in new_watermarks
+            or completed_at > _parse_execute_completed_at(new_watermarks[key]["executeCompletedAt"])
+        ):
+            new_watermarks[key] = {
+                "executeCompletedAt": model["executeCompletedAt"],
+                "runId": model["runId"]
+            }
+
+    logging.info(
+        "%d of %d dbt models changed since the last synced run", len(changed_models), len(models)
+    )
+    return changed_models, new_watermarks
+
+def latest_models(models: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Collapses the models built by several jobs (e.g. an hourly and a nightly job)
+    to one record per model, keeping the one with the latest executeCompletedAt.
+    Models are keyed by uniqueId within their environment, since the jobs of
+    another environment (e.g. staging) build the same model in another schema.
+    Models without executeCompletedAt only win over models without one either.
+    """
+    latest = {}
+    for model in models:
+        key = (str(model.get("environmentId")), model["uniqueId"])
+        current = latest.get(key)
+        if current is None:
+            latest[key] = model
+            continue
+        completed_at = _parse_execute_completed_at(model.get("executeCompletedAt"))
+        current_completed_at = _parse_execute_completed_at(current.get("executeCompletedAt"))
+        if completed_at is not None and (current_completed_at is None or completed_at > current_completed_at):
+            latest[key] = model
+    logging.info(
+        "%d dbt models built by the jobs, %d after keeping the latest run of each", len(models), len(latest)
+    )
+    return list(latest.values())
+
+def _normalize_applied_model(node: Dict[str, Any]) -> modelRecord:
+    """
+    Flattens an applied model node of the environment API into the modelRecord
+    returned by get_models_for_job, so both loaders feed the same merge and publish code.
+    """
+    execution_info = node.get("executionInfo") or {}
+    catalog = node.get("catalog") or {}
+    return modelRecord(
+        uniqueId=node["uniqueId"],
+        packageName=node.get("packageName"),
+        runId=execution_info.get("lastRunId"),
+        accountId=node.get("accountId"),
+        projectId=node.get("projectId"),
+        environmentId=node.get("environmentId"),
+        jobId=execution_info.get("lastJobDefinitionId"),
+        executionTime=execution_info.get("executionTime"),
+        status=execution_info.get("lastRunStatus"),
+        executeCompletedAt=execution_info.get("executeCompletedAt"),
+        database=node.get("database"),
+        schema=node.get("schema"),
+        name=node.get("name"),
+        alias=node.get("alias") or node.get("name"),
+        description=node.get("description"),
+        meta=node.get("meta") or {},
+        stats=catalog.get("stats") or [],
+        columns=catalog.get("columns") or []
+    )
+
+def get_applied_models_page(
+    discovery_api_url: str,
+    api_key: str,
+    environment_id: int,
+    first: int,
+    after: Optional[str] = None,
+    model_filter: Optional[Dict[str, Any]] = None,
+    session: requests.Session = None,
+    timeout: float = 300) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Retrieves one page of an environment's applied models from the dbt Discovery API.
+    A page that times out is requested again by the retry policy of the session, if any.
+
+    Returns: the normalized models of the page and its pageInfo (hasNextPage, endCursor).
+    """
+    headers = {"Content-Type": "application/json", "Authorization": f"Token {api_key}"}
+    payload = {
+        "query": APPLIED_MODELS_QUERY,
+        "variables": {
+            "environmentId": environment_id,
+            "first": first,
+            "after": after,
+            "filter": model_filter
+        }
+    }
+
+    try:
+        response = _post(session, discovery_api_url, headers=headers, json=payload, timeout=timeout)
+        response.raise_for_status()
+        response_json = response.json()
+        if response_json.get("errors"):
+            raise ValueError(response_json["errors"][0]["message"])
+        models_connection = response_json["data"]["environment"]["applied"]["models"]
+        models = [_normalize_applied_model(edge["node"]) for edge in models_connection["edges"]]
+        return models, models_connection["pageInfo"]
+
+    except requests.exceptions.Timeout:
+        logging.error("Timeout retrieving dbt models page after cursor %s", after)
+        raise
+    except requests.exceptions.RequestException as e:
+        logging.error("Error connecting to dbt Cloud API: %s", str(e))
+        raise
+    except json.JSONDecodeError as e:
+        logging.error("Invalid JSON response from dbt Cloud API: %s", str(e))
+        raise
+
+def iter_applied_models(
+    discovery_api_url: str,
+    api_key: str,
+    environment_id: int,
+    page_size: int = 500,
+    partitions: Optional[List[Dict[str, Any]]] = None,
+    max_workers: int = 4,
+    max_pending_pages: int = 8,
+    page_timeout: float = 300,
+    session: requests.Session = None) -> Iterator[Dict[str, Any]]:
+    """
+    Streams the applied models of a dbt environment page by page (first/after cursors),
+    yielding model records in the format returned by get_models_for_job.
+
+    Cursors make the pages of one partition sequential, so parallelism comes from
+    partitions: each filter in partitions (e.g. {"database": "analytics", "schema": "marts"})
+    is paged by its own worker, up to max_workers at a time. Pages are handed over
+    through a queue of at most max_pending_pages pages, so memory is bounded by
+    page_size * max_pending_pages rather than by project size, and a slow partition
+    does not stop the others from being consumed.
+    args:
+        partitions: list of ModelAppliedFilter dicts that together cover the models to
+            load. Defaults to a single partition with all models of the environment.
+        page_timeout: timeout in seconds of a single page request.
+    """
+    partitions = partitions or [None]
+    pages = queue.Queue(maxsize=max_pending_pages)
+    stop = threading.Event()
+    done_marker = object()
+
+    def put(item):
+        # Gives up once the consumer has stopped reading so workers don't block forever
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def load_partition(model_filter):
+        try:
+            cursor = None
+            has_next_page = True
+            while has_next_page and not stop.is_set():
+                models, page_info = get_applied_models_page(
+                    discovery_api_url,
+                    api_key,
+                    environment_id,
+                    page_size,
+                    cursor,
+                    model_filter,
+                    session,
+                    page_timeout
+                )
+                if not put(models):
+                    return
+                has_next_page = page_info["hasNextPage"]
+                cursor = page_info["endCursor"]
+        except Exception as e:
+            put(e)
+        finally:
+            put(done_marker)
+
+    logging.info(
+        "Streaming dbt models for environment id: %s in %d partition(s)",
+        str(environment_id), len(partitions)
+    )
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dbt-models")
+    for model_filter in partitions:
+        executor.submit(load_partition, model_filter)
+
+    model_count = 0
+    remaining_partitions = len(partitions)
+    try:
+        while remaining_partitions:
+            item = pages.get()
+            if item is done_marker:
+                remaining_partitions -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                model_count += len(item)
+                yield from item
+    finally:
+        stop.set()
+        executor.shutdown(wait=False)
+
+    logging.info(
+        "Retrieved %d dbt models for environment id: %s", model_count, str(environment_id)
+    )
@@ -0,0 +1,136 @@
+import logging
+import threading
+from typing import Optional
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from dbt_tableau.retry import retryPolicy, adaptiveConcurrencyLimiter, send_with_retry
+from dbt_tableau.metrics import REGISTRY, metricsRegistry, endpoint_family, instrumented_request
+
+# Maximum number of keep-alive connections kept open per host
+DEFAULT_POOL_SIZE=100
+# Number of distinct hosts (Tableau, dbt Cloud, ...) with their own connection pool
+DEFAULT_POOL_CONNECTIONS=10
+# Seconds to wait for a response when a call does not pass its own timeout
+DEFAULT_TIMEOUT=60
+
+logger = logging.getLogger(__name__)
+
+class pooledSession(requests.Session):
+    """
+    requests.Session that reuses keep-alive connections from a bounded pool,
+    asks for gzip encoded responses and applies a default timeout to every request.
+    With a retry policy, throttled and failed requests are sent again as the policy
+    allows, and with adaptive_concurrency the requests in flight to each host are
+    capped by an AIMD limiter that backs off when the host throttles. With a
+    credential_manager, a request rejected with 401 is sent once more with a
+    renewed Tableau session token.
+    Every attempt is recorded in the metrics registry (the shared REGISTRY by default).
+    The session can be shared between threads, e.g. the workers of asyncTableauClient.
+    """
+    def __init__(
+        self,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        timeout: float = DEFAULT_TIMEOUT,
+        pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+        retry_policy: Optional[retryPolicy] = None,
+        adaptive_concurrency: bool = False,
+        metrics: Optional[metricsRegistry] = None
+    ):
+        super().__init__()
+        self.timeout=timeout
+        self.pool_size=pool_size
+        self.retry_policy=retry_policy
+        self.adaptive_concurrency=adaptive_concurrency
+        self._limiters={}
+        self._limiters_lock=threading.Lock()
+        # Renews the Tableau session token when a request is rejected with 401
+        self.credential_manager=None
+        self.metrics=metrics if metrics is not None else REGISTRY
+        # pool_block makes threads wait for a free connection instead of opening
+        # connections that are thrown away after a single request
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_size,
+            pool_block=True
+        )
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+        self.headers.update({"Accept-Encoding": "gzip, deflate"})
+
+    def request(self, method, url, retry_policy: Optional[retryPolicy] = None, **kwargs) -> requests.Response:
+        """
+        Sends a request like requests.Session.request.
+        args:
+            retry_policy: retry policy of this request instead of the one of the session,
+                e.g. one that does not retry the read timeout of a long request.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        policy = retry_policy if retry_policy is not None else self.retry_policy
+        response = self._send(method, url, policy, **kwargs)
+        if response.status_code == 401 and self.credential_manager is not None:
+            headers = kwargs.get("headers") or {}
+            auth_header = next((name for name in headers if name.lower() == "x-tableau-auth"), None)
+            if auth_header is not None:
+                new_token = self.credential_manager.refresh(headers[auth_header])
+                if new_token is not None:
+                    self.metrics.record_reauthentication(endpoint_family(method, url))
+                    kwargs["headers"] = dict(headers, **{auth_header: new_token})
+                    response = self._send(method, url, policy, **kwargs)
+        return response
+
+    def _send(self, method, url, policy: Optional[retryPolicy], **kwargs) -> requests.Response:
+        if policy is None:
+            return self._send_once(method, url, **kwargs)
+        family = endpoint_family(method, url)
+        return send_with_retry(
+            self._send_once,
+            method,
+            url,
+            policy,
+            self.get_limiter(url),
+            on_retry=lambda: self.metrics.record_retry(family),
+            **kwargs
+        )
+
+    def _send_once(self, method, url, **kwargs) -> requests.Response:
+        return instrumented_request(super().request, method, url, self.metrics, **kwargs)
+
+    def get_limiter(self, url: str) -> Optional[adaptiveConcurrencyLimiter]:
+        """
+        Returns the concurrency limiter of the host of url, or None without adaptive concurrency.
+        """
+        if not self.adaptive_concurrency:
+            return None
+        host = urlsplit(url).netloc.lower()
+        with self._limiters_lock:
+            if host not in self._limiters:
+                self._limiters[host] = adaptiveConcurrencyLimiter(self.pool_size)
+            return self._limiters[host]
+
+def create_session(
+    pool_size: int = DEFAULT_POOL_SIZE,
+    timeout: float = DEFAULT_TIMEOUT,
+    retry_policy: Optional[retryPolicy] = None,
+    adaptive_concurrency: bool = False,
+    metrics: Optional[metricsRegistry] = None
+    ) -> pooledSession:
+    """
+    Creates a pooled HTTP session.
+    args:
+        pool_size: maximum number of keep-alive connections per host. Should be at least
+            the number of threads issuing requests concurrently. Also the upper bound
+            of the adaptive concurrency limit.
+        timeout: default request timeout in seconds.
+        retry_policy: retries throttled and failed requests when given.
+        adaptive_concurrency: adapts the requests in flight per host to throttling.
+        metrics: registry recording the requests of the session, REGISTRY by default.
+    """
+    logger.debug("Creating HTTP session with pool size %s and timeout %s", pool_size, timeout)
+    return pooledSession(
+        pool_size=pool_size,
+        timeout=timeout,
+        retry_policy=retry_policy,
+        adaptive_concurrency=adaptive_concurrency,
+        metrics=metrics
+    )
@@ -0,0 +1,245 @@
+import logging
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple
+
+from dbt_tableau.records import mergedTableRecord
+
+# Host name suffixes stripped from Tableau database server host names so they
+# compare equal to the account identifier of a dbt connection. Longest first, so
+# the most specific suffix is stripped
+HOST_SUFFIXES=tuple(sorted((".snowflakecomputing.com", ".privatelink.snowflakecomputing.com"), key=len, reverse=True))
+
+logger = logging.getLogger(__name__)
+
+def normalize_identifier(identifier: Optional[str]) -> Optional[str]:
+    """
+    Normalizes a database identifier for comparison: strips surrounding whitespace,
+    double quotes, backticks and square brackets and lower-cases the result.
+    """
+    if identifier is None:
+        return None
+    identifier = identifier.strip()
+    if len(identifier) >= 2 and (
+        (identifier[0] == '"' and identifier[-1] == '"')
+        or (identifier[0] == "`" and identifier[-1] == "`")
+        or (identifier[0] == "[" and identifier[-1] == "]")
+    ):
+        identifier = identifier[1:-1]
+    return identifier.lower()
+
+def split_qualified_name(full_name: str) -> List[str]:
+    """
+    Splits a qualified name such as [DB].[SCHEMA].[TABLE], "db"."schema"."table" or
+    schema.table into its normalized parts. Dots inside quoted or bracketed
+    identifiers are not treated as separators.
+    """
+    parts = []
+    current = []
+    closing_char = None
+    for char in full_name:
+        if closing_char is not None:
+            current.append(char)
+            if char == closing_char:
+                closing_char = None
+        elif char == ".":
+            parts.append("".join(current))
+            current = []
+        else:
+            if char == "[":
+                closing_char = "]"
+            elif char in ('"', "`"):
+                closing_char = char
+            current.append(char)
+    parts.append("".join(current))
+    return [normalize_identifier(part) for part in parts]
+
+def normalize_account(account: Optional[str]) -> Optional[str]:
+    """
+    Normalizes a warehouse account identifier or Tableau database server host name,
+    e.g. https://XY12345.eu-west-1.snowflakecomputing.com:443 -> xy12345.eu-west-1
+    """
+    if not account:
+        return None
+    account = account.strip().lower()
+    if "://" in account:
+        account = account.split("://", 1)[1]
+    account = account.split("/", 1)[0].split(":", 1)[0]
+    for suffix in HOST_SUFFIXES:
+        if account.endswith(suffix):
+            account = account[:-len(suffix)]
+            break
+    return account
+
+def _account_candidates(host: Optional[str]) -> List[str]:
+    # A host name matches accounts equal to any of its leading labels, so a server
+    # xy12345.eu-west-1 matches both the "xy12345.eu-west-1" and "xy12345" accounts
+    host = normalize_account(host)
+    if host is None:
+        return []
+    labels = host.split(".")
+    return [".".join(labels[:i]) for i in range(len(labels), 0, -1)]
+
+class mergeIndex:
+    """
+    Hash index of dbt models used to join them with Tableau tables in a single pass.
+    Models are keyed on the normalized (account, database, schema, alias) of the
+    relation they build, so matching a table is a dictionary lookup instead of a
+    scan over all models. Build the index once per run and reuse it for every
+    Tableau database.
+
+    Tables are matched on the most specific key available: with a database server
+    host name on (account, database, schema, name), without one on (database,
+    schema, name), and for names missing the database on (schema, name). The looser
+    keys only match when they identify a single model.
+    """
+    def __init__(
+        self,
+        dbt_models: Iterable[dict] = (),
+        account: Optional[str] = None,
+        accounts_by_project: Optional[Dict[Any, str]] = None
+    ):
+        self._by_key={}
+        self._by_relation={}
+        self._by_schema_alias={}
+        self.add_models(dbt_models, account, accounts_by_project)
+
+    def __len__(self) -> int:
+        return len(self._by_key)
+
+    def copy(self) -> "mergeIndex":
+        """
+        Returns a copy of the index, to add models to without changing this one.
+        The models themselves are shared, not copied.
+        """
+        index = type(self)()
+        index._by_key = dict(self._by_key)
+        index._by_relation = {key: dict(models) for key, models in self._by_relation.items()}
+        index._by_schema_alias = {key: dict(models) for key, models in self._by_schema_alias.items()}
+        return index
+
+    def add_models(
+        self,
+        dbt_models: Iterable[dict],
+        account: Optional[str] = None,
+        accounts_by_project: Optional[Dict[Any, str]] = None
+        ):
+        """
+        Adds dbt models to the index. A model added again for the same relation
+        replaces the previous one.
+        args:
+            account: warehouse account of the dbt connection the models were built with.
+                Models without an account match tables on any database server.
+            accounts_by_project: warehouse account keyed by dbt project id, for models
+                of several projects.
+        """
+        for model in dbt_models:
+            model_account = account
+            if model_account is None and accounts_by_project:
+                model_account = accounts_by_project.get(str(model.get("projectId")))
+            self.add_model(model, model_account)
+
+    def add_model(self, model: dict, account: Optional[str] = None):
+        """
+        Adds a single dbt model to the index.
+        """
+        account = normalize_account(account)
+        database = normalize_identifier(model["database"])
+        schema = normalize_identifier(model["schema"])
+        alias = normalize_identifier(model.get("alias") or model["name"])
+
+        self._by_key[(account, database, schema, alias)] = model
+        self._by_relation.setdefault((database, schema, alias), {})[account] = model
+        self._by_schema_alias.setdefault((schema, alias), {})[(account, database)] = model
+
+    def resolve_table(
+        self,
+        table: dict,
+        database_name: Optional[str] = None
+        ) -> Tuple[Optional[str], Optional[str], str]:
+        """
+        Returns the normalized (database, schema, name) of a Tableau table. Parts
+        missing from its fullName are taken from the table's schema field and from
+        the database it was listed under.
+        args:
+            database_name: name of the Tableau database the table belongs to. Defaults
+                to the databaseName added by tableauClient.iter_database_tables.
+        """
+        parts = split_qualified_name(table.get("fullName") or table["name"])
+        name = parts[-1]
+        schema = parts[-2] if len(parts) >= 2 else normalize_identifier(table.get("schema"))
+        if len(parts) >= 3:
+            database = parts[-3]
+        else:
+            database = normalize_identifier(database_name or table.get("databaseName"))
+        return database, schema or None, name
+
+    def match(
+        self,
+        database: Optional[str],
+        schema: Optional[str],
+        name: str,
+        host: Optional[str] = None
+        ) -> Optional[dict]:
+        """
+        Returns the dbt model building the given relation, or None. Identifiers
+        are normalized before the lookup.
+        """
+        database = normalize_identifier(database)
+        schema = normalize_identifier(schema)
+        name = normalize_identifier(name)
+
+        if database is None:
+            candidates = self._by_schema_alias.get((schema, name), {})
+            return self._single_candidate(candidates)
+
+        for account in _account_candidates(host):
+            model = self._by_key.get((account, database, schema, name))
+            if model is not None:
+                return model
+        if host is not None:
+            # Only models without a known account can be built on any server
+            return self._by_key.get((None, database, schema, name))
+        return self._single_candidate(self._by_relation.get((database, schema, name), {}))
+
+    @staticmethod
+    def _single_candidate(candidates: dict) -> Optional[dict]:
+        if len(candidates) == 1:
+            return next(iter(candidates.values()))
+        if len(candidates) > 1:
+            logger.debug(
+                "Ambiguous match between dbt models: %s",
+                ", ".join(model["uniqueId"] for model in candidates.values())
+            )
+        return None
+
+    def match_table(
+        self,
+        table: dict,
+        database_name: Optional[str] = None,
+        host: Optional[str] = None
+        ) -> Optional[dict]:
+        """
+        Returns the dbt model matching a Tableau table, or None.
+        args:
+            host: host name of the database server the table is on. Defaults to the
+                hostName of the table, if any.
+        """
+        database, schema, name = self.resolve_table(table, database_name)
+        return self.match(database, schema, name, host or table.get("hostName"))
+
+    def merge_tables(
+        self,
+        tableau_tables: Iterable[dict],
+        database_name: Optional[str] = None,
+        host: Optional[str] = None
+        ) -> Iterator[dict]:
+        """
+        Yields every Tableau table that matches a dbt model, merged with the metadata
+        of the model. Tables can come from any number of databases.
+        The merged tables read through to the table and model (see mergedTableRecord)
+        rather than copying both, so each adds a few bytes instead of a dict of
+        every field.
+        """
+        for table in tableau_tables:
+            model = self.match_table(table, database_name, host)
+            if model is not None:
+                yield mergedTableRecord(table, model)
@@ -0,0 +1,377 @@
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+import requests
+
+# Upper bounds in seconds of the request latency histogram buckets
+DEFAULT_LATENCY_BUCKETS=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Prefix of every exported metric name
+METRIC_PREFIX="dbt_tableau"
+
+logger = logging.getLogger(__name__)
+
+def endpoint_family(method: str, url: str) -> str:
+    """
+    Returns the endpoint family a request belongs to, the label metrics are aggregated by:
+    signin, metadata_graphql, dbt_graphql, table_update, column_update,
+    data_quality_warning, tags, dbt_cloud, github or other.
+    """
+    parts = urlsplit(url)
+    path = parts.path.rstrip("/")
+    if path.endswith("/auth/signin"):
+        return "signin"
+    if path.endswith("/api/metadata/graphql"):
+        return "metadata_graphql"
+    if path.endswith("/graphql"):
+        return "dbt_graphql"
+    if "/dataQualityWarnings" in path:
+        return "data_quality_warning"
+    if path.endswith("/tags"):
+        return "tags"
+    if "/tables/" in path and "/columns/" in path:
+        return "column_update"
+    if "/tables/" in path:
+        return "table_update"
+    if parts.netloc.endswith("github.com"):
+        return "github"
+    if "/api/v2/accounts" in path:
+        return "dbt_cloud"
+    return "other"
+
+class _histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets=buckets
+        self.counts=[0] * len(buckets)
+        self.count=0
+        self.sum=0.0
+
+    def observe(self, value: float):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def cumulative_counts(self) -> list:
+        total = 0
+        cumulative = []
+        for count in self.counts:
+            total += count
+            cumulative.append(total)
+        return cumulative
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Returns the upper bound of the bucket holding the q quantile, or None without observations.
+        """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        for bound, cumulative in zip(self.buckets, self.cumulative_counts()):
+            if cumulative >= rank:
+                return bound
+        return float("inf")
+
+class metricsRegistry:
+    """
+    Thread safe request metrics aggregated by endpoint family: a latency histogram
+    of every attempt, request counters by status class, error, retry and 401
+    re-authentication counters, and request/response payload bytes.
+    The registry can be written as a Prometheus textfile (for the node exporter
+    textfile collector) or as JSON at the end of a run, and scraped while a run
+    is in progress with serve.
+    Child registries (see child) keep their own counts, e.g. the requests of one
+    site, and are exported along with the registry under their labels.
+    """
+    def __init__(
+        self,
+        latency_buckets: Tuple[float, ...] = DEFAULT_LATENCY_BUCKETS,
+        labels: Optional[Dict[str, str]] = None
+    ):
+        """
+        args:
+            labels: labels added to every exported metric, e.g. {"site": "finance"}.
+        """
+        self.latency_buckets=latency_buckets
+        self.labels=dict(labels or {})
+        self.started_at=time.time()
+        self._children=[]
+        self._latency={}
+        self._requests={}
+        self._errors={}
+        self._retries={}
+        self._reauthentications={}
+        self._request_bytes={}
+        self._response_bytes={}
+        self._lock=threading.Lock()
+
+    def observe_request(
+        self,
+        family: str,
+        seconds: float,
+        status_code: Optional[int] = None,
+        request_bytes: int = 0,
+        response_bytes: int = 0,
+        error: Optional[str] = None
+        ):
+        """
+        Records one attempt of a request.
+        args:
+            status_code: None when no response was received.
+            error: exception type name of a failed attempt.
+        """
+        status = f"{status_code // 100}xx" if status_code is not None else "none"
+        with self._lock:
+            if family not in self._latency:
+                self._latency[family] = _histogram(self.latency_buckets)
+            self._latency[family].observe(seconds)
+            self._requests[(family, status)] = self._requests.get((family, status), 0) + 1
+            self._request_bytes[family] = self._request_bytes.get(family, 0) + request_bytes
+            self._response_bytes[family] = self._response_bytes.get(family, 0) + response_bytes
+            if error is not None or (status_code is not None and status_code >= 400):
+                kind = error or str(status_code)
+                self._errors[(family, kind)] = self._errors.get((family, kind), 0) + 1
+
+    def record_retry(self, family: str):
+        with self._lock:
+            self._retries[family] = self._retries.get(family, 0) + 1
+
+    def record_reauthentication(self, family: str):
+        with self._lock:
+            self._reauthentications[family] = self._reauthentications.get(family, 0) + 1
+
+    def child(self, labels: Dict[str, str]) -> "metricsRegistry":
+        """
+        Returns a new registry exported with this one under the given labels. Its
+        requests are not counted by request_count, reset or summary of this registry.
+        """
+        registry = metricsRegistry(self.latency_buckets, dict(self.labels, **labels))
+        with self._lock:
+            self._children.append(registry)
+        return registry
+
+    def request_count(self) -> int:
+        with self._lock:
+            return sum(self._requests.values())
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.time()
+            for values in (
+                self._latency, self._requests, self._errors, self._retries,
+                self._reauthentications, self._request_bytes, self._response_bytes
+            ):
+                values.clear()
+
+    def to_dict(self) -> dict:
+        """
+        Returns the metrics per endpoint family as a JSON serializable dict.
+        """
+        with self._lock:
+            families = sorted(set(self._latency) | set(self._retries) | set(self._reauthentications))
+            result = {"started_at": self.started_at, "duration_seconds": round(time.time() - self.started_at, 3), "endpoints": {}}
+            for family in families:
+                histogram = self._latency.get(family) or _histogram(self.latency_buckets)
+                result["endpoints"][family] = {
+                    "requests": {
+                        status: count for (request_family, status), count in self._requests.items()
+                        if request_family == family
+                    },
+                    "errors": {
+                        kind: count for (error_family, kind), count in self._errors.items()
+                        if error_family == family
+                    },
+                    "retries": self._retries.get(family, 0),
+                    "reauthentications": self._reauthentications.get(family, 0),
+                    "request_bytes": self._request_bytes.get(family, 0),
+                    "response_bytes": self._response_bytes.get(family, 0),
+                    "latency_seconds": {
+                        "count": histogram.count,
+                        "sum": round(histogram.sum, 6),
+                        "p50": histogram.quantile(0.5),
+                        "p95": histogram.quantile(0.95),
+                        "p99": histogram.quantile(0.99),
+                        "buckets": dict(zip(
+                            (str(bound) for bound in histogram.buckets), histogram.cumulative_counts()
+                        ))
+                    }
+                }
+            children = list(self._children)
+        if children:
+            result["children"] = [dict(child.to_dict(), labels=child.labels) for child in children]
+        return result
+
+    def to_prometheus(self) -> str:
+        """
+        Returns the metrics, and those of the child registries, in the Prometheus
+        text exposition format.
+        """
+        name = METRIC_PREFIX
+        series = {}
+        for registry in [self] + self._all_children():
+            for metric, lines in registry._prometheus_series().items():
+                series.setdefault(metric, []).extend(lines)
+        lines = []
+        for metric, metric_type, help_text in (
+            ("request_duration_seconds", "histogram", "Latency of each HTTP request attempt."),
+            ("requests_total", "counter", "HTTP request attempts by status class."),
+            ("request_errors_total", "counter", "Failed HTTP request attempts by status code or exception."),
+            ("request_retries_total", "counter", "HTTP requests sent again after a throttled or failed attempt."),
+            ("reauthentications_total", "counter", "HTTP requests sent again with a renewed session token."),
+            ("request_bytes_total", "counter", "Bytes of HTTP request bodies."),
+            ("response_bytes_total", "counter", "Bytes of HTTP response bodies.")
+        ):
+            lines.append(f"# HELP {name}_{metric} {help_text}")
+            lines.append(f"# TYPE {name}_{metric} {metric_type}")
+            lines.extend(series.get(metric, []))
+        return "\n".join(lines) + "\n"
+
+    def _all_children(self) -> List["metricsRegistry"]:
+        with self._lock:
+            children = list(self._children)
+        return [registry for child in children for registry in [child] + child._all_children()]
+
+    def _prometheus_series(self) -> Dict[str, List[str]]:
+        # Sample lines of every metric of this registry only, labelled with its labels
+        name = METRIC_PREFIX
+        labels = "".join(f'{label}="{_escape_label(value)}",' for label, value in sorted(self.labels.items()))
+        series = {}
+        with self._lock:
+            lines = series["request_duration_seconds"] = []
+            for family, histogram in sorted(self._latency.items()):
+                for bound, cumulative in zip(histogram.buckets, histogram.cumulative_counts()):
+                    lines.append(f'{name}_request_duration_seconds_bucket{{{labels}endpoint="{family}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_request_duration_seconds_bucket{{{labels}endpoint="{family}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{name}_request_duration_seconds_sum{{{labels}endpoint="{family}"}} {histogram.sum:.6f}')
+                lines.append(f'{name}_request_duration_seconds_count{{{labels}endpoint="{family}"}} {histogram.count}')
+            series["requests_total"] = [
+                f'{name}_requests_total{{{labels}endpoint="{family}",status="{status}"}} {count}'
+                for (family, status), count in sorted(self._requests.items())
+            ]
+            series["request_errors_total"] = [
+                f'{name}_request_errors_total{{{labels}endpoint="{family}",error="{kind}"}} {count}'
+                for (family, kind), count in sorted(self._errors.items())
+            ]
+            for metric, values in (
+                ("request_retries_total", self._retries),
+                ("reauthentications_total", self._reauthentications),
+                ("request_bytes_total", self._request_bytes),
+                ("response_bytes_total", self._response_bytes)
+            ):
+                series[metric] = [
+                    f'{name}_{metric}{{{labels}endpoint="{family}"}} {value}'
+                    for family, value in sorted(values.items())
+                ]
+        return series
+
+    def write(self, path: str):
+        """
+        Writes the metrics to path, as JSON if it ends with .json and as a Prometheus
+        textfile otherwise. The file is replaced atomically, so a collector never
+        reads a partial file.
+        """
+        content = json.dumps(self.to_dict(), indent=1) if path.endswith(".json") else self.to_prometheus()
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as metrics_file:
+            metrics_file.write(content)
+        os.replace(temp_path, path)
+        logger.info("Wrote request metrics to %s", path)
+
+    def summary(self) -> str:
+        """
+        Returns one line per endpoint family with its request count, errors, retries and latency.
+        """
+        lines = []
+        for family, endpoint in self.to_dict()["endpoints"].items():
+            latency = endpoint["latency_seconds"]
+            lines.append(
+                f"{family}: {latency['count']} requests, {sum(endpoint['errors'].values())} errors, "
+                f"{endpoint['retries']} retries, {latency['sum']:.1f}s total, p50 <= {latency['p50']}s, "
+                f"p95 <= {latency['p95']}s, {endpoint['response_bytes']} response bytes"
+            )
+        return "\n".join(lines)
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """
+        Serves the metrics on http://host:port/metrics (Prometheus format) and
+        /metrics.json from a daemon thread. Returns the server, shut it down with shutdown().
+        """
+        registry = self
+
+        class metricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = registry.to_prometheus(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, content_type = json.dumps(registry.to_dict()), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                body = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), metricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+        logger.info("Serving request metrics on http://%s:%s/metrics", host, server.server_address[1])
+        return server
+
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+# Registry shared by every session unless one is given its own
+REGISTRY=metricsRegistry()
+
+def _body_size(body) -> int:
+    if body is None:
+        return 0
+    if isinstance(body, (bytes, str)):
+        return len(body)
+    return 0
+
+def instrumented_request(
+    send: Callable[..., requests.Response],
+    method: str,
+    url: str,
+    registry: Optional[metricsRegistry] = None,
+    **kwargs
+    ) -> requests.Response:
+    """
+    Sends one request with send(method, url, **kwargs) and records its latency,
+    status and payload sizes in registry (the shared REGISTRY by default).
+    """
+    registry = registry if registry is not None else REGISTRY
+    family = endpoint_family(method, url)
+    start = time.perf_counter()
+    try:
+        response = send(method, url, **kwargs)
+    except requests.exceptions.RequestException as e:
+        registry.observe_request(family, time.perf_counter() - start, error=type(e).__name__)
+        raise
+    seconds = time.perf_counter() - start
+    # Streamed bodies are not read here, so only their Content-Length is counted
+    if kwargs.get("stream"):
+        response_bytes = int(response.headers.get("Content-Length") or 0)
+    else:
+        response_bytes = len(response.content)
+    registry.observe_request(
+        family,
+        seconds,
+        response.status_code,
+        _body_size(response.request.body if response.request is not None else None),
+        response_bytes
+    )
+    return response
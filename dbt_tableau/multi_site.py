@@ -0,0 +1,173 @@
+import logging
+import os
+from typing import Dict, List, Mapping, Optional
+
+from dbt_tableau.async_tableau import asyncTableauClient, DEFAULT_MAX_CONCURRENCY
+from dbt_tableau.metrics import metricsRegistry
+from dbt_tableau.sync_state import syncStateStore
+from dbt_tableau.tableau import tableauClient
+
+logger = logging.getLogger(__name__)
+
+# Settings of a site read from TABLEAU_<SITE>_<SETTING>
+SITE_SETTINGS=("SERVER", "SITE", "PAT_NAME", "PAT", "DATABASES", "MAX_CONCURRENCY")
+# Settings a site may share through the unprefixed TABLEAU_<SETTING>. Sites never share a PAT:
+# signing in with a PAT ends the previous session of the same token, so concurrent
+# sites would keep invalidating each other's sessions
+SHARED_SITE_SETTINGS=("SERVER", "DATABASES", "MAX_CONCURRENCY")
+
+class siteConfig:
+    """
+    Connection settings and sync scope of one Tableau site.
+    """
+    def __init__(
+        self,
+        name: Optional[str],
+        server_url: str,
+        site_name: str,
+        pat_name: str,
+        pat: str,
+        databases: List[str],
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY
+    ):
+        """
+        args:
+            name: key of the site in TABLEAU_SITES, None for the single site of
+                the unprefixed settings.
+            max_concurrency: Tableau API requests in flight at once on this site.
+        """
+        self.name=name
+        self.server_url=server_url
+        self.site_name=site_name
+        self.pat_name=pat_name
+        self.pat=pat
+        self.databases=databases
+        self.max_concurrency=max_concurrency
+
+    @property
+    def label(self) -> str:
+        return self.name or self.site_name
+
+class siteClients:
+    """
+    The clients of one Tableau site: a tableauClient with its connection pool, the
+    asyncTableauClient bounding its requests in flight, and its optional sync state.
+    Long running modes (the webhook listener) keep them open between syncs, so
+    the session token and keep-alive connections are reused.
+    """
+    def __init__(
+        self,
+        site: siteConfig,
+        state_path: Optional[str] = None,
+        token_cache_path: Optional[str] = None,
+        metrics: Optional[metricsRegistry] = None
+    ):
+        """
+        args:
+            state_path: path of the sync state database of the site. None disables it.
+            metrics: registry of the requests of the site, REGISTRY when None.
+        """
+        self.site=site
+        self.state_store=syncStateStore(state_path) if state_path else None
+        # The connection pool is sized so every concurrent request gets its own connection
+        self.tableau_client=tableauClient(
+            site.server_url,
+            site.site_name,
+            site.pat_name,
+            site.pat,
+            pool_size=site.max_concurrency,
+            state_store=self.state_store,
+            token_cache_path=token_cache_path,
+            metrics=metrics
+        )
+        self.async_client=asyncTableauClient(self.tableau_client, site.max_concurrency)
+        self.metrics=self.tableau_client.metrics
+
+    async def authenticate(self) -> dict:
+        """
+        Returns the credentials of the site, signing in only when the session token
+        is missing or about to expire.
+        """
+        return await self.async_client.authenticate()
+
+    def close(self):
+        self.async_client.close()
+        if self.state_store is not None:
+            self.state_store.close()
+
+def load_site_configs(environ: Mapping[str, str] = os.environ) -> List[siteConfig]:
+    """
+    Reads the Tableau sites to sync from the environment.
+    TABLEAU_SITES lists site keys, e.g. "prod,finance,eu". Each site reads its
+    settings from TABLEAU_<KEY>_SERVER, TABLEAU_<KEY>_SITE, TABLEAU_<KEY>_PAT_NAME,
+    TABLEAU_<KEY>_PAT, TABLEAU_<KEY>_DATABASES and TABLEAU_<KEY>_MAX_CONCURRENCY.
+    SERVER, DATABASES and MAX_CONCURRENCY fall back to the unprefixed
+    TABLEAU_<SETTING> (e.g. a server shared by all sites); the site and its PAT
+    have to be set per site, and two sites of the same server can not use the
+    same PAT. Without TABLEAU_SITES the single site of the unprefixed settings
+    is synced.
+    Raises ValueError for a missing setting or a PAT shared by several sites.
+    """
+    names = [name.strip() for name in environ.get("TABLEAU_SITES", "").split(",") if name.strip()]
+    sites = []
+    for name in names or [None]:
+        settings = {}
+        for setting in SITE_SETTINGS:
+            value = environ.get(f"TABLEAU_{name.upper()}_{setting}") if name else None
+            if value is None and (name is None or setting in SHARED_SITE_SETTINGS):
+                value = environ.get(f"TABLEAU_{setting}")
+            settings[setting] = value
+        missing = [setting for setting in ("SERVER", "SITE", "PAT_NAME", "PAT") if not settings[setting]]
+        if missing:
+            raise ValueError(
+                f"Tableau site {name or 'default'} is missing "
+                + ", ".join(f"TABLEAU_{name.upper()}_{setting}" if name else f"TABLEAU_{setting}" for setting in missing)
+            )
+        sites.append(siteConfig(
+            name,
+            settings["SERVER"],
+            settings["SITE"],
+            settings["PAT_NAME"],
+            settings["PAT"],
+            [database.strip() for database in (settings["DATABASES"] or "PRODUCTION").split(",")],
+            int(settings["MAX_CONCURRENCY"] or DEFAULT_MAX_CONCURRENCY)
+        ))
+    pat_sites = {}
+    for site in sites:
+        pat_key = (site.server_url.rstrip("/"), site.pat_name)
+        if pat_key in pat_sites:
+            raise ValueError(
+                f"Tableau sites {pat_sites[pat_key].label} and {site.label} use the same PAT {site.pat_name}. "
+                "Each site needs its own PAT, since signing in with a PAT ends its other sessions"
+            )
+        pat_sites[pat_key] = site
+    return sites
+
+def site_path(path: Optional[str], site: siteConfig) -> Optional[str]:
+    """
+    Returns a per site variant of a file path, e.g. state.db -> state.finance.db.
+    Sites keep their own sync state, journal and metrics files since luids are
+    only unique within a site. The single site of the unprefixed settings keeps
+    the path as is.
+    """
+    if not path or site.name is None:
+        return path
+    root, extension = os.path.splitext(path)
+    return f"{root}.{site.name}{extension}"
+
+def log_site_results(results: Dict[str, dict]):
+    """
+    Logs the outcome of every site of a multi-site run.
+    args:
+        results: per site label, the success, failure and unchanged counts, the
+            seconds and requests of its sync, or the error that stopped it.
+    """
+    for label, result in results.items():
+        if result.get("error"):
+            logger.error("Site %s failed after %.1fs: %s", label, result["seconds"], result["error"])
+        else:
+            logger.info(
+                "Site %s synced in %.1fs with %s requests - Success: %s, Failures: %s, Unchanged: %s",
+                label, result["seconds"], result["requests"],
+                result["success"], result["failure"], result["unchanged"]
+            )
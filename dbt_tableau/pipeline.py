@@ -0,0 +1,243 @@
+import asyncio
+import concurrent.futures
+import contextlib
+import logging
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+from dbt_tableau.async_tableau import asyncTableauClient
+from dbt_tableau.merge_index import mergeIndex
+from dbt_tableau.tableau import PUBLISH_UPDATED, PUBLISH_UNCHANGED, PUBLISH_FAILED
+from dbt_tableau.run_journal import runJournal, JOURNAL_TABLE_DESCRIPTION, JOURNAL_COLUMN_DESCRIPTIONS
+
+# Merged tables waiting for their columns to be fetched
+DEFAULT_MERGED_QUEUE_SIZE=500
+# Tables whose columns were fetched, waiting to be published
+DEFAULT_PUBLISH_QUEUE_SIZE=200
+# Tables per column fetch. Smaller batches start publishing sooner, larger ones send fewer queries
+DEFAULT_COLUMN_BATCH_SIZE=100
+DEFAULT_COLUMN_FETCHERS=2
+# Tables published at once. Each publishes its changed columns concurrently,
+# bounded by the concurrency limit of the asyncTableauClient
+DEFAULT_PUBLISHERS=8
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of the stream in a stage queue
+_END=object()
+
+class syncPipeline:
+    """
+    Syncs dbt metadata to Tableau as a chain of concurrent stages joined by bounded
+    queues, so publishing starts as soon as the first page of Tableau tables is
+    merged instead of after every table has been fetched:
+
+        Tableau table pages -> merge with dbt models -> column fetch -> publish
+
+    The merge stage runs on a worker thread and blocks while the merged queue is
+    full, so a slow Tableau site throttles the table fetch instead of filling
+    memory. Only the dbt lookup (mergeIndex) and the queued tables are held at
+    once; peak memory is bounded by the queue sizes rather than by the catalog.
+    The dbt models have to be indexed before the first table can be matched.
+    With a runJournal, the column and table descriptions of each table are
+    journaled once published, and operations completed by an interrupted run
+    being resumed are skipped.
+    """
+    def __init__(
+        self,
+        async_client: asyncTableauClient,
+        merge_index: mergeIndex,
+        tableau_creds: dict,
+        merged_queue_size: int = DEFAULT_MERGED_QUEUE_SIZE,
+        publish_queue_size: int = DEFAULT_PUBLISH_QUEUE_SIZE,
+        column_batch_size: int = DEFAULT_COLUMN_BATCH_SIZE,
+        column_fetchers: int = DEFAULT_COLUMN_FETCHERS,
+        publishers: int = DEFAULT_PUBLISHERS,
+        tracer=None,
+        journal: Optional[runJournal] = None
+    ):
+        """
+        args:
+            tracer: optional spanTracer receiving a span per stage.
+            journal: optional journal of the completed operations of the run.
+        """
+        self.async_client=async_client
+        self.tableau_client=async_client.tableau_client
+        self.merge_index=merge_index
+        self.tableau_creds=tableau_creds
+        self.merged_queue_size=merged_queue_size
+        self.publish_queue_size=publish_queue_size
+        self.column_batch_size=column_batch_size
+        self.column_fetchers=max(1, column_fetchers)
+        self.publishers=max(1, publishers)
+        self.tracer=tracer
+        self.journal=journal
+        self.resumed_count=0
+        self.started_at=None
+        self.first_write_at=None
+        self.merged_count=0
+        self.column_counts=[0, 0, 0]
+        self.table_statuses=[]
+        self._stop=threading.Event()
+
+    def _span(self, name: str, profile: bool = True, **attributes):
+        if self.tracer is None:
+            return contextlib.nullcontext()
+        return self.tracer.span(name, profile=profile, **attributes)
+
+    async def run(self, tableau_tables: Callable[[], Iterable[dict]]) -> tuple:
+        """
+        Runs every stage until all tables are published. If a stage fails, the
+        others are stopped and its exception is raised.
+        args:
+            tableau_tables: returns the stream of Tableau tables to sync, e.g. a
+                call of tableauClient.iter_database_tables. It is called on the
+                merge worker thread.
+
+        Returns: the success, failure and unchanged counts of the description
+            updates, each summed over the table descriptions and their column descriptions.
+        """
+        loop = asyncio.get_running_loop()
+        merged_queue = asyncio.Queue(maxsize=self.merged_queue_size)
+        publish_queue = asyncio.Queue(maxsize=self.publish_queue_size)
+        self._stop.clear()
+        self.started_at = time.perf_counter()
+
+        async def merge_stage():
+            await asyncio.to_thread(self._merge_tables, tableau_tables, merged_queue, loop)
+            for _ in range(self.column_fetchers):
+                await merged_queue.put(_END)
+
+        async def fetch_stage():
+            with self._span("pipeline.fetch_columns"):
+                await asyncio.gather(*(
+                    self._fetch_columns(merged_queue, publish_queue) for _ in range(self.column_fetchers)
+                ))
+            for _ in range(self.publishers):
+                await publish_queue.put(_END)
+
+        async def publish_stage():
+            with self._span("pipeline.publish"):
+                await asyncio.gather(*(self._publish(publish_queue) for _ in range(self.publishers)))
+
+        with self._span("pipeline", profile=False):
+            stages = [asyncio.ensure_future(stage()) for stage in (merge_stage, fetch_stage, publish_stage)]
+            try:
+                done, _ = await asyncio.wait(stages, return_when=asyncio.FIRST_EXCEPTION)
+                for stage in done:
+                    if stage.exception() is not None:
+                        raise stage.exception()
+            finally:
+                # A failed stage stops the others instead of leaving them blocked on a full queue
+                self._stop.set()
+                for stage in stages:
+                    stage.cancel()
+                await asyncio.gather(*stages, return_exceptions=True)
+
+        success_count, failure_count, unchanged_count = self.column_counts
+        logger.info(
+            "Published %s tables. Table descriptions - Changed: %s, Skipped: %s, Failed: %s",
+            len(self.table_statuses),
+            self.table_statuses.count(PUBLISH_UPDATED),
+            self.table_statuses.count(PUBLISH_UNCHANGED),
+            self.table_statuses.count(PUBLISH_FAILED)
+        )
+        logger.info(
+            "Column updates - Success: %s, Failures: %s, Skipped (unchanged): %s",
+            success_count, failure_count, unchanged_count
+        )
+        if self.first_write_at is not None:
+            logger.info(
+                "First table published %.1fs after the pipeline started",
+                self.first_write_at - self.started_at
+            )
+
+        return (
+            success_count + self.table_statuses.count(PUBLISH_UPDATED),
+            failure_count + self.table_statuses.count(PUBLISH_FAILED),
+            unchanged_count + self.table_statuses.count(PUBLISH_UNCHANGED)
+        )
+
+    def _merge_tables(self, tableau_tables, merged_queue: asyncio.Queue, loop):
+        with self._span("pipeline.merge") as stage:
+            tables = tableau_tables()
+            if stage is not None:
+                tables = stage.time_iterator(tables, "tableau.fetch_seconds")
+            for merged_table in self.tableau_client.merge_table_stream(tables, self.merge_index):
+                if self._is_done(merged_table, JOURNAL_COLUMN_DESCRIPTIONS) and self._is_done(merged_table, JOURNAL_TABLE_DESCRIPTION):
+                    self.resumed_count += 1
+                    continue
+                # Blocks the worker thread while the queue is full, giving up once the pipeline stopped
+                put = asyncio.run_coroutine_threadsafe(merged_queue.put(merged_table), loop)
+                while True:
+                    try:
+                        put.result(timeout=1)
+                        break
+                    except concurrent.futures.TimeoutError:
+                        if self._stop.is_set():
+                            put.cancel()
+                            return
+                self.merged_count += 1
+            logger.info("Merged %s dbt models and Tableau tables", self.merged_count)
+            if self.resumed_count:
+                logger.info("Skipped %s tables completed by the resumed run", self.resumed_count)
+
+    def _is_done(self, merged_table: dict, operation: str) -> bool:
+        return self.journal is not None and self.journal.is_done(merged_table["luid"], operation)
+
+    async def _fetch_columns(self, merged_queue: asyncio.Queue, publish_queue: asyncio.Queue):
+        finished = False
+        while not finished:
+            # Waits for one table, then takes whatever else is queued up to the batch size
+            batch = []
+            item = await merged_queue.get()
+            while item is not _END:
+                batch.append(item)
+                if len(batch) >= self.column_batch_size or merged_queue.empty():
+                    break
+                item = merged_queue.get_nowait()
+            finished = item is _END
+            if not batch:
+                continue
+            # Columns are only needed by tables whose columns are still to be published
+            column_tables = [
+                merged_table for merged_table in batch
+                if not self._is_done(merged_table, JOURNAL_COLUMN_DESCRIPTIONS)
+            ]
+            columns_by_table = (
+                await self.async_client.get_columns_for_tables(column_tables, self.tableau_creds)
+                if column_tables else {}
+            )
+            for merged_table in batch:
+                await publish_queue.put((merged_table, columns_by_table.get(merged_table["luid"], [])))
+
+    async def _publish(self, publish_queue: asyncio.Queue):
+        while True:
+            item = await publish_queue.get()
+            if item is _END:
+                return
+            merged_table, tableau_columns = item
+            counts = (0, 0, 0)
+            if not self._is_done(merged_table, JOURNAL_COLUMN_DESCRIPTIONS):
+                counts = await self.async_client.publish_column_descriptions(
+                    merged_table, tableau_columns, self.tableau_creds
+                )
+                if counts[1] == 0:
+                    self._record(merged_table, JOURNAL_COLUMN_DESCRIPTIONS)
+            status = PUBLISH_UNCHANGED
+            if not self._is_done(merged_table, JOURNAL_TABLE_DESCRIPTION):
+                status = await self.async_client.publish_table_description(
+                    merged_table, merged_table["description"], self.tableau_creds
+                )
+                if status != PUBLISH_FAILED:
+                    self._record(merged_table, JOURNAL_TABLE_DESCRIPTION)
+            if self.first_write_at is None:
+                self.first_write_at = time.perf_counter()
+            for index, count in enumerate(counts):
+                self.column_counts[index] += count
+            self.table_statuses.append(status)
+
+    def _record(self, merged_table: dict, operation: str):
+        if self.journal is not None:
+            self.journal.record(merged_table["luid"], operation)
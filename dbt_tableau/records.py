@@ -0,0 +1,234 @@
+from collections.abc import Mapping, MutableMapping
+from typing import Any, Dict, Iterator, Optional
+
+class slottedRecord:
+    """
+    Base of the compact records held for every dbt model, Tableau table and
+    column of a sync. Each field the sync uses is a slot instead of a key of a
+    per record dict, which keeps a large catalog several times smaller in memory.
+    Records behave like the dicts returned by the APIs (record["name"],
+    record.get("alias"), "luid" in record, dict(record)), so the merge and
+    publish code reads them the same way. A field that was never set is missing
+    like an absent key, and fields outside the slots (e.g. a field added to a
+    query later) are kept in a dict created only when one is set.
+    """
+    __slots__=("_extra",)
+    # Names of the slots of a record type, in order. Set for every subclass
+    _fields=()
+    _field_names=frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        fields = []
+        for klass in reversed(cls.__mro__):
+            for name in klass.__dict__.get("__slots__", ()):
+                if not name.startswith("_") and name not in fields:
+                    fields.append(name)
+        cls._fields = tuple(fields)
+        cls._field_names = frozenset(fields)
+
+    def __init__(self, values: Optional[Mapping] = None, **kwargs):
+        """
+        args:
+            values: the mapping (e.g. an API response dict) or (key, value) pairs to
+                copy the fields from.
+        """
+        self._extra=None
+        if values is not None:
+            self.update(values)
+        if kwargs:
+            self.update(kwargs)
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._field_names:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __setitem__(self, key: str, value: Any):
+        if key in self._field_names:
+            setattr(self, key, value)
+            return
+        if self._extra is None:
+            self._extra = {}
+        self._extra[key] = value
+
+    def __delitem__(self, key: str):
+        if key in self._field_names:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+            return
+        if self._extra is None:
+            raise KeyError(key)
+        del self._extra[key]
+
+    def __contains__(self, key: object) -> bool:
+        if key in self._field_names:
+            return hasattr(self, key)
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self) -> Iterator[str]:
+        for name in self._fields:
+            if hasattr(self, name):
+                yield name
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (slottedRecord, dict)):
+            return self.to_dict() == dict(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return [self[key] for key in self]
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def update(self, values: Mapping = (), **kwargs):
+        """
+        Sets the fields of a mapping, like dict.update.
+        """
+        items = values.items() if isinstance(values, Mapping) else values
+        for key, value in items:
+            self[key] = value
+        for key, value in kwargs.items():
+            self[key] = value
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key: str, *default):
+        try:
+            value = self[key]
+        except KeyError:
+            if len(default) > 0:
+                return default[0]
+            raise
+        del self[key]
+        return value
+
+    def copy(self):
+        """
+        Returns a shallow copy of the record.
+        """
+        return type(self)(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: self[key] for key in self}
+
+# Records are accepted wherever the sync checks for a mapping
+MutableMapping.register(slottedRecord)
+
+class columnRecord(slottedRecord):
+    """
+    A column of a dbt model or Tableau table, or both once merged by
+    tableauClient.merge_column_metadata.
+    """
+    __slots__=("name", "description", "luid", "id", "tableauDescription", "remoteType", "isNullable", "parentTableId")
+
+class modelRecord(slottedRecord):
+    """
+    A dbt model as returned by get_models_for_job. Its columns are kept as columnRecords.
+    meta and stats are kept as returned, since they are published and hashed as is.
+    """
+    __slots__=(
+        "uniqueId", "packageName", "runId", "accountId", "projectId", "environmentId", "jobId",
+        "executionTime", "status", "executeCompletedAt", "database", "schema", "name", "alias",
+        "description", "meta", "stats", "columns"
+    )
+
+    def __setitem__(self, key: str, value: Any):
+        if key == "columns" and value is not None:
+            value = [column if isinstance(column, columnRecord) else columnRecord(column) for column in value]
+        super().__setitem__(key, value)
+
+class tableRecord(slottedRecord):
+    """
+    A Tableau database table as returned by the metadata API, with the database
+    and server it was found on.
+    """
+    __slots__=(
+        "name", "schema", "id", "luid", "fullName", "tableauDescription", "description",
+        "databaseName", "databaseId", "hostName"
+    )
+
+class workbookRecord(slottedRecord):
+    """
+    A Tableau workbook downstream of merged tables, without its upstream tables.
+    """
+    __slots__=("id", "luid", "name", "description", "projectName", "vizportalUrlId", "tags", "owner")
+
+class mergedTableRecord(slottedRecord):
+    """
+    A Tableau table matched with a dbt model. Instead of copying both into a new
+    dict, it reads through to them: a field set on the merged table wins, then
+    the fields of the model, then those of the table, like a copy of the table
+    updated with the model. The table and model are shared, not copied, and have
+    to be left unchanged while the merged table is in use.
+    """
+    __slots__=("table", "model")
+
+    def __init__(self, table: Mapping, model: Mapping):
+        self._extra=None
+        self.table=table
+        self.model=model
+
+    def __getitem__(self, key: str) -> Any:
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        if key in self.model:
+            return self.model[key]
+        return self.table[key]
+
+    def __setitem__(self, key: str, value: Any):
+        if self._extra is None:
+            self._extra = {}
+        self._extra[key] = value
+
+    def __delitem__(self, key: str):
+        raise TypeError("fields of a merged table can not be deleted")
+
+    def __contains__(self, key: object) -> bool:
+        return (self._extra is not None and key in self._extra) or key in self.model or key in self.table
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.table
+        for key in self.model:
+            if key not in self.table:
+                yield key
+        if self._extra is not None:
+            for key in self._extra:
+                if key not in self.table and key not in self.model:
+                    yield key
+
+    def copy(self):
+        merged_table = type(self)(self.table, self.model)
+        if self._extra is not None:
+            merged_table._extra = dict(self._extra)
+        return merged_table
@@ -0,0 +1,221 @@
+import copy
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Callable, Optional
+from urllib.parse import urlsplit
+import requests
+
+# Number of times a failed request is sent again before giving up
+DEFAULT_MAX_RETRIES=5
+# Base and cap in seconds of the exponential backoff between attempts
+DEFAULT_BACKOFF_BASE=0.5
+DEFAULT_BACKOFF_MAX=60
+# Longest Retry-After in seconds the client is willing to wait for
+DEFAULT_MAX_RETRY_AFTER=300
+# Responses worth another attempt. 429 and 503 also signal throttling
+RETRY_STATUS_CODES=frozenset([429, 500, 502, 503, 504])
+THROTTLE_STATUS_CODES=frozenset([429, 503])
+IDEMPOTENT_METHODS=frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"])
+# POST endpoints that only run read-only GraphQL queries (Tableau Metadata API, dbt Discovery API)
+IDEMPOTENT_POST_PATHS=("/api/metadata/graphql", "/graphql")
+
+logger = logging.getLogger(__name__)
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Returns the number of seconds to wait from a Retry-After header given either
+    as seconds or as an HTTP date, or None if the header is missing or invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+class retryPolicy:
+    """
+    Decides which requests are sent again and how long to wait in between.
+    Only idempotent requests are retried after errors and 5xx responses. A 429
+    means the request was rejected without being processed, so it is retried
+    whatever the method. Waits honor Retry-After and otherwise use exponential
+    backoff with full jitter, so throttled threads don't retry in lockstep.
+    """
+    def __init__(
+        self,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff_base: float = DEFAULT_BACKOFF_BASE,
+        backoff_max: float = DEFAULT_BACKOFF_MAX,
+        max_retry_after: float = DEFAULT_MAX_RETRY_AFTER,
+        retry_read_timeouts: bool = True
+    ):
+        """
+        args:
+            retry_read_timeouts: send an idempotent request again when the server did
+                not answer within the timeout. Turn off for requests with a long
+                timeout, which would otherwise be waited for max_retries more times.
+        """
+        self.max_retries=max_retries
+        self.backoff_base=backoff_base
+        self.backoff_max=backoff_max
+        self.max_retry_after=max_retry_after
+        self.retry_read_timeouts=retry_read_timeouts
+
+    def without_read_timeout_retries(self) -> "retryPolicy":
+        """
+        Returns a copy of the policy that does not retry read timeouts.
+        """
+        policy = copy.copy(self)
+        policy.retry_read_timeouts = False
+        return policy
+
+    def is_idempotent(self, method: str, url: str) -> bool:
+        """
+        Returns True if sending the request twice has the same effect as sending it once.
+        """
+        method = method.upper()
+        if method in IDEMPOTENT_METHODS:
+            return True
+        return method == "POST" and urlsplit(url).path.rstrip("/").endswith(IDEMPOTENT_POST_PATHS)
+
+    def should_retry_response(self, method: str, url: str, response: requests.Response, attempt: int) -> bool:
+        if attempt >= self.max_retries or response.status_code not in RETRY_STATUS_CODES:
+            return False
+        return response.status_code == 429 or self.is_idempotent(method, url)
+
+    def should_retry_exception(self, method: str, url: str, exception: Exception, attempt: int) -> bool:
+        if attempt >= self.max_retries:
+            return False
+        if isinstance(exception, requests.exceptions.ConnectTimeout):
+            # The request never reached the server
+            return True
+        if isinstance(exception, requests.exceptions.ReadTimeout) and not self.retry_read_timeouts:
+            return False
+        return (
+            isinstance(exception, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+            and self.is_idempotent(method, url)
+        )
+
+    def delay(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        """
+        Returns the seconds to wait before the next attempt.
+        """
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if retry_after is not None:
+                # A little jitter keeps throttled threads from returning all at once
+                return min(retry_after, self.max_retry_after) + random.uniform(0, self.backoff_base)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+class adaptiveConcurrencyLimiter:
+    """
+    Caps the number of requests in flight to one host and adapts the cap to the
+    throttling the host reports (AIMD): each successful response raises the limit
+    by increase / limit, i.e. roughly by increase per round of requests, and a
+    throttled response multiplies it by decrease_factor. Decreases are applied at
+    most once per cooldown seconds, so a burst of 429s from one overload counts
+    as a single signal.
+    """
+    def __init__(
+        self,
+        max_limit: int,
+        min_limit: int = 1,
+        initial_limit: Optional[int] = None,
+        increase: float = 1.0,
+        decrease_factor: float = 0.5,
+        cooldown: float = 1.0
+    ):
+        self.max_limit=max_limit
+        self.min_limit=max(1, min_limit)
+        self.limit=float(initial_limit or max_limit)
+        self.increase=increase
+        self.decrease_factor=decrease_factor
+        self.cooldown=cooldown
+        self.in_flight=0
+        self._condition=threading.Condition()
+        self._last_decrease=0.0
+
+    def acquire(self):
+        """
+        Blocks until the number of requests in flight is below the current limit.
+        """
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, throttled: bool = False):
+        """
+        Frees a slot and adjusts the limit to the outcome of the request.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                now = time.monotonic()
+                if now - self._last_decrease >= self.cooldown:
+                    self._last_decrease = now
+                    self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+                    logger.warning("Throttled, lowering concurrency limit to %s", int(self.limit))
+            else:
+                self.limit = min(float(self.max_limit), self.limit + self.increase / self.limit)
+            self._condition.notify_all()
+
+def send_with_retry(
+    send,
+    method: str,
+    url: str,
+    policy: retryPolicy,
+    limiter: Optional[adaptiveConcurrencyLimiter] = None,
+    on_retry: Optional[Callable[[], None]] = None,
+    **kwargs
+    ) -> requests.Response:
+    """
+    Sends a request with send(method, url, **kwargs) until it succeeds, fails with a
+    non retryable error or runs out of attempts. The last response is returned and
+    the last exception raised, as if the request had been sent once.
+    args:
+        limiter: optional concurrency limiter each attempt has to get a slot from.
+        on_retry: called before each repeated attempt, e.g. to count retries.
+    """
+    attempt = 0
+    while True:
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            response = send(method, url, **kwargs)
+        except requests.exceptions.RequestException as e:
+            if limiter is not None:
+                limiter.release()
+            if not policy.should_retry_exception(method, url, e, attempt):
+                raise
+            delay = policy.delay(attempt)
+            logger.warning(
+                "%s %s failed (%s), retrying in %.1fs (%s/%s)",
+                method.upper(), url, type(e).__name__, delay, attempt + 1, policy.max_retries
+            )
+        else:
+            if limiter is not None:
+                limiter.release(response.status_code in THROTTLE_STATUS_CODES)
+            if not policy.should_retry_response(method, url, response, attempt):
+                return response
+            delay = policy.delay(attempt, response)
+            logger.warning(
+                "%s %s returned %s, retrying in %.1fs (%s/%s)",
+                method.upper(), url, response.status_code, delay, attempt + 1, policy.max_retries
+            )
+            response.close()
+        time.sleep(delay)
+        attempt += 1
+        if on_retry is not None:
+            on_retry()
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Iterable, Mapping, Set, Tuple
+
+# Default location of the run journal
+DEFAULT_JOURNAL_PATH=".tableau_run_journal.jsonl"
+# Completed operations buffered in memory before they are appended to the journal
+DEFAULT_FLUSH_EVERY=200
+# Longest time in seconds a completed operation stays buffered
+DEFAULT_FLUSH_INTERVAL=5.0
+
+# Operations of a table recorded in the journal
+JOURNAL_TABLE_DESCRIPTION="table_description"
+JOURNAL_TABLE_DQ_WARNING="table_dq_warning"
+JOURNAL_TABLE_CERTIFICATION="table_certification"
+JOURNAL_TABLE_TAGS="table_tags"
+JOURNAL_COLUMN_DESCRIPTIONS="column_descriptions"
+JOURNAL_COLUMN_TAGS="column_tags"
+
+logger = logging.getLogger(__name__)
+
+def dbt_runs_key(models: Iterable[Mapping[str, Any]]) -> str:
+    """
+    Returns a short digest of the dbt runs that built the models, added to the
+    run key of a journal so a run is only resumed with the models it started
+    with. After a new dbt run the content to publish may have changed, and the
+    operations journaled by the interrupted run have to be repeated.
+    """
+    run_ids = sorted({str(model.get("runId")) for model in models})
+    return "runs:" + hashlib.sha256(",".join(run_ids).encode("utf-8")).hexdigest()[:16]
+
+class runJournal:
+    """
+    Append-only record of the (table luid, operation) pairs a sync run completed,
+    so a run that died part way (network failure, expired token, OOM) can be
+    resumed without repeating finished writes.
+
+    The journal is a JSON lines file. Its first line identifies the run (e.g. the
+    Tableau site and dbt jobs), and every further line is one completed operation.
+    Completed operations are buffered and appended in batches of flush_every, or
+    by the first record() at least flush_interval seconds after the last flush,
+    so journaling adds one fsync per batch rather than per write. There is no
+    timer: the operations of a run that stops recording stay buffered until the
+    next record(), flush() or close(). A crash loses at most the last batch, whose operations are
+    then repeated by the resumed run. Once a run finished without failures the
+    journal is deleted, so the next run starts from scratch.
+    The journal can be shared by the worker threads of asyncTableauClient.
+    """
+    def __init__(
+        self,
+        path: str = DEFAULT_JOURNAL_PATH,
+        run_key: str = "",
+        resume: bool = False,
+        flush_every: int = DEFAULT_FLUSH_EVERY,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL
+    ):
+        """
+        args:
+            run_key: identifies the inputs of the run, e.g. the Tableau site and the
+                dbt_runs_key of the models. A journal written for another key is not resumed.
+            resume: skip the operations completed by the previous run of the same key.
+                Without it any earlier journal is discarded.
+        """
+        self.path=path
+        self.run_key=run_key
+        self.flush_every=flush_every
+        self.flush_interval=flush_interval
+        self.completed=self._load() if resume else set()
+        self.resumed_count=len(self.completed)
+        self._pending=[]
+        self._last_flush=time.monotonic()
+        self._lock=threading.Lock()
+        if resume and self.resumed_count:
+            # Keep the journal of the interrupted run and append to it
+            self._file=open(path, "a")
+            logger.info("Resuming run from %s, skipping %s completed operations", path, self.resumed_count)
+        else:
+            self._file=open(path, "w")
+            self._file.write(json.dumps({"run_key": run_key, "started_at": time.time()}) + "\n")
+            self._file.flush()
+
+    def _load(self) -> Set[Tuple[str, str]]:
+        if not os.path.exists(self.path):
+            logger.info("No run journal at %s, starting a new run", self.path)
+            return set()
+        completed = set()
+        with open(self.path) as journal_file:
+            lines = journal_file.readlines()
+        if not lines:
+            return completed
+        try:
+            header = json.loads(lines[0])
+        except ValueError:
+            header = {}
+        if header.get("run_key") != self.run_key:
+            logger.warning(
+                "Run journal %s belongs to another run (%s), starting a new run",
+                self.path, header.get("run_key")
+            )
+            return completed
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # The last line of a crashed run may be cut short
+                continue
+            completed.add((entry["luid"], entry["op"]))
+        return completed
+
+    def is_done(self, luid: str, operation: str) -> bool:
+        """
+        Returns True if the operation was completed by the run being resumed (or this one).
+        """
+        with self._lock:
+            return (luid, operation) in self.completed
+
+    def record(self, luid: str, operation: str):
+        """
+        Records a completed operation. It is written with the next batch.
+        """
+        with self._lock:
+            if (luid, operation) in self.completed:
+                return
+            self.completed.add((luid, operation))
+            self._pending.append(json.dumps({"luid": luid, "op": operation}))
+            if len(self._pending) >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self._pending:
+            self._file.write("\n".join(self._pending) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending = []
+        self._last_flush = time.monotonic()
+
+    def close(self, completed: bool = False):
+        """
+        Flushes the pending operations. With completed, the run finished without
+        failures and the journal is deleted; otherwise it is kept for --resume.
+        """
+        with self._lock:
+            self._flush()
+            self._file.close()
+            if completed:
+                os.remove(self.path)
+                logger.info("Run completed, removed run journal %s", self.path)
+            else:
+                logger.info(
+                    "Run journal %s kept with %s completed operations for --resume",
+                    self.path, len(self.completed)
+                )
@@ -0,0 +1,98 @@
+import hashlib
+import json
+import logging
+import os
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from dbt_tableau.workbook_registry import workbookRegistry
+
+logger = logging.getLogger(__name__)
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """
+    Parses a shard given as "i/N" (0 <= i < N) into (i, N).
+    """
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard {value!r}, expected i/N e.g. 0/4")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard {value!r}, i must be between 0 and N - 1")
+    return index, count
+
+def shard_of(luid: str, shard_count: int) -> int:
+    """
+    Returns the shard of a Tableau asset. The hash of its luid is stable across
+    processes, hosts and Python versions (unlike hash()), so every worker assigns
+    a table to the same shard.
+    """
+    digest = hashlib.blake2b(luid.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shard_count
+
+def shard_tables(tables: Iterable[dict], shard: Optional[Tuple[int, int]]) -> Iterator[dict]:
+    """
+    Yields the tables of a shard, or every table without a shard.
+    """
+    if shard is None:
+        yield from tables
+        return
+    index, count = shard
+    for table in tables:
+        if shard_of(table["luid"], count) == index:
+            yield table
+
+def shard_path(path: str, shard: Optional[Tuple[int, int]]) -> str:
+    """
+    Returns a per shard variant of a file path, e.g. state.db -> state.shard-0-of-4.db.
+    Shards keep their own sync state, since a table always belongs to the same shard.
+    """
+    if shard is None:
+        return path
+    root, extension = os.path.splitext(path)
+    return f"{root}.shard-{shard[0]}-of-{shard[1]}{extension}"
+
+def shard_workbooks_path(directory: str, shard: Tuple[int, int]) -> str:
+    """
+    Returns the path of the workbook file of a shard within directory.
+    """
+    return os.path.join(directory, f"workbooks.shard-{shard[0]}-of-{shard[1]}.json")
+
+def write_shard_workbooks(path: str, workbook_registry: workbookRegistry, shard: Optional[Tuple[int, int]] = None):
+    """
+    Writes the downstream workbooks found by one shard to a JSON file, read back
+    by read_shard_workbooks in the exposure reduce step.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as workbooks_file:
+        json.dump({
+            "shard": list(shard) if shard is not None else None,
+            "workbooks": list(workbook_registry)
+        }, workbooks_file)
+    os.replace(temp_path, path)
+    logger.info("Wrote %s downstream workbooks to %s", len(workbook_registry), path)
+
+def read_shard_workbooks(paths: List[str]) -> workbookRegistry:
+    """
+    Merges the workbook files of all shards into one registry. A workbook
+    downstream of tables in several shards is found by each of them, and the
+    registry merges its projects and upstream tables into a single entry.
+    """
+    files = [path for path in paths if os.path.exists(path)]
+    for path in sorted(set(paths) - set(files)):
+        logger.warning("Shard workbook file %s is missing", path)
+    registry = workbookRegistry()
+    for workbooks_path in files:
+        with open(workbooks_path) as workbooks_file:
+            data = json.load(workbooks_file)
+        for workbook in data["workbooks"]:
+            # JSON turns the (project id, environment id) pairs into lists
+            registry.add(
+                workbook,
+                [tuple(project) for project in workbook.get("dbt_projects", [])],
+                workbook.get("downstreamOfTables", [])
+            )
+    logger.info("Read %s downstream workbooks from %s shard files", len(registry), len(files))
+    return registry
@@ -0,0 +1,259 @@
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+# Version of the serialized plan format
+PLAN_VERSION=1
+# Default number of operations applied concurrently
+DEFAULT_APPLY_WORKERS=32
+
+# Operations a plan can hold
+OP_TABLE_DESCRIPTION="table_description"
+OP_TABLE_CERTIFICATION="table_certification"
+OP_TABLE_TAGS="table_tags"
+OP_DQ_WARNING_CREATE="dq_warning_create"
+OP_DQ_WARNING_UPDATE="dq_warning_update"
+OP_DQ_WARNING_DELETE="dq_warning_delete"
+OP_COLUMN_DESCRIPTION="column_description"
+OP_COLUMN_TAGS="column_tags"
+OP_EXPOSURES_COMMIT="exposures_commit"
+
+# HTTP requests needed to apply each operation. An exposures commit looks up the
+# dbt project repository and the current file sha before writing the file
+REQUESTS_PER_OPERATION={
+    OP_TABLE_DESCRIPTION: 1,
+    OP_TABLE_CERTIFICATION: 1,
+    OP_TABLE_TAGS: 1,
+    OP_DQ_WARNING_CREATE: 1,
+    OP_DQ_WARNING_UPDATE: 1,
+    OP_DQ_WARNING_DELETE: 1,
+    OP_COLUMN_DESCRIPTION: 1,
+    OP_COLUMN_TAGS: 1,
+    OP_EXPOSURES_COMMIT: 3
+}
+
+logger = logging.getLogger(__name__)
+
+class syncPlan:
+    """
+    Serializable list of the writes a sync would make to Tableau (and to the dbt
+    repository for exposures), computed from dbt and Tableau state before anything
+    is changed. A plan is reviewed from its estimate, saved to JSON and applied
+    later with apply_plan.
+
+    Each operation is a dict with its type (op), the luid of the asset it changes,
+    a display name, the parameters of the request and, when the sync state store
+    should remember it, the aspect and state content to record once applied.
+    """
+    def __init__(
+        self,
+        tableau_server_url: str,
+        site_id: str,
+        operations: Optional[List[dict]] = None,
+        created_at: Optional[float] = None,
+        watermarks: Optional[List[dict]] = None
+    ):
+        self.tableau_server_url=tableau_server_url
+        self.site_id=site_id
+        self.operations=operations if operations is not None else []
+        self.created_at=created_at if created_at is not None else time.time()
+        # dbt watermarks to store once the plan has been applied without failures
+        self.watermarks=watermarks if watermarks is not None else []
+
+    def __len__(self) -> int:
+        return len(self.operations)
+
+    def add(
+        self,
+        op: str,
+        luid: Optional[str],
+        name: str,
+        params: Optional[Dict[str, Any]] = None,
+        aspect: Optional[str] = None,
+        state: Any = None,
+        parent_luid: Optional[str] = None
+        ) -> dict:
+        """
+        Appends an operation to the plan and returns it.
+        args:
+            aspect, state: recorded in the sync state store once the operation is applied.
+            parent_luid: luid of the table a column operation belongs to.
+        """
+        if op not in REQUESTS_PER_OPERATION:
+            raise ValueError(f"Unknown plan operation: {op}")
+        operation = {
+            "id": len(self.operations),
+            "op": op,
+            "luid": luid,
+            "name": name,
+            "params": params or {}
+        }
+        if parent_luid is not None:
+            operation["parent_luid"] = parent_luid
+        if aspect is not None:
+            operation["aspect"] = aspect
+            operation["state"] = state
+        self.operations.append(operation)
+        return operation
+
+    def estimate(self, max_workers: int = DEFAULT_APPLY_WORKERS, request_seconds: float = 0.5) -> dict:
+        """
+        Returns the number of operations per type, the requests needed to apply
+        them and a rough apply duration for the given parallelism.
+        args:
+            request_seconds: assumed average latency of a single request.
+        """
+        operation_counts = {}
+        for operation in self.operations:
+            operation_counts[operation["op"]] = operation_counts.get(operation["op"], 0) + 1
+        write_requests = sum(
+            REQUESTS_PER_OPERATION[op] * count for op, count in operation_counts.items()
+        )
+        return {
+            "operations": operation_counts,
+            "write_requests": write_requests,
+            "estimated_apply_seconds": round(write_requests * request_seconds / max(max_workers, 1), 1)
+        }
+
+    def summary(self, max_workers: int = DEFAULT_APPLY_WORKERS) -> str:
+        """
+        Returns a human readable summary of the plan estimate.
+        """
+        estimate = self.estimate(max_workers)
+        lines = [f"Tableau sync plan for {self.tableau_server_url} ({len(self)} operations)"]
+        for op, count in sorted(estimate["operations"].items()):
+            lines.append(f"  {op}: {count}")
+        lines.append(f"  write requests: {estimate['write_requests']}")
+        lines.append(
+            f"  estimated apply time with {max_workers} workers: {estimate['estimated_apply_seconds']}s"
+        )
+        return "\n".join(lines)
+
+    def to_dict(self) -> dict:
+        return {
+            "version": PLAN_VERSION,
+            "created_at": self.created_at,
+            "tableau_server_url": self.tableau_server_url,
+            "site_id": self.site_id,
+            "estimate": self.estimate(),
+            "watermarks": self.watermarks,
+            "operations": self.operations
+        }
+
+    def save(self, path: str):
+        """
+        Writes the plan to a JSON file.
+        """
+        with open(path, "w") as plan_file:
+            json.dump(self.to_dict(), plan_file, indent=1, default=str)
+        logger.info("Saved Tableau sync plan with %s operations to %s", len(self), path)
+
+    @classmethod
+    def load(cls, path: str) -> "syncPlan":
+        """
+        Reads a plan written by save.
+        """
+        with open(path) as plan_file:
+            data = json.load(plan_file)
+        if data.get("version") != PLAN_VERSION:
+            raise ValueError(f"Unsupported sync plan version: {data.get('version')}")
+        return cls(
+            data["tableau_server_url"],
+            data["site_id"],
+            data["operations"],
+            data.get("created_at"),
+            data.get("watermarks")
+        )
+
+def default_handlers(tableau_client) -> Dict[str, Callable[[dict, dict], bool]]:
+    """
+    Returns the functions applying each Tableau operation with a tableauClient.
+    Each handler takes the operation and the Tableau credentials and returns True on success.
+    """
+    return {
+        OP_TABLE_DESCRIPTION: lambda operation, creds: tableau_client.update_table(
+            operation["luid"], creds, description=operation["params"]["description"]
+        ),
+        OP_TABLE_CERTIFICATION: lambda operation, creds: tableau_client.update_table(
+            operation["luid"],
+            creds,
+            is_certified=operation["params"]["is_certified"],
+            certification_note=operation["params"]["certification_note"]
+        ),
+        OP_TABLE_TAGS: lambda operation, creds: tableau_client.add_tags(
+            "tables", operation["luid"], operation["params"]["tags"], creds
+        ),
+        OP_COLUMN_TAGS: lambda operation, creds: tableau_client.add_tags(
+            "columns", operation["luid"], operation["params"]["tags"], creds
+        ),
+        OP_COLUMN_DESCRIPTION: lambda operation, creds: tableau_client.update_column_description(
+            operation["parent_luid"], operation["luid"], operation["params"]["description"], creds
+        ),
+        OP_DQ_WARNING_CREATE: lambda operation, creds: tableau_client.create_data_quality_warning(
+            operation["luid"], operation["params"]["message"], operation["params"]["is_severe"], creds
+        ),
+        OP_DQ_WARNING_UPDATE: lambda operation, creds: tableau_client.update_data_quality_warning(
+            operation["params"]["warning_id"],
+            operation["params"]["message"],
+            operation["params"]["is_severe"],
+            creds
+        ),
+        OP_DQ_WARNING_DELETE: lambda operation, creds: tableau_client.delete_data_quality_warning(
+            operation["params"]["warning_id"], creds
+        )
+    }
+
+def apply_plan(
+    plan: syncPlan,
+    tableau_client,
+    tableau_creds: dict,
+    max_workers: int = DEFAULT_APPLY_WORKERS,
+    handlers: Optional[Dict[str, Callable[[dict, dict], bool]]] = None
+    ) -> dict:
+    """
+    Applies every operation of a plan concurrently. Operations of a plan are
+    independent of each other, so they run in any order. Applied operations are
+    recorded in the client's sync state store.
+    args:
+        handlers: functions for operations tableauClient cannot apply (e.g. exposures
+            commits), or overrides of the default ones.
+
+    Returns: the number of applied and failed operations and the ids of the failed ones.
+    """
+    if plan.site_id != tableau_creds["site"]["id"]:
+        raise ValueError(
+            f"Sync plan was made for Tableau site {plan.site_id}, "
+            f"not for {tableau_creds['site']['id']}"
+        )
+    operation_handlers = default_handlers(tableau_client)
+    operation_handlers.update(handlers or {})
+    missing_handlers = {operation["op"] for operation in plan.operations} - set(operation_handlers)
+    if missing_handlers:
+        raise ValueError(f"No handler for plan operations: {', '.join(sorted(missing_handlers))}")
+
+    def apply_operation(operation):
+        try:
+            applied = operation_handlers[operation["op"]](operation, tableau_creds)
+        except Exception as e:
+            logger.error("Failed to apply %s on %s: %s", operation["op"], operation["name"], str(e))
+            applied = False
+        if applied and "aspect" in operation and tableau_client.state_store is not None:
+            tableau_client.state_store.record(
+                operation["luid"], operation["aspect"], operation["state"], operation.get("parent_luid")
+            )
+        return applied
+
+    logger.info("Applying %s sync plan operations with %s workers", len(plan), max_workers)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="apply") as executor:
+        results = list(executor.map(apply_operation, plan.operations))
+    failed_ids = [
+        operation["id"] for operation, applied in zip(plan.operations, results) if not applied
+    ]
+    logger.info(
+        "Applied %s operations, %s failed in %.1fs",
+        len(results) - len(failed_ids), len(failed_ids), time.perf_counter() - start
+    )
+    return {"applied": len(results) - len(failed_ids), "failed": len(failed_ids), "failed_ids": failed_ids}
@@ -0,0 +1,304 @@
+import argparse
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+# Default location of the local sync state database
+DEFAULT_STATE_PATH=".tableau_sync_state.db"
+# Number of recorded hashes buffered in memory before they are written to disk
+DEFAULT_FLUSH_EVERY=500
+
+# Aspects of a Tableau asset the sync keeps track of
+ASPECT_DESCRIPTION="description"
+ASPECT_CERTIFICATION="certification"
+ASPECT_DQ_WARNING="dq_warning"
+ASPECT_TAGS="tags"
+
+logger = logging.getLogger(__name__)
+
+def content_hash(content: Any) -> str:
+    """
+    Returns a stable SHA-256 hash of a published value. Dicts and lists are
+    serialized with sorted keys so that equal content always hashes the same.
+    """
+    if isinstance(content, str):
+        serialized = content
+    else:
+        serialized = json.dumps(content, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+class syncStateStore:
+    """
+    On-disk record of what was last published to Tableau, stored in SQLite.
+    For every table and column luid it keeps a content hash per aspect
+    (description, certification, DQ warning, tags), so later runs can work out
+    which writes are needed without reading the current values back from Tableau.
+    Every entry also keeps when it was last published or found current
+    (last_seen), so compact only drops the state of assets no longer synced.
+    It also holds the per job/environment dbt watermarks used by incremental syncs.
+    The store can be shared by the worker threads of asyncTableauClient.
+    """
+    def __init__(self, path: str = DEFAULT_STATE_PATH, flush_every: int = DEFAULT_FLUSH_EVERY):
+        self.path=path
+        self.flush_every=flush_every
+        self._lock=threading.Lock()
+        self._pending={}
+        # (luid, aspect) found current since the last flush, whose last_seen is refreshed
+        self._seen=set()
+        self._connection=sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS sync_state (
+                luid TEXT NOT NULL,
+                aspect TEXT NOT NULL,
+                parent_luid TEXT,
+                content_hash TEXT NOT NULL,
+                synced_at REAL NOT NULL,
+                last_seen REAL,
+                PRIMARY KEY (luid, aspect)
+            );
+            CREATE TABLE IF NOT EXISTS dbt_watermarks (
+                job_id TEXT NOT NULL,
+                environment_id TEXT NOT NULL,
+                execute_completed_at TEXT,
+                run_id TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (job_id, environment_id)
+            );
+            CREATE TABLE IF NOT EXISTS site_metadata (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
+        columns = [row[1] for row in self._connection.execute("PRAGMA table_info(sync_state)")]
+        if "last_seen" not in columns:
+            # Stores written before last_seen existed start from their publish time
+            self._connection.execute("ALTER TABLE sync_state ADD COLUMN last_seen REAL")
+            self._connection.execute("UPDATE sync_state SET last_seen = synced_at")
+        self._connection.commit()
+        logger.info("Opened Tableau sync state store: %s", path)
+
+    def is_current(self, luid: str, aspect: str, content: Any) -> bool:
+        """
+        Returns True if content is what was last published for the luid and aspect.
+        A current entry is marked as seen, so compact keeps it however long ago it
+        was published.
+        """
+        new_hash = content_hash(content)
+        with self._lock:
+            if (luid, aspect) in self._pending:
+                return self._pending[(luid, aspect)][1] == new_hash
+            row = self._connection.execute(
+                "SELECT content_hash FROM sync_state WHERE luid = ? AND aspect = ?",
+                (luid, aspect)
+            ).fetchone()
+            is_current = row is not None and row[0] == new_hash
+            if is_current:
+                self._seen.add((luid, aspect))
+                if len(self._seen) >= self.flush_every:
+                    self._flush()
+        return is_current
+
+    def record(self, luid: str, aspect: str, content: Any, parent_luid: Optional[str] = None):
+        """
+        Records content as published for the luid and aspect. Writes are buffered
+        and flushed to disk in batches.
+        args:
+            parent_luid: luid of the table a column belongs to.
+        """
+        with self._lock:
+            self._pending[(luid, aspect)] = (parent_luid, content_hash(content), time.time())
+            if len(self._pending) >= self.flush_every:
+                self._flush()
+
+    def forget(self, luid: str, aspect: Optional[str] = None):
+        """
+        Removes the recorded state of a luid (and its columns), for all aspects
+        unless one is given, so the next run publishes it again.
+        """
+        with self._lock:
+            self._flush()
+            if aspect is None:
+                self._connection.execute(
+                    "DELETE FROM sync_state WHERE luid = ? OR parent_luid = ?", (luid, luid)
+                )
+            else:
+                self._connection.execute(
+                    "DELETE FROM sync_state WHERE luid = ? AND aspect = ?", (luid, aspect)
+                )
+            self._connection.commit()
+
+    def flush(self):
+        """
+        Writes buffered hashes to disk.
+        """
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending and not self._seen:
+            return
+        if self._seen:
+            self._connection.executemany(
+                "UPDATE sync_state SET last_seen = ? WHERE luid = ? AND aspect = ?",
+                [(time.time(), luid, aspect) for luid, aspect in self._seen]
+            )
+        self._connection.executemany(
+            """
+            INSERT INTO sync_state (luid, aspect, parent_luid, content_hash, synced_at, last_seen)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (luid, aspect) DO UPDATE SET
+                parent_luid = excluded.parent_luid,
+                content_hash = excluded.content_hash,
+                synced_at = excluded.synced_at,
+                last_seen = excluded.last_seen
+            """,
+            [
+                (luid, aspect, parent_luid, hash_value, synced_at, synced_at)
+                for (luid, aspect), (parent_luid, hash_value, synced_at) in self._pending.items()
+            ]
+        )
+        self._connection.commit()
+        logger.debug("Flushed %s sync state entries, %s seen", len(self._pending), len(self._seen))
+        self._pending.clear()
+        self._seen.clear()
+
+    def get_metadata(self, key: str) -> Optional[str]:
+        """
+        Returns a value stored in the site metadata table.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value FROM site_metadata WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def set_metadata(self, key: str, value: str):
+        """
+        Stores a value in the site metadata table.
+        """
+        with self._lock:
+            self._connection.execute(
+                """
+                INSERT INTO site_metadata (key, value) VALUES (?, ?)
+                ON CONFLICT (key) DO UPDATE SET value = excluded.value
+                """,
+                (key, value)
+            )
+            self._connection.commit()
+
+    def get_watermarks(self) -> dict:
+        """
+        Returns the stored dbt watermarks keyed by (job id, environment id). Each
+        watermark holds the executeCompletedAt and runId of the latest synced model.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT job_id, environment_id, execute_completed_at, run_id FROM dbt_watermarks"
+            ).fetchall()
+        return {
+            (job_id, environment_id): {"executeCompletedAt": completed_at, "runId": run_id}
+            for job_id, environment_id, completed_at, run_id in rows
+        }
+
+    def set_watermark(self, job_id: Any, environment_id: Any, watermark: dict):
+        """
+        Stores the watermark of a dbt job/environment once its models have been synced.
+        """
+        with self._lock:
+            self._connection.execute(
+                """
+                INSERT INTO dbt_watermarks (job_id, environment_id, execute_completed_at, run_id, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (job_id, environment_id) DO UPDATE SET
+                    execute_completed_at = excluded.execute_completed_at,
+                    run_id = excluded.run_id,
+                    updated_at = excluded.updated_at
+                """,
+                (
+                    str(job_id),
+                    str(environment_id),
+                    watermark["executeCompletedAt"],
+                    str(watermark["runId"]),
+                    time.time()
+                )
+            )
+            self._connection.commit()
+
+    def bind_site(self, tableau_server_url: str, site_id: str):
+        """
+        Ties the store to a Tableau site. If the store was last used with a different
+        server or site id (e.g. the site was rebuilt or restored), all recorded state
+        is invalidated because the luids it holds are no longer valid.
+        """
+        site_key = f"{tableau_server_url.rstrip('/')}|{site_id}"
+        bound_site = self.get_metadata("site")
+        if bound_site is not None and bound_site != site_key:
+            logger.warning(
+                "Tableau site changed from %s to %s, invalidating sync state", bound_site, site_key
+            )
+            self.invalidate()
+        self.set_metadata("site", site_key)
+
+    def invalidate(self):
+        """
+        Deletes all recorded state, including dbt watermarks, so the next run
+        publishes everything again.
+        """
+        with self._lock:
+            self._pending.clear()
+            self._seen.clear()
+            self._connection.execute("DELETE FROM sync_state")
+            self._connection.execute("DELETE FROM dbt_watermarks")
+            self._connection.commit()
+        logger.info("Invalidated Tableau sync state store: %s", self.path)
+
+    def compact(self, max_age_days: Optional[float] = None) -> int:
+        """
+        Deletes state that was neither published nor found current for max_age_days
+        (e.g. tables dropped from the catalog) and reclaims the freed disk space.
+        Returns the number of deleted entries.
+        """
+        with self._lock:
+            self._flush()
+            deleted = 0
+            if max_age_days is not None:
+                cutoff = time.time() - max_age_days * 86400
+                deleted = self._connection.execute(
+                    "DELETE FROM sync_state WHERE COALESCE(last_seen, synced_at) < ?", (cutoff,)
+                ).rowcount
+                self._connection.commit()
+            self._connection.execute("VACUUM")
+        logger.info("Compacted Tableau sync state store, removed %s entries", deleted)
+        return deleted
+
+    def close(self):
+        """
+        Flushes buffered hashes and closes the database.
+        """
+        with self._lock:
+            self._flush()
+            self._connection.close()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Maintain the local Tableau sync state store.")
+    parser.add_argument("command", choices=["compact", "invalidate"])
+    parser.add_argument("--path", default=DEFAULT_STATE_PATH)
+    parser.add_argument(
+        "--max-age-days",
+        type=float,
+        default=None,
+        help="compact: delete entries neither published nor found current within this many days"
+    )
+    args = parser.parse_args()
+
+    store = syncStateStore(args.path)
+    if args.command == "compact":
+        store.compact(args.max_age_days)
+    else:
+        store.invalidate()
+    store.close()
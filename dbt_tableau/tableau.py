@@ -1,8 +1,8 @@
 import requests
 import json
-from collections import defaultdict
 from operator import itemgetter
-from typing import List, Dict, Any, Optional
+from collections.abc import Mapping
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple
 import xml.sax.saxutils as saxutils
 import logging
 import html
@@ -10,11 +10,24 @@ import xml.etree.ElementTree as ET
 import xml.etree.ElementTree as ET # For parsing XML responses
 import requests
 import json
-from collections import defaultdict
 from operator import itemgetter
 import logging
+from dbt_tableau.http_session import create_session, pooledSession, DEFAULT_POOL_SIZE, DEFAULT_TIMEOUT
+from dbt_tableau.sync_state import syncStateStore, ASPECT_DESCRIPTION
+from dbt_tableau.merge_index import mergeIndex
+from dbt_tableau.records import columnRecord, tableRecord
+from dbt_tableau.retry import retryPolicy
+from dbt_tableau.credentials import credentialManager
+from dbt_tableau.metrics import REGISTRY, metricsRegistry
 
 TABLEAU_API_VERSION="3.23"
+# Maximum number of nodes the Tableau Metadata API returns for a single query
+METADATA_API_NODE_LIMIT=20000
+# Outcomes of publishing a single description
+PUBLISH_UPDATED="updated"
+PUBLISH_UNCHANGED="unchanged"
+PUBLISH_FAILED="failed"
+PUBLISH_SKIPPED="skipped"
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -31,23 +44,90 @@ def format_table_references(merged_table: dict) -> str:
 
     return full_table_name
 
+def clean_description(description: str) -> str:
+    """
+    Replaces smart quotes and other problematic characters in a description
+    before it is published to (or compared with) the Tableau catalog.
+    """
+    quote_map = {
+        '\u201c': '"',  # opening curly quote
+        '\u201d': '"',  # closing curly quote
+        '\u2018': "'",  # opening curly apostrophe
+        '\u2019': "'"   # closing curly apostrophe
+    }
+    return description.translate(str.maketrans(quote_map))
+
+def render_description(description: str) -> str:
+    """
+    Cleans a description and escapes it for use in an XML request payload.
+    """
+    return html.escape(clean_description(description), quote=True)
+
+def chunk_list(items: list, chunk_size: int) -> list:
+    """
+    Splits a list into consecutive chunks of at most chunk_size elements.
+    """
+    return [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
 class tableauClient:
     def __init__(
         self,
         tableau_server_url: str,
         tableau_site_name: str,
         tableau_pat_name: str,
-        tableau_pat: str
+        tableau_pat: str,
+        session: requests.Session = None,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        timeout: float = DEFAULT_TIMEOUT,
+        state_store: syncStateStore = None,
+        retry_policy: retryPolicy = None,
+        token_cache_path: Optional[str] = None,
+        metrics: Optional[metricsRegistry] = None
     ):
         self.tableau_server_url=tableau_server_url
         self.tableau_site_name=tableau_site_name
         self.tableau_pat_name=tableau_pat_name
         self.tableau_pat=tableau_pat
+        # Pooled keep-alive HTTP session shared by all requests made by this client.
+        # It can also be passed to the dbt metadata API functions. Throttled requests
+        # are retried and the concurrency per host adapts to Tableau's rate limits
+        if session is None:
+            session = create_session(
+                pool_size,
+                timeout,
+                retry_policy if retry_policy is not None else retryPolicy(),
+                adaptive_concurrency=True,
+                metrics=metrics
+            )
+        self.session=session
+        # Latency, error, retry and payload metrics of the requests sent with the session
+        self.metrics=getattr(session, "metrics", metrics if metrics is not None else REGISTRY)
+        # Optional record of previously published content used to skip unchanged writes
+        self.state_store=state_store
+        # Reuses a cached session token when token_cache_path is set and signs in
+        # again when Tableau rejects the token
+        self.credential_manager=credentialManager(
+            self._sign_in,
+            f"{tableau_server_url.rstrip('/')}|{tableau_site_name}|{tableau_pat_name}",
+            token_cache_path
+        )
+        if isinstance(self.session, pooledSession):
+            self.session.credential_manager=self.credential_manager
 
     def authenticate(self) -> json:
         """
         Authenticates with Tableau server and returns authentication object containing a API token
-        as well as the site ID.
+        as well as the site ID. A cached token that has not expired is reused instead of
+        signing in. The returned dict is updated in place whenever the token is renewed.
+        """
+        tableau_creds = self.credential_manager.get_credentials()
+        if self.state_store is not None:
+            self.state_store.bind_site(self.tableau_server_url, tableau_creds["site"]["id"])
+        return tableau_creds
+
+    def _sign_in(self) -> dict:
+        """
+        Signs in to Tableau server with the personal access token and returns the credentials.
         args:
             tableau_server: the Tableau sites base URL. 
             tableau_site_name: The name of the Tableau site (drivybusinessintelligence).
@@ -70,11 +150,10 @@ class tableauClient:
             "Accept": "application/json"
         }
         try:
-            response = requests.post(
+            response = self.session.post(
                 url,
                 headers=headers,
-                data=payload,
-                timeout=60
+                data=payload
             )
             response_json = response.json()
             tableau_creds = response_json["credentials"]
@@ -119,6 +198,7 @@ class tableauClient:
                     id
                     luid
                     fullName
+                    tableauDescription: description
                 }
             }
         }
@@ -130,12 +210,11 @@ class tableauClient:
         }
 
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.tableau_server_url}/api/metadata/graphql",
                 headers=headers,
                 json={"query": query},
-                verify=True,
-                timeout=60
+                verify=True
             )
             response.raise_for_status()
             response_json = response.json()
@@ -160,11 +239,128 @@ class tableauClient:
             logger.error("Unexpected error: %s", str(e))
             raise
 
+    def iter_databases(
+        self,
+        tableau_creds: dict,
+        databases: list,
+        connection_type: str = "snowflake",
+        page_size: int = 100
+        ) -> Iterator[dict]:
+        """
+        Yields the name and id of the specified databases in the Tableau Catalog,
+        paging through the databasesConnection of the metadata API.
+        args:
+            databases: list of database names. Leave empty for all databases.
+            page_size: number of databases requested per query.
+        """
+        database_filter = {"connectionType": connection_type}
+        if databases:
+            database_filter["nameWithin"] = databases
+        mdapi_query = """
+        query getDatabasesPage($filter: Database_Filter, $first: Int, $after: String) {
+            databasesConnection(filter: $filter, first: $first, after: $after) {
+                nodes {
+                    name
+                    id
+                }
+                pageInfo {
+                    hasNextPage
+                    endCursor
+                }
+            }
+        }
+        """
+        cursor = None
+        has_next_page = True
+
+        while has_next_page:
+            data = self._query_metadata_api(
+                mdapi_query,
+                {"filter": database_filter, "first": page_size, "after": cursor},
+                tableau_creds
+            )
+            databases_connection = data["databasesConnection"]
+            yield from databases_connection["nodes"]
+            has_next_page = databases_connection["pageInfo"]["hasNextPage"]
+            cursor = databases_connection["pageInfo"]["endCursor"]
+
+    def iter_database_tables(
+        self,
+        tableau_creds: dict,
+        databases: list,
+        page_size: int = 500,
+        table_names: Optional[list] = None
+        ) -> Iterator[dict]:
+        """
+        Yields the tables within the specified databases page by page, using the cursor
+        based tablesConnection of the metadata API. Unlike get_databases, the size of a
+        single response is bounded by page_size, so large sites neither hit the
+        metadata API node limit nor hold every table in memory at once.
+        args:
+            databases: list of database names. Leave empty for all databases.
+            page_size: number of tables requested per query.
+            table_names: only yield the tables with these names (compared as is by
+                Tableau, so pass every casing that may be stored), e.g. the tables
+                built by one dbt run. Leave empty for all tables.
+
+        Yields: tableRecords with the same fields as returned by get_databases, plus
+            the databaseName and databaseId of the database they belong to.
+        """
+        mdapi_query = """
+        query getDatabaseTablesPage($id: ID, $first: Int, $after: String, $tableFilter: DatabaseTable_Filter) {
+            databases(filter: {id: $id}) {
+                tablesConnection(first: $first, after: $after, filter: $tableFilter) {
+                    nodes {
+                        name
+                        schema
+                        id
+                        luid
+                        fullName
+                        tableauDescription: description
+                    }
+                    pageInfo {
+                        hasNextPage
+                        endCursor
+                    }
+                }
+            }
+        }
+        """
+        for database in self.iter_databases(tableau_creds, databases):
+            cursor = None
+            has_next_page = True
+            table_count = 0
+
+            while has_next_page:
+                data = self._query_metadata_api(
+                    mdapi_query,
+                    {
+                        "id": database["id"],
+                        "first": page_size,
+                        "after": cursor,
+                        "tableFilter": {"nameWithin": list(table_names)} if table_names else None
+                    },
+                    tableau_creds
+                )
+                tables_connection = data["databases"][0]["tablesConnection"]
+                for node in tables_connection["nodes"]:
+                    table = tableRecord(node)
+                    table["databaseName"] = database["name"]
+                    table["databaseId"] = database["id"]
+                    yield table
+                table_count += len(tables_connection["nodes"])
+                has_next_page = tables_connection["pageInfo"]["hasNextPage"]
+                cursor = tables_connection["pageInfo"]["endCursor"]
+
+            logger.info(
+                "Streamed %s tables from Tableau database: %s", str(table_count), database["name"]
+            )
+
     def merge_table_metadata(
         self,
         tableau_database: list,
         tableau_database_tables: list,
-        dbt_models: list
+        dbt_models
         ) -> list:
         """
         Combines the metadata of dbt models retrieved from the dbt cloud API and the metadata
@@ -175,30 +371,17 @@ class tableauClient:
             tableau_database: List of all tables within a Tableau Catalog 
                 database retrieved with the get_databases method.
             tableau_database_tables: List of tables in a Tableau Catalog database 
+            dbt_models: list of dbt models, or a mergeIndex built once for all databases.
         
         Returns: a list of merged (i.e. matched database/schema/table name) 
             Tableau database tables and dbt models, preserving Tableau duplicates
         """
-        merged_tables = []
-        # Create a lookup dictionary for dbt models
-        dbt_model_map = {}
-        for model in dbt_models:
-            model_database = model["database"].lower()
-            model_schema = model["schema"].lower()
-            model_name = model["alias"].lower()
-            dbt_table_fqn = f"{model_database}.{model_schema}.{model_name}"
-            dbt_model_map[dbt_table_fqn] = model
-
-        # Iterate through Tableau tables and merge with matching dbt model
-        for table in tableau_database_tables["tables"]:
-            tableau_table_fqn = table["fullName"].lower()
-            if tableau_table_fqn in dbt_model_map:
-                # Create a new merged entry for each Tableau table
-                merged_entry = table.copy()  # Preserve the Tableau table data
-                merged_entry.update(dbt_model_map[tableau_table_fqn])  # Add the dbt model data
-                merged_tables.append(merged_entry)
-
-        merged_tables = sorted(merged_tables, key=itemgetter("name"))
+        merged_tables = sorted(
+            self.merge_table_stream(
+                tableau_database_tables["tables"], dbt_models, tableau_database["name"]
+            ),
+            key=itemgetter("name")
+        )
 
         logger.info(
             "Merged %s dbt and Tableau tables in Tableau database: %s", 
@@ -207,6 +390,27 @@ class tableauClient:
 
         return merged_tables
 
+    def merge_table_stream(
+        self,
+        tableau_tables: Iterable[dict],
+        dbt_models,
+        database_name: Optional[str] = None
+        ) -> Iterator[dict]:
+        """
+        Merges a stream of Tableau tables (e.g. from iter_database_tables) with the
+        metadata of dbt models, yielding each merged table as soon as it is matched.
+        Only the dbt model lookup is held in memory.
+        args:
+            tableau_tables: iterable of Tableau tables from one or more databases.
+            dbt_models: list of dbt models retrieved from the dbt cloud API, or a
+                mergeIndex of them to avoid rebuilding the lookup on every call.
+            database_name: database of tables whose fullName lacks one. Defaults to
+                the databaseName of each table.
+        """
+        if not isinstance(dbt_models, mergeIndex):
+            dbt_models = mergeIndex(dbt_models)
+        yield from dbt_models.merge_tables(tableau_tables, database_name)
+
     def get_downstream_workbooks(
             self,
             merged_table: dict,
@@ -264,12 +468,11 @@ class tableauClient:
         }
 
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.tableau_server_url}/api/metadata/graphql", 
                 headers=auth_headers,
                 verify=True,
-                json={"query": mdapi_query},
-                timeout=60
+                json={"query": mdapi_query}
             )
             response.raise_for_status()
             response_json = response.json()
@@ -296,6 +499,72 @@ class tableauClient:
             logger.error("Unexpected error: %s", str(e))
             raise
 
+    def get_downstream_workbooks_for_tables(
+        self,
+        merged_tables: list,
+        tableau_creds: dict,
+        chunk_size: int = 50
+        ) -> Dict[str, dict]:
+        """
+        Fetches the Tableau workbooks that sit downstream of any of the specified tables,
+        requesting tables in chunks rather than one query per table. Each workbook is
+        returned once, no matter how many of the tables it is built on.
+        args:
+            merged_tables: list of merged tables returned by merge_table_metadata.
+            chunk_size: maximum number of tables requested per query.
+
+        Returns: a dict mapping each workbook luid to its metadata (including owner,
+            tags and upstream tables) plus a "downstreamOfTables" list holding the luids
+            of the merged tables the workbook was found through.
+        """
+        table_luids = list(dict.fromkeys(table["luid"] for table in merged_tables))
+        mdapi_query = """
+        query getDownstreamWorkbooksForTables($luids: [String]) {
+            databaseTables(filter: {luidWithin: $luids}) {
+                luid
+                downstreamWorkbooks {
+                    id
+                    luid
+                    name
+                    description
+                    projectName
+                    vizportalUrlId
+                    tags {
+                        id
+                        name
+                    }
+                    owner {
+                        id
+                        name
+                        username
+                    }
+                    upstreamTables {
+                        id
+                        luid
+                        name
+                    }
+                }
+            }
+        }
+        """
+        workbooks = {}
+
+        for luid_chunk in chunk_list(table_luids, chunk_size):
+            data = self._query_metadata_api(mdapi_query, {"luids": luid_chunk}, tableau_creds)
+            for table in data["databaseTables"]:
+                for workbook in table["downstreamWorkbooks"]:
+                    if workbook["luid"] not in workbooks:
+                        workbook["downstreamOfTables"] = []
+                        workbooks[workbook["luid"]] = workbook
+                    workbooks[workbook["luid"]]["downstreamOfTables"].append(table["luid"])
+
+        logger.info(
+            "Retrieved %s downstream Tableau workbooks for %s tables",
+            str(len(workbooks)), str(len(table_luids))
+        )
+
+        return workbooks
+
     def get_column_metadata(self, merged_table: dict, tableau_creds: dict) -> list:
         """
         Retrieves all columns for a table within the Tableau catalog.
@@ -324,11 +593,10 @@ class tableauClient:
         """
 
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.tableau_server_url}/api/metadata/graphql",
                 headers=headers,
-                json={"query": mdapi_query, "variables": variables},
-                timeout=60
+                json={"query": mdapi_query, "variables": variables}
             )
             response.raise_for_status()
             response_json = response.json()
@@ -355,128 +623,332 @@ class tableauClient:
             logger.error("Unexpected error: %s", str(e))
             raise
 
-    def publish_column_descriptions(
+    def _query_metadata_api(
         self,
-        merged_table: dict,
-        tableau_columns: dict,
+        query: str,
+        variables: dict,
         tableau_creds: dict
-        ) -> int:
+        ) -> dict:
         """
-        Publishes column descriptions to Tableau catalog using the REST API.
+        Posts a GraphQL query to the Tableau metadata API and returns the "data" object
+        of the response.
+        args:
+            query: GraphQL query text.
+            variables: variables referenced by the query.
         """
+        headers = {
+            "X-tableau-Auth": tableau_creds["token"],
+            "Content-Type": "application/json",
+            "Accept": "application/json"
+        }
 
-        full_table_name = format_table_references(merged_table)
-        site_id = tableau_creds["site"]["id"]
-        logger.info("Publishing Tableau column descriptions for table: %s", full_table_name)
+        try:
+            response = self.session.post(
+                f"{self.tableau_server_url}/api/metadata/graphql",
+                headers=headers,
+                json={"query": query, "variables": variables}
+            )
+            response.raise_for_status()
+            response_json = response.json()
+            if "errors" in response_json:
+                logger.warning(
+                    "Tableau metadata API returned errors: %s", str(response_json["errors"])
+                )
 
-        # Merge column information so that descriptions and 
-        # Tableua metadata (luid, id) are available in one dict
-        tableau_dbt_column_map = defaultdict(dict)
-        # Iterates through lists sequentially. First list of Tableau columns 
-        # and their metadata, then dbt columns.
-        for l in (tableau_columns, merged_table["columns"]):
-            for elem in l:
-                # For each column in both list respectively, update the defaultdict to
-                # contain the metadata as its values. The first pass does this for
-                # Tableau columns, the second adds the metadata for dbt to each value in the dict
-                if isinstance(elem, dict):
-                    # First pass in the loop: {
-                        # "TABLE_NAME:", {"NAME": "TABLE_NAME", "luid": "123"}, ...
-                    # }
-                    # Second pass in the loop: {
-                        # "TABLE_NAME:", {
-                            # "NAME": "TABLE_NAME", "luid": "123",
-                            # "description": "dbt documentation"
-                        # },
-                    # }
-                    tableau_dbt_column_map[elem.get("name", "").upper()].update(elem)
-        # Sorts values by alphabetical order of table name
-        merged_columns = sorted(tableau_dbt_column_map.values(), key=itemgetter("name"))
-        success_count = 0
-        failure_count = 0
+            return response_json["data"]
 
-        for column in merged_columns:
-            try:
-                # Create list of metadata fields that are required to update a column description
-                required_fields = ["description", "luid", "name"]
-                if not all(field in column and column[field] is not None for field in required_fields):
-                    logger.warning(
-                        "Skipping column %s: Missing required fields", column.get('name', 'Unknown')
-                    )
-                    # Skip column if it doesn't have a description to publish
-                    continue
+        except requests.exceptions.Timeout as e:
+            logger.error("Timeout error connecting to Tableau metadata API: %s", str(e))
+            raise
+        except requests.exceptions.RequestException as e:
+            logging.error("API request failed: %s", str(e))
+            raise
+        except json.JSONDecodeError as e:
+            logging.error("Failed to parse API response: %s", str(e))
+            raise
+        except KeyError as e:
+            logger.error("Invalid response structure: %s", str(e))
+            raise
+
+    def get_columns_for_tables(
+        self,
+        merged_tables: list,
+        tableau_creds: dict,
+        chunk_size: int = 100,
+        column_page_size: int = 1000
+        ) -> Dict[str, list]:
+        """
+        Retrieves the columns of many tables within the Tableau catalog using as few
+        metadata API requests as possible. Tables are requested in chunks bounded by
+        chunk_size and by the metadata API node limit; tables with more than
+        column_page_size columns are paged through individually.
+        args:
+            merged_tables: list of merged tables returned by merge_table_metadata.
+            chunk_size: maximum number of tables requested per query.
+            column_page_size: number of columns requested per table per query.
 
-                # Clean and encode description
-                description = column["description"]
-                # Replace smart quotes and other problematic characters
-                quote_map = {
-                    '\u201c': '"',  # opening curly quote
-                    '\u201d': '"',  # closing curly quote
-                    '\u2018': "'",  # opening curly apostrophe
-                    '\u2019': "'"   # closing curly apostrophe
+        Returns: a dict mapping each table luid to its list of columns, in the
+            format returned by get_column_metadata.
+        """
+        table_luids = list(dict.fromkeys(table["luid"] for table in merged_tables))
+        tables_per_query = max(1, min(chunk_size, METADATA_API_NODE_LIMIT // column_page_size))
+        mdapi_query = """
+        query getColumnsForTables($luids: [String], $first: Int) {
+            databaseTables(filter: {luidWithin: $luids}) {
+                luid
+                columnsConnection(first: $first) {
+                    nodes {
+                        name
+                        id
+                        description
+                        luid
+                        remoteType
+                        isNullable
+                    }
+                    pageInfo {
+                        hasNextPage
+                        endCursor
+                    }
                 }
-                description = description.translate(str.maketrans(quote_map))
-                # Escape for XML
-                description = html.escape(description, quote=True)
-
-                # Construct URL ensuring no double slashes
-                url = (
-                    f"{self.tableau_server_url}/api/{TABLEAU_API_VERSION}/sites/{site_id}"
-                    f"/tables/{merged_table['luid']}/columns/{column['luid']}"
-                )
+            }
+        }
+        """
+        columns_by_luid = {luid: [] for luid in table_luids}
+
+        for luid_chunk in chunk_list(table_luids, tables_per_query):
+            data = self._query_metadata_api(
+                mdapi_query,
+                {"luids": luid_chunk, "first": column_page_size},
+                tableau_creds
+            )
+            for table in data["databaseTables"]:
+                columns_connection = table["columnsConnection"]
+                columns_by_luid[table["luid"]].extend(columns_connection["nodes"])
+                if columns_connection["pageInfo"]["hasNextPage"]:
+                    columns_by_luid[table["luid"]].extend(
+                        self._get_remaining_columns(
+                            table["luid"],
+                            columns_connection["pageInfo"]["endCursor"],
+                            tableau_creds,
+                            column_page_size
+                        )
+                    )
+
+        logger.info(
+            "Retrieved %s columns for %s tables",
+            str(sum(len(columns) for columns in columns_by_luid.values())),
+            str(len(columns_by_luid))
+        )
 
-                # Construct payload with proper XML formatting
-                payload = f"""<?xml version="1.0" encoding="UTF-8"?>
-                <tsRequest>
-                <column description="{description}"/>
-                </tsRequest>"""
+        return columns_by_luid
 
-                headers = {
-                    "X-Tableau-Auth": tableau_creds["token"],
-                    "Content-Type": "application/xml",
-                    "Accept": "application/xml"
+    def _get_remaining_columns(
+        self,
+        table_luid: str,
+        cursor: str,
+        tableau_creds: dict,
+        column_page_size: int
+        ) -> list:
+        """
+        Pages through the columns of a single wide table starting after cursor.
+        """
+        mdapi_query = """
+        query getColumnsPage($luid: String!, $first: Int, $after: String) {
+            databaseTables(filter: {luid: $luid}) {
+                columnsConnection(first: $first, after: $after) {
+                    nodes {
+                        name
+                        id
+                        description
+                        luid
+                        remoteType
+                        isNullable
+                    }
+                    pageInfo {
+                        hasNextPage
+                        endCursor
+                    }
                 }
+            }
+        }
+        """
+        columns = []
+        has_next_page = True
 
-                logger.debug("Making request to URL: %s", url)
-                logger.debug("Payload: %s", payload)
-                logger.debug("Headers: %s", headers)
-
-                # Make request with explicit encoding
-                response = requests.put(
-                    url,
-                    headers=headers, 
-                    data=payload.encode('utf-8'),
-                    verify=True,  # Enable SSL verification
-                    timeout=60
-                )
+        while has_next_page:
+            data = self._query_metadata_api(
+                mdapi_query,
+                {"luid": table_luid, "first": column_page_size, "after": cursor},
+                tableau_creds
+            )
+            columns_connection = data["databaseTables"][0]["columnsConnection"]
+            columns.extend(columns_connection["nodes"])
+            has_next_page = columns_connection["pageInfo"]["hasNextPage"]
+            cursor = columns_connection["pageInfo"]["endCursor"]
 
-                # Log the full response
-                logger.debug("Response status: %s", response.status_code)
-                logger.debug("Response headers: %s", response.headers)
-                logger.debug("Response text: %s", response.text)
+        logger.debug("Paged %s additional columns for table %s", str(len(columns)), table_luid)
 
-                response.raise_for_status()
+        return columns
 
-                # Verify the response indicates success
-                if response.status_code == 200:
-                    logger.info("Successfully updated column %s", column["name"])
-                    success_count += 1
+    def merge_column_metadata(self, merged_table: dict, tableau_columns: list) -> list:
+        """
+        Merges Tableau column metadata (luid, id) with the dbt column metadata of a
+        merged table so that descriptions and Tableau identifiers are available in one
+        columnRecord. The description currently held by Tableau is kept as
+        "tableauDescription". Returns the merged columns sorted by column name.
+        """
+        merged_columns = {}
+        # Iterates through lists sequentially. First list of Tableau columns
+        # and their metadata, then dbt columns, so the dbt description of a column
+        # replaces the Tableau one and its Tableau identifiers are kept
+        for is_tableau, columns in ((True, tableau_columns), (False, merged_table["columns"])):
+            for elem in columns:
+                if not isinstance(elem, Mapping):
+                    continue
+                # Columns are matched by upper-cased name: {"TABLE_NAME": columnRecord(name="table_name", luid="123", ...)}
+                key = elem.get("name", "").upper()
+                column = merged_columns.get(key)
+                if column is None:
+                    column = merged_columns[key] = columnRecord(elem)
                 else:
-                    logger.warning(
-                        "Unexpected status code %s for column %s", response.status_code, column["name"]
-                    )
-                    failure_count += 1
+                    column.update(elem)
+                if is_tableau:
+                    # Description currently held by Tableau, kept so unchanged columns can be skipped
+                    column["tableauDescription"] = elem.get("description")
+        # Sorts values by alphabetical order of column name
+        return sorted(merged_columns.values(), key=itemgetter("name"))
+
+    def publish_column_description(
+        self,
+        merged_table: dict,
+        column: dict,
+        tableau_creds: dict
+        ) -> str:
+        """
+        Publishes the description of a single merged column to Tableau catalog using the REST API.
+        No request is made when Tableau already holds the same description.
+        args:
+            column: a merged column returned by merge_column_metadata.
+
+        Returns: PUBLISH_UPDATED, PUBLISH_UNCHANGED, PUBLISH_FAILED or PUBLISH_SKIPPED
+            (column has no description or luid).
+        """
+        site_id = tableau_creds["site"]["id"]
+
+        try:
+            # Create list of metadata fields that are required to update a column description
+            required_fields = ["description", "luid", "name"]
+            if not all(field in column and column[field] is not None for field in required_fields):
+                logger.warning(
+                    "Skipping column %s: Missing required fields", column.get('name', 'Unknown')
+                )
+                # Skip column if it doesn't have a description to publish
+                return PUBLISH_SKIPPED
+
+            # Clean and encode description
+            description = render_description(column["description"])
+            # Skip the request if this description was already published by a previous run
+            if self.state_store is not None and self.state_store.is_current(
+                column["luid"], ASPECT_DESCRIPTION, description
+            ):
+                logger.debug("Column %s description unchanged since last sync", column["name"])
+                return PUBLISH_UNCHANGED
+            # Skip the request if Tableau already holds exactly this description
+            current_description = column.get("tableauDescription")
+            if current_description is not None and render_description(current_description) == description:
+                logger.debug("Column %s description unchanged", column["name"])
+                self._record_state(column["luid"], description, merged_table["luid"])
+                return PUBLISH_UNCHANGED
+
+            # Construct URL ensuring no double slashes
+            url = (
+                f"{self.tableau_server_url}/api/{TABLEAU_API_VERSION}/sites/{site_id}"
+                f"/tables/{merged_table['luid']}/columns/{column['luid']}"
+            )
+
+            # Construct payload with proper XML formatting
+            payload = f"""<?xml version="1.0" encoding="UTF-8"?>
+            <tsRequest>
+            <column description="{description}"/>
+            </tsRequest>"""
+
+            headers = {
+                "X-Tableau-Auth": tableau_creds["token"],
+                "Content-Type": "application/xml",
+                "Accept": "application/xml"
+            }
+
+            logger.debug("Making request to URL: %s", url)
+            logger.debug("Payload: %s", payload)
+            logger.debug("Headers: %s", headers)
+
+            # Make request with explicit encoding
+            response = self.session.put(
+                url,
+                headers=headers, 
+                data=payload.encode('utf-8'),
+                verify=True  # Enable SSL verification
+            )
+
+            # Log the full response
+            logger.debug("Response status: %s", response.status_code)
+            logger.debug("Response headers: %s", response.headers)
+            logger.debug("Response text: %s", response.text)
+
+            response.raise_for_status()
+
+            # Verify the response indicates success
+            if response.status_code == 200:
+                logger.info("Successfully updated column %s", column["name"])
+                self._record_state(column["luid"], description, merged_table["luid"])
+                return PUBLISH_UPDATED
+
+            logger.warning(
+                "Unexpected status code %s for column %s", response.status_code, column["name"]
+            )
+            return PUBLISH_FAILED
+
+        except requests.exceptions.RequestException as e:
+            logger.error("Error updating column %s: %s", column.get("name", "Unknown"), str(e))
+            return PUBLISH_FAILED
+
+    def publish_column_descriptions(
+        self,
+        merged_table: dict,
+        tableau_columns: dict,
+        tableau_creds: dict
+        ) -> Tuple[int, int, int]:
+        """
+        Publishes column descriptions to Tableau catalog using the REST API.
+        Returns the number of updated, failed and unchanged (skipped) columns.
+        """
+
+        full_table_name = format_table_references(merged_table)
+        logger.info("Publishing Tableau column descriptions for table: %s", full_table_name)
+
+        merged_columns = self.merge_column_metadata(merged_table, tableau_columns)
+        success_count = 0
+        failure_count = 0
+        unchanged_count = 0
 
-            except requests.exceptions.RequestException as e:
+        for column in merged_columns:
+            status = self.publish_column_description(merged_table, column, tableau_creds)
+            if status == PUBLISH_UPDATED:
+                success_count += 1
+            elif status == PUBLISH_FAILED:
                 failure_count += 1
-                logger.error("Error updating column %s: %s", column.get("name", "Unknown"), str(e))
+            elif status == PUBLISH_UNCHANGED:
+                unchanged_count += 1
 
         # Log final results
         logger.info("Completed publishing descriptions for %s", full_table_name)
-        logger.info("Success: %s, Failures: %s", success_count, failure_count)
+        logger.info(
+            "Success: %s, Failures: %s, Skipped (unchanged): %s",
+            success_count, failure_count, unchanged_count
+        )
 
         # Return counts for monitoring
-        return success_count, failure_count
+        return success_count, failure_count, unchanged_count
 
     def publish_table_description(
         self,
@@ -486,10 +958,29 @@ class tableauClient:
     ) -> str:
         """
         Updates a table description in Tableau's catalog via REST API
-            with dbt documentatin description.
+            with dbt documentatin description. No request is made when the
+            table's current description (tableauDescription) is the same.
         Args:
             description_text: dbt docs description to update in Tableau   
+        Returns: PUBLISH_UPDATED, PUBLISH_UNCHANGED or PUBLISH_FAILED
         """
+        if self.state_store is not None and self.state_store.is_current(
+            merged_table["luid"], ASPECT_DESCRIPTION, description_text
+        ):
+            logger.info(
+                "Description unchanged since last sync for table %s",
+                format_table_references(merged_table)
+            )
+            return PUBLISH_UNCHANGED
+        current_description = merged_table.get("tableauDescription")
+        # description_text is sent unescaped, so Tableau stores its unescaped form
+        if current_description is not None and (
+            clean_description(html.unescape(description_text)) == clean_description(current_description)
+        ):
+            logger.info("Description unchanged for table %s", format_table_references(merged_table))
+            self._record_state(merged_table["luid"], description_text)
+            return PUBLISH_UNCHANGED
+
         url = (
             f"{self.tableau_server_url}/api/{TABLEAU_API_VERSION}/sites/"
             f"{tableau_creds['site']['id']}/tables/{merged_table['luid']}"
@@ -503,29 +994,189 @@ class tableauClient:
         }
 
         try:
-            response = requests.put(
+            response = self.session.put(
                 url,
                 headers=headers,
-                data=payload,
-                timeout=60
+                data=payload
             )
             response.raise_for_status()
-            if response.status_code == 200:
-                logger.info("Successfully updated the description for %s", merged_table["name"])
-            else:
+            if response.status_code != 200:
                 logger.warning(
                     "Unexpected status code %s for table %s", 
                     response.status_code, merged_table["name"]
                 )
+                return PUBLISH_FAILED
+            logger.info("Successfully updated the description for %s", merged_table["name"])
+            self._record_state(merged_table["luid"], description_text)
             logger.info(
                 "Updated description for table %s", format_table_references(merged_table)
             )
 
-            return response.text
+            return PUBLISH_UPDATED
 
         except requests.exceptions.RequestException as e:
             logger.error("Failed to update table description: %s", str(e))
+            return PUBLISH_FAILED
+
+
+    def _record_state(self, luid: str, description: str, parent_luid: str = None):
+        """
+        Records a published description in the state store, if one is configured.
+        """
+        if self.state_store is not None:
+            self.state_store.record(luid, ASPECT_DESCRIPTION, description, parent_luid)
+
+    def _site_url(self, tableau_creds: dict) -> str:
+        return f"{self.tableau_server_url}/api/{TABLEAU_API_VERSION}/sites/{tableau_creds['site']['id']}"
+
+    def _write(
+        self,
+        method: str,
+        url: str,
+        tableau_creds: dict,
+        payload: Optional[str] = None
+        ) -> bool:
+        """
+        Sends a write request to the Tableau REST API. Returns True if it succeeded.
+        """
+        headers = {
+            "X-Tableau-Auth": tableau_creds["token"],
+            "Content-Type": "application/xml",
+            "Accept": "application/xml"
+        }
+        try:
+            response = self.session.request(
+                method,
+                url,
+                headers=headers,
+                data=payload.encode("utf-8") if payload is not None else None
+            )
+            response.raise_for_status()
+            return True
+        except requests.exceptions.RequestException as e:
+            logger.error("%s %s failed: %s", method, url, str(e))
+            return False
+
+    def update_table(
+        self,
+        table_luid: str,
+        tableau_creds: dict,
+        description: Optional[str] = None,
+        is_certified: Optional[bool] = None,
+        certification_note: Optional[str] = None
+        ) -> bool:
+        """
+        Updates the description and/or certification of a table without comparing
+        them with Tableau first. Text values must already be escaped for XML.
+        Returns True if the update succeeded.
+        """
+        attributes = ""
+        if description is not None:
+            attributes += f' description="{description}"'
+        if is_certified is not None:
+            attributes += f' isCertified="{str(is_certified).lower()}"'
+            attributes += f' certificationNote="{certification_note or ""}"'
+        return self._write(
+            "PUT",
+            f"{self._site_url(tableau_creds)}/tables/{table_luid}",
+            tableau_creds,
+            f"<tsRequest><table{attributes}></table></tsRequest>"
+        )
+
+    def update_column_description(
+        self,
+        table_luid: str,
+        column_luid: str,
+        description: str,
+        tableau_creds: dict
+        ) -> bool:
+        """
+        Updates the description of a column without comparing it with Tableau first.
+        The description must already be escaped for XML.
+        """
+        return self._write(
+            "PUT",
+            f"{self._site_url(tableau_creds)}/tables/{table_luid}/columns/{column_luid}",
+            tableau_creds,
+            f'<tsRequest><column description="{description}"/></tsRequest>'
+        )
+
+    def add_tags(self, asset_type: str, asset_luid: str, tags: List[str], tableau_creds: dict) -> bool:
+        """
+        Adds tags to a table or column.
+        args:
+            asset_type: "tables" or "columns".
+        """
+        tag_elements = "".join(f'<tag label="{html.escape(tag, quote=True)}"/>' for tag in tags)
+        return self._write(
+            "PUT",
+            f"{self._site_url(tableau_creds)}/{asset_type}/{asset_luid}/tags",
+            tableau_creds,
+            f"<tsRequest><tags>{tag_elements}</tags></tsRequest>"
+        )
+
+    def get_data_quality_warnings(self, table_luid: str, tableau_creds: dict) -> list:
+        """
+        Returns the data quality warnings set on a table.
+        """
+        response = self.session.get(
+            f"{self._site_url(tableau_creds)}/dataQualityWarnings/table/{table_luid}",
+            headers={"X-Tableau-Auth": tableau_creds["token"], "Accept": "application/json"}
+        )
+        response.raise_for_status()
+        warning_list = response.json().get("dataQualityWarningList") or {}
+        return warning_list.get("dataQualityWarning", [])
+
+    def create_data_quality_warning(
+        self,
+        table_luid: str,
+        message: str,
+        is_severe: bool,
+        tableau_creds: dict
+        ) -> bool:
+        """
+        Creates a data quality warning on a table. The message must already be escaped for XML.
+        """
+        return self._write(
+            "POST",
+            f"{self._site_url(tableau_creds)}/dataQualityWarnings/table/{table_luid}",
+            tableau_creds,
+            self._data_quality_warning_payload(message, is_severe)
+        )
+
+    def update_data_quality_warning(
+        self,
+        warning_id: str,
+        message: str,
+        is_severe: bool,
+        tableau_creds: dict
+        ) -> bool:
+        """
+        Updates an existing data quality warning. The message must already be escaped for XML.
+        """
+        return self._write(
+            "PUT",
+            f"{self._site_url(tableau_creds)}/dataQualityWarnings/{warning_id}",
+            tableau_creds,
+            self._data_quality_warning_payload(message, is_severe)
+        )
 
+    def delete_data_quality_warning(self, warning_id: str, tableau_creds: dict) -> bool:
+        """
+        Deletes a data quality warning.
+        """
+        return self._write(
+            "DELETE",
+            f"{self._site_url(tableau_creds)}/dataQualityWarnings/{warning_id}",
+            tableau_creds
+        )
+
+    @staticmethod
+    def _data_quality_warning_payload(message: str, is_severe: bool) -> str:
+        return (
+            f'<tsRequest><dataQualityWarning type="WARNING" isActive="true" '
+            f'message="{message}" isSevere="{str(is_severe).lower()}"/></tsRequest>'
+        )
 
     def verify_column_description(
             self,
@@ -540,7 +1191,7 @@ class tableauClient:
         """
         try:
             url = (
-                f"{tableau_server}/api/{TABLEAU_API_VERSION}/sites/"
+                f"{self.tableau_server_url}/api/{TABLEAU_API_VERSION}/sites/"
                 f"{site_id}/tables/{table_id}/columns/{column_id}"
             )
 
@@ -548,7 +1199,7 @@ class tableauClient:
                 "X-Tableau-Auth": token,
                 "Accept": "application/xml"
             }
-            response = requests.get(url, headers=headers, timeout=60)
+            response = self.session.get(url, headers=headers)
             response.raise_for_status()
 
             # Parse response XML to get description
@@ -0,0 +1,223 @@
+import contextvars
+import copy
+import cProfile
+import itertools
+import json
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+from dbt_tableau.metrics import REGISTRY, metricsRegistry
+
+# Service name reported in the resource of exported spans
+DEFAULT_SERVICE_NAME="dbt-tableau"
+# Number of allocation sites written per stage in profile mode
+TRACEMALLOC_TOP_STATS=25
+# OTLP span kind and status codes
+SPAN_KIND_INTERNAL=1
+STATUS_CODE_OK=1
+STATUS_CODE_ERROR=2
+
+logger = logging.getLogger(__name__)
+
+# Span the current code runs in. Context variables follow asyncio tasks and
+# asyncio.to_thread, so spans opened in worker threads get the right parent
+_current_span=contextvars.ContextVar("dbt_tableau_current_span", default=None)
+
+def _attribute_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # OTLP JSON encodes 64 bit integers as strings
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+class traceSpan:
+    """
+    Timed unit of work of a trace, with its parent, attributes and status.
+    Besides wall time, every span records the CPU time of the process and the
+    HTTP requests sent while it was open, which tells CPU bound stages apart
+    from stages waiting on the network.
+    """
+    def __init__(self, name: str, trace_id: str, parent: Optional["traceSpan"], attributes: Dict[str, Any]):
+        self.name=name
+        self.trace_id=trace_id
+        self.span_id=secrets.token_hex(8)
+        self.parent_span_id=parent.span_id if parent is not None else None
+        self.attributes=dict(attributes)
+        self.start_time_ns=time.time_ns()
+        self.end_time_ns=None
+        self.error=None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def time_iterator(self, iterable, key: str) -> Iterator:
+        """
+        Yields from iterable and adds the seconds spent waiting for its items to the
+        key attribute, e.g. to separate the time spent fetching pages of a stream
+        from the time spent processing them.
+        """
+        self.attributes.setdefault(key, 0.0)
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.attributes[key] = round(self.attributes[key] + time.perf_counter() - start, 6)
+                return
+            self.attributes[key] = round(self.attributes[key] + time.perf_counter() - start, 6)
+            yield item
+
+    @property
+    def duration_seconds(self) -> float:
+        end = self.end_time_ns if self.end_time_ns is not None else time.time_ns()
+        return (end - self.start_time_ns) / 1e9
+
+    def to_otlp(self) -> dict:
+        otlp_span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(self.start_time_ns),
+            "endTimeUnixNano": str(self.end_time_ns or time.time_ns()),
+            "attributes": [
+                {"key": key, "value": _attribute_value(value)} for key, value in self.attributes.items()
+            ],
+            "status": {"code": STATUS_CODE_ERROR, "message": self.error} if self.error else {"code": STATUS_CODE_OK}
+        }
+        if self.parent_span_id is not None:
+            otlp_span["parentSpanId"] = self.parent_span_id
+        return otlp_span
+
+class spanTracer:
+    """
+    Records the spans of one sync run and exports them as OpenTelemetry (OTLP/JSON)
+    resourceSpans, which the OpenTelemetry collector and most tracing backends import.
+    With profile_dir, stage spans (opened with profile=True) also write a cProfile
+    dump and the top tracemalloc allocation sites of the stage to profile_dir, and
+    record the peak traced memory of the stage as an attribute. cProfile only sees
+    the thread that opened the span, while tracemalloc covers every thread.
+    """
+    def __init__(
+        self,
+        service_name: str = DEFAULT_SERVICE_NAME,
+        profile_dir: Optional[str] = None,
+        metrics: Optional[metricsRegistry] = None
+    ):
+        self.service_name=service_name
+        self.profile_dir=profile_dir
+        self.metrics=metrics if metrics is not None else REGISTRY
+        self.trace_id=secrets.token_hex(16)
+        self.spans=[]
+        self._lock=threading.Lock()
+        self._profiling=threading.local()
+        self._profile_numbers=itertools.count(1)
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+
+    @contextmanager
+    def span(self, name: str, profile: bool = False, **attributes) -> Iterator[traceSpan]:
+        """
+        Opens a span as a child of the current one for the duration of the with block.
+        args:
+            profile: profile the block when the tracer has a profile_dir.
+            attributes: initial span attributes.
+        """
+        current = traceSpan(name, self.trace_id, _current_span.get(), attributes)
+        token = _current_span.set(current)
+        cpu_start = time.process_time()
+        requests_start = self.metrics.request_count()
+        profiler = self._start_profile() if profile and self.profile_dir else None
+        try:
+            yield current
+        except BaseException as e:
+            current.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            if profiler is not None:
+                self._stop_profile(current, *profiler)
+            current.end_time_ns = time.time_ns()
+            current.set_attribute("process.cpu_seconds", round(time.process_time() - cpu_start, 6))
+            current.set_attribute("http.requests", self.metrics.request_count() - requests_start)
+            _current_span.reset(token)
+            with self._lock:
+                self.spans.append(current)
+            logger.info(
+                "Stage %s took %.2fs (%.2fs CPU, %s requests)",
+                name, current.duration_seconds, current.attributes["process.cpu_seconds"],
+                current.attributes["http.requests"]
+            )
+
+    def with_metrics(self, metrics: metricsRegistry) -> "spanTracer":
+        """
+        Returns a tracer adding its spans to this trace, whose spans count the requests
+        of another registry, e.g. of one Tableau site of a multi-site run.
+        """
+        tracer = copy.copy(self)
+        tracer.metrics = metrics
+        return tracer
+
+    def _start_profile(self):
+        # cProfile allows a single active profiler per thread, so nested stages are not profiled
+        if getattr(self._profiling, "active", False):
+            return None
+        self._profiling.active = True
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler, snapshot
+
+    def _stop_profile(self, current: traceSpan, profiler: cProfile.Profile, start_snapshot):
+        profiler.disable()
+        self._profiling.active = False
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        with self._lock:
+            prefix = os.path.join(
+                self.profile_dir, f"{next(self._profile_numbers):02d}_{re.sub(r'[^A-Za-z0-9_.-]', '_', current.name)}"
+            )
+        profiler.dump_stats(f"{prefix}.prof")
+        allocations = snapshot.compare_to(start_snapshot, "lineno")
+        with open(f"{prefix}.tracemalloc.txt", "w") as allocations_file:
+            for allocation in allocations[:TRACEMALLOC_TOP_STATS]:
+                allocations_file.write(f"{allocation}\n")
+        current.set_attribute("memory.peak_bytes", peak)
+        current.set_attribute("memory.allocated_bytes", sum(allocation.size_diff for allocation in allocations))
+        current.set_attribute("profile.path", f"{prefix}.prof")
+
+    def to_otlp(self) -> dict:
+        """
+        Returns the finished spans as an OTLP/JSON ExportTraceServiceRequest.
+        """
+        with self._lock:
+            spans = sorted(self.spans, key=lambda finished: finished.start_time_ns)
+        return {"resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": _attribute_value(self.service_name)}
+            ]},
+            "scopeSpans": [{
+                "scope": {"name": __name__},
+                "spans": [finished.to_otlp() for finished in spans]
+            }]
+        }]}
+
+    def write(self, path: str):
+        """
+        Writes the finished spans to path in OTLP/JSON.
+        """
+        with open(path, "w") as trace_file:
+            json.dump(self.to_otlp(), trace_file, indent=1)
+        logger.info("Wrote %s spans to %s", len(self.spans), path)
@@ -0,0 +1,254 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from dbt_tableau.dbt_metadata_api import get_models_for_job_async, latest_models
+
+# Event type of the dbt Cloud webhooks sent when a job run finished
+EVENT_RUN_COMPLETED="job.run.completed"
+# Path the dbt Cloud webhook posts to
+DEFAULT_WEBHOOK_PATH="/webhooks/dbt"
+# Seconds the first run of a burst waits for further runs before they are synced together
+DEFAULT_COALESCE_SECONDS=5.0
+# Runs synced at most by one batch
+DEFAULT_MAX_BATCH_RUNS=50
+# Largest webhook body accepted
+MAX_BODY_BYTES=1024 * 1024
+# Most table names sent as a metadata API filter. Larger batches stream every table instead
+MAX_TABLE_NAME_FILTER=3000
+# Seconds before the runs of a failed batch are synced again, doubled on every further failure
+DEFAULT_RETRY_SECONDS=30.0
+MAX_RETRY_SECONDS=900.0
+# Syncs of a run tried before it is given up
+MAX_RUN_ATTEMPTS=8
+
+logger = logging.getLogger(__name__)
+
+def sign_payload(secret: str, body: bytes) -> str:
+    """
+    Returns the signature dbt Cloud sends with a webhook in its Authorization
+    header: the hex HMAC-SHA256 of the raw body keyed with the webhook secret.
+    """
+    return hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+def verify_signature(secret: str, body: bytes, signature: Optional[str]) -> bool:
+    """
+    Returns True if signature is the signature of body, compared in constant time.
+    """
+    if not signature:
+        return False
+    return hmac.compare_digest(sign_payload(secret, body), signature.strip())
+
+def is_configured_run(
+    run: Dict[str, Any],
+    job_ids: Optional[Iterable[Any]] = None,
+    environment_id: Optional[Any] = None
+    ) -> bool:
+    """
+    Returns True if a run belongs to one of the synced jobs and to the synced
+    environment. Webhooks are configured per account, so they may report the
+    runs of any job, e.g. the CI jobs or the jobs of a staging environment.
+    args:
+        job_ids: jobs whose runs are synced. None accepts every job.
+        environment_id: environment whose runs are synced. None accepts every environment.
+    """
+    if job_ids is not None and str(run["job_id"]) not in {str(job_id) for job_id in job_ids}:
+        return False
+    return environment_id is None or str(run.get("environment_id")) == str(environment_id)
+
+def retry_delay(attempt: int, base: float = DEFAULT_RETRY_SECONDS, cap: float = MAX_RETRY_SECONDS) -> float:
+    """
+    Returns the seconds to wait before the given attempt (2 for the first retry)
+    of a failed batch: base, doubled for every further attempt, at most cap.
+    """
+    return min(cap, base * 2 ** max(0, attempt - 2))
+
+def parse_run_completed(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Returns the job id, run id, environment id and status of a "job run completed"
+    webhook payload, or None for other events.
+    """
+    if payload.get("eventType") != EVENT_RUN_COMPLETED:
+        return None
+    data = payload.get("data") or {}
+    # dbt Cloud sends the ids as strings
+    return {
+        "job_id": int(data["jobId"]),
+        "run_id": int(data["runId"]),
+        "environment_id": data.get("environmentId"),
+        "status": data.get("runStatus"),
+        "event_id": payload.get("eventId")
+    }
+
+class runQueue:
+    """
+    Queue of the dbt runs waiting to be synced that coalesces bursts: runs
+    received while a batch waits or syncs are collected into the next batch, and
+    a run delivered twice (dbt Cloud retries webhooks that timed out) is queued once.
+    Runs are put from the HTTP server threads and taken on the event loop.
+    """
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop=loop
+        self._pending={}
+        self._available=asyncio.Event()
+
+    def put(self, run: Dict[str, Any]):
+        """
+        Queues a run. Safe to call from any thread.
+        """
+        self.loop.call_soon_threadsafe(self._put, run)
+
+    def _put(self, run: Dict[str, Any]):
+        if run["run_id"] in self._pending:
+            logger.info("Run %s of job %s is already queued", run["run_id"], run["job_id"])
+            return
+        self._pending[run["run_id"]] = run
+        self._available.set()
+
+    def requeue(self, runs: List[Dict[str, Any]], delay: float):
+        """
+        Queues the runs of a failed batch again after delay seconds, counting their
+        attempts in their "attempts" field. A run delivered again in the meantime
+        is queued once. Called on the event loop.
+        """
+        retried = [dict(run, attempts=run.get("attempts", 1) + 1) for run in runs]
+        self.loop.call_later(delay, self._requeue, retried)
+
+    def _requeue(self, runs: List[Dict[str, Any]]):
+        for run in runs:
+            self._pending.setdefault(run["run_id"], run)
+        if runs:
+            self._available.set()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    async def get_batch(
+        self,
+        coalesce_seconds: float = DEFAULT_COALESCE_SECONDS,
+        max_runs: int = DEFAULT_MAX_BATCH_RUNS
+        ) -> List[Dict[str, Any]]:
+        """
+        Waits for a run, then for coalesce_seconds so the rest of a burst joins it,
+        and returns the queued runs in the order they arrived (at most max_runs).
+        """
+        await self._available.wait()
+        if coalesce_seconds > 0:
+            await asyncio.sleep(coalesce_seconds)
+        run_ids = list(self._pending)[:max_runs]
+        batch = [self._pending.pop(run_id) for run_id in run_ids]
+        if not self._pending:
+            self._available.clear()
+        return batch
+
+async def fetch_run_models(
+    discovery_api_url: str,
+    api_key: str,
+    runs: List[Dict[str, Any]],
+    session=None
+    ) -> List[Dict[str, Any]]:
+    """
+    Fetches the models built by each run concurrently and keeps the latest run of
+    every model, so a model rebuilt by several runs of a batch is synced once.
+    """
+    run_models = await asyncio.gather(*(
+        get_models_for_job_async(
+            discovery_api_url, api_key, run["job_id"], session=session, run_id=run["run_id"]
+        )
+        for run in runs
+    ))
+    return latest_models([model for models in run_models for model in models])
+
+def model_table_names(
+    models: List[Dict[str, Any]],
+    max_names: int = MAX_TABLE_NAME_FILTER
+    ) -> Optional[List[str]]:
+    """
+    Returns the names of the Tableau tables the models may be stored under, used to
+    only fetch the matching tables. Tableau compares names as is, so the names are
+    given as built, upper-cased (e.g. Snowflake) and lower-cased.
+    Returns None when there are more than max_names, to fetch every table instead.
+    """
+    names = set()
+    for model in models:
+        name = model.get("alias") or model["name"]
+        names.update((name, name.upper(), name.lower()))
+    if len(names) > max_names:
+        return None
+    return sorted(names)
+
+def serve_webhooks(
+    on_run: Callable[[Dict[str, Any]], None],
+    secret: str,
+    port: int,
+    host: str = "127.0.0.1",
+    path: str = DEFAULT_WEBHOOK_PATH,
+    job_ids: Optional[Iterable[Any]] = None,
+    environment_id: Optional[Any] = None
+    ) -> ThreadingHTTPServer:
+    """
+    Serves the dbt Cloud webhook endpoint on a background thread. Every signed
+    "job run completed" event of the synced jobs and environment (see
+    is_configured_run) is handed to on_run and answered right away, since
+    dbt Cloud expects a quick response and the sync happens later.
+    Requests with a missing or wrong signature get a 401, other events a 200.
+    GET /healthz answers 200 while the server runs. Call shutdown() on the
+    returned server to stop it.
+    """
+    class webhookHandler(BaseHTTPRequestHandler):
+        def _send(self, status: int, message: str):
+            body = json.dumps({"message": message}).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/healthz":
+                self._send(200, "ok")
+            else:
+                self._send(404, "not found")
+
+        def do_POST(self):
+            if self.path != path:
+                self._send(404, "not found")
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > MAX_BODY_BYTES:
+                self._send(413, "payload too large")
+                return
+            body = self.rfile.read(length)
+            if not verify_signature(secret, body, self.headers.get("Authorization")):
+                logger.warning("Rejected webhook with an invalid signature from %s", self.client_address[0])
+                self._send(401, "invalid signature")
+                return
+            try:
+                run = parse_run_completed(json.loads(body))
+            except (ValueError, KeyError, TypeError) as e:
+                self._send(400, f"invalid payload: {e}")
+                return
+            if run is None:
+                self._send(200, "ignored")
+                return
+            if not is_configured_run(run, job_ids, environment_id):
+                logger.info("Ignored run %s of job %s, which is not synced", run["run_id"], run["job_id"])
+                self._send(200, "ignored")
+                return
+            logger.info("Received run %s of job %s (%s)", run["run_id"], run["job_id"], run["status"])
+            on_run(run)
+            self._send(200, "queued")
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), webhookHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="webhooks", daemon=True).start()
+    logger.info("Listening for dbt Cloud webhooks on http://%s:%s%s", host, server.server_address[1], path)
+    return server
@@ -0,0 +1,124 @@
+import logging
+from typing import List, Dict, Any, Iterable, Iterator, Tuple
+
+from dbt_tableau.records import workbookRecord
+
+logger = logging.getLogger(__name__)
+
+class workbookRegistry:
+    """
+    Collects the Tableau workbooks downstream of merged tables, keyed by workbook luid.
+    Each workbook is stored once, however many tables, dbt projects or environments
+    it is found through. Its dbt project/environment associations and upstream
+    tables are merged as workbooks are added, so the registry never needs a
+    separate deduplication pass.
+    """
+    def __init__(self):
+        self._workbooks={}
+        self._projects={}
+        self._upstream_tables={}
+        self._downstream_of_tables={}
+
+    def __len__(self) -> int:
+        return len(self._workbooks)
+
+    def __contains__(self, workbook_luid: str) -> bool:
+        return workbook_luid in self._workbooks
+
+    def __iter__(self) -> Iterator[dict]:
+        for workbook_luid in self._workbooks:
+            yield self.get(workbook_luid)
+
+    def add(
+        self,
+        workbook: dict,
+        dbt_projects: Iterable[Tuple[Any, Any]],
+        table_luids: Iterable[str] = ()
+        ):
+        """
+        Adds a workbook found downstream of dbt models, merging it with any earlier
+        entry of the same luid.
+        args:
+            workbook: workbook returned by the metadata API, with its upstreamTables.
+            dbt_projects: (project id, environment id) pairs of the dbt models.
+            table_luids: luids of the merged tables the workbook was found through.
+        """
+        workbook_luid = workbook["luid"]
+        if workbook_luid not in self._workbooks:
+            self._workbooks[workbook_luid] = workbookRecord(
+                (key, value) for key, value in workbook.items()
+                if key not in ("upstreamTables", "downstreamOfTables")
+            )
+            self._projects[workbook_luid] = {}
+            self._upstream_tables[workbook_luid] = {}
+            self._downstream_of_tables[workbook_luid] = {}
+
+        # dicts are used as insertion ordered sets
+        projects = self._projects[workbook_luid]
+        for project in dbt_projects:
+            projects[project] = None
+        upstream_tables = self._upstream_tables[workbook_luid]
+        for table in workbook.get("upstreamTables") or []:
+            upstream_tables.setdefault(table.get("luid") or table["id"], table)
+        downstream_of_tables = self._downstream_of_tables[workbook_luid]
+        for table_luid in table_luids:
+            downstream_of_tables[table_luid] = None
+
+    def add_downstream_workbooks(
+        self,
+        downstream_workbooks: Dict[str, dict],
+        merged_tables_by_luid: Dict[str, dict]
+        ):
+        """
+        Adds the workbooks returned by get_downstream_workbooks_for_tables, associating
+        each with the dbt projects and environments of the tables it sits downstream of.
+        args:
+            downstream_workbooks: workbooks keyed by luid, each with a downstreamOfTables list.
+            merged_tables_by_luid: the merged tables the workbooks were requested for.
+        """
+        for workbook in downstream_workbooks.values():
+            table_luids = workbook.get("downstreamOfTables", [])
+            dbt_projects = [
+                (
+                    merged_tables_by_luid[table_luid]["projectId"],
+                    merged_tables_by_luid[table_luid].get("environmentId")
+                )
+                for table_luid in table_luids
+            ]
+            self.add(workbook, dbt_projects, table_luids)
+
+    def get(self, workbook_luid: str) -> dict:
+        """
+        Returns a workbook with its merged upstreamTables, downstreamOfTables and
+        dbt_projects, a list of (project id, environment id) pairs.
+        """
+        workbook = dict(self._workbooks[workbook_luid])
+        workbook["upstreamTables"] = list(self._upstream_tables[workbook_luid].values())
+        workbook["downstreamOfTables"] = list(self._downstream_of_tables[workbook_luid])
+        workbook["dbt_projects"] = list(self._projects[workbook_luid])
+        return workbook
+
+    def project_ids(self) -> List[Any]:
+        """
+        Returns the ids of all dbt projects with downstream workbooks.
+        """
+        return list(dict.fromkeys(
+            project_id
+            for projects in self._projects.values()
+            for project_id, _ in projects
+        ))
+
+    def workbooks_by_project(self) -> Dict[Any, List[dict]]:
+        """
+        Groups the workbooks by dbt project id in a single pass. A workbook downstream
+        of several projects is listed under each of them, once per project.
+        """
+        grouped = {}
+        for workbook_luid, projects in self._projects.items():
+            workbook = self.get(workbook_luid)
+            for project_id in dict.fromkeys(project_id for project_id, _ in projects):
+                grouped.setdefault(project_id, []).append(workbook)
+        logger.info(
+            "Grouped %s workbooks into %s dbt projects", str(len(self)), str(len(grouped))
+        )
+        return grouped
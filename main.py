@@ -1,22 +1,91 @@
 import os
+import sys
+import json
+import time
+import signal
+import argparse
+import asyncio
 import requests
 import logging
+from typing import Awaitable, Optional
 
-from dbt_tableau.dbt_metadata_api import get_models_for_job
-from dbt_tableau.tableau import tableauClient
+from dbt_tableau.dbt_metadata_api import (
+    get_models_for_job,
+    get_models_for_job_async,
+    get_completed_runs,
+    iter_applied_models,
+    filter_models_since_watermarks,
+    latest_models
+)
+from dbt_tableau.http_session import create_session
+from dbt_tableau.retry import retryPolicy
+from dbt_tableau.metrics import REGISTRY, metricsRegistry
+from dbt_tableau.multi_site import siteConfig, siteClients, load_site_configs, site_path, log_site_results
+from dbt_tableau.merge_index import mergeIndex
+from dbt_tableau.tracing import spanTracer
+from dbt_tableau.pipeline import syncPipeline
+from dbt_tableau.sharding import parse_shard, shard_tables, shard_path
+from dbt_tableau.run_journal import runJournal, dbt_runs_key, DEFAULT_JOURNAL_PATH
+from dbt_tableau.webhooks import (
+    runQueue,
+    serve_webhooks,
+    fetch_run_models,
+    model_table_names,
+    retry_delay,
+    DEFAULT_COALESCE_SECONDS,
+    MAX_RUN_ATTEMPTS
+)
 # from dbt_tableau.extract_job_runs import get_dbt_jobs
 from dotenv import load_dotenv
 
 load_dotenv()
 #### dbt ####
+# dbt Cloud base URL of the Administrative API, e.g. https://cloud.getdbt.com
 API_BASE_URL = os.getenv("API_BASE_URL")
 METADATA_API_URL = os.getenv("METADATA_API_URL")
 DBT_API_KEY = os.getenv("DBT_API_PAT")
+DBT_JOB_ID = os.getenv("DBT_JOB_ID")
+# dbt Cloud account, and the comma separated jobs polled in --daemon mode (DBT_JOB_ID by default)
+DBT_ACCOUNT_ID = os.getenv("DBT_ACCOUNT_ID")
+DBT_JOB_IDS = [job_id.strip() for job_id in (os.getenv("DBT_JOB_IDS") or DBT_JOB_ID or "").split(",") if job_id.strip()]
+# When set, models are paged from the environment's applied state instead of a single job run
+DBT_ENVIRONMENT_ID = os.getenv("DBT_ENVIRONMENT_ID")
+# JSON list of model filters (e.g. [{"schema": "marts"}, {"schema": "staging"}]) paged in
+# parallel from the environment's applied state. Together they have to cover every model
+DBT_MODEL_PARTITIONS = json.loads(os.getenv("DBT_MODEL_PARTITIONS") or "null")
 #### Tableau ###
-TABLEAU_SERVER_URL =  os.getenv("TABLEAU_SERVER")
-TABLEAU_SITE_NAME = os.getenv("TABLEAU_SITE")
-TABLEAU_PAT_NAME = os.getenv("TABLEAU_PAT_NAME")
-TABLEAU_PAT = os.getenv("TABLEAU_PAT")
+# The site is read from TABLEAU_SERVER, TABLEAU_SITE, TABLEAU_PAT_NAME, TABLEAU_PAT,
+# TABLEAU_DATABASES (comma separated Tableau Catalog databases holding the tables
+# associated to workbooks) and TABLEAU_MAX_CONCURRENCY (Tableau API requests in flight
+# at once). To sync several sites from one dbt fetch, list their keys in TABLEAU_SITES
+# (e.g. prod,finance,eu) and set TABLEAU_<KEY>_SITE, TABLEAU_<KEY>_PAT_NAME and TABLEAU_<KEY>_PAT
+# (a PAT per site), and optionally TABLEAU_<KEY>_SERVER, ... per site, see
+# dbt_tableau.multi_site.load_site_configs
+# Path of the file caching the Tableau session token between runs. Unset to sign in on every run
+TABLEAU_TOKEN_CACHE_PATH = os.getenv("TABLEAU_TOKEN_CACHE_PATH")
+# Path of the local sync state database. Unset to always compare against Tableau only.
+# With TABLEAU_SITES, this and the journal and metrics paths get the site key, e.g. state.finance.db
+SYNC_STATE_PATH = os.getenv("SYNC_STATE_PATH")
+# Path of the journal of completed operations read by --resume
+RUN_JOURNAL_PATH = os.getenv("RUN_JOURNAL_PATH", DEFAULT_JOURNAL_PATH)
+#### Webhooks (--listen) ####
+# Secret of the dbt Cloud webhook, used to check the signature of every event
+DBT_WEBHOOK_SECRET = os.getenv("DBT_WEBHOOK_SECRET")
+# Address the webhook endpoint (POST /webhooks/dbt) listens on
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+# Seconds the first run of a burst waits for the others, which are then synced together
+WEBHOOK_COALESCE_SECONDS = float(os.getenv("WEBHOOK_COALESCE_SECONDS", DEFAULT_COALESCE_SECONDS))
+#### Daemon (--daemon) ####
+# Seconds between the end of a cycle and the start of the next
+DAEMON_INTERVAL_SECONDS = float(os.getenv("DAEMON_INTERVAL_SECONDS", "300"))
+#### Metrics ####
+# Request metrics written at the end of the run, as JSON if the path ends with .json
+# and as a Prometheus textfile otherwise
+METRICS_PATH = os.getenv("METRICS_PATH")
+# Local port serving the metrics (/metrics, /metrics.json) while the sync runs. With
+# several sites, the requests of each site are served under a site label
+METRICS_PORT = os.getenv("METRICS_PORT")
 
 def verify_column_description(
     tableau_server,
@@ -48,46 +117,488 @@ def verify_column_description(
         logging.error("Error verifying column description: %s", str(e))
         return None
 
-def restore_full_model_name(tables_json):
+def parse_args() -> argparse.Namespace:
     """
-    Adds aliases back to FQN tables found in a Tableau catalog database.
+    Parses the command line options of the sync.
     """
-    for tab in tables_json["tables"]:
-        tab["fullName"] = tab["fullName"].replace("[", "").replace("]", "")
-        fqn_split = tab["fullName"].split(".")
-        if len(fqn_split) == 1:
-            tab["fullName"] = f"PRODUCTION.{tab['schema']}.{tab['fullName']}"
-        elif len(fqn_split) == 2:
-            tab["fullName"] = f"PRODUCTION.{tab['fullName']}"
-        else:
-            tab["fullName"] = tab["fullName"]
-    return tables_json
+    parser = argparse.ArgumentParser(description="Sync dbt model metadata to the Tableau catalog.")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only sync models executed since the last synced run of the job (requires SYNC_STATE_PATH)"
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="PATH",
+        help="write the timing spans of each stage to PATH as OpenTelemetry (OTLP) JSON"
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="profile",
+        metavar="DIR",
+        help="write a cProfile dump and tracemalloc allocation sites of each stage to DIR (default: profile)"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="skip the writes completed by the previous, interrupted run (see RUN_JOURNAL_PATH)"
+    )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        metavar="I/N",
+        help="only sync the tables whose luid hashes to shard I of N (see run_shards.py)"
+    )
+    parser.add_argument(
+        "--listen",
+        action="store_true",
+        help="run until stopped, syncing the models of each dbt Cloud run announced by a "
+        "job run completed webhook (see DBT_WEBHOOK_SECRET and WEBHOOK_PORT)"
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="run until stopped, polling the dbt Cloud runs of DBT_JOB_IDS every "
+        "DAEMON_INTERVAL_SECONDS and syncing the models of the new runs"
+    )
+    args = parser.parse_args()
+    if args.listen and args.daemon:
+        parser.error("--listen and --daemon are exclusive")
+    if args.listen and not DBT_WEBHOOK_SECRET:
+        parser.error("--listen requires DBT_WEBHOOK_SECRET to be set")
+    if args.daemon and not (API_BASE_URL and DBT_ACCOUNT_ID and DBT_JOB_IDS):
+        parser.error("--daemon requires API_BASE_URL, DBT_ACCOUNT_ID and DBT_JOB_IDS (or DBT_JOB_ID) to be set")
+    if (args.listen or args.daemon) and (args.incremental or args.resume or args.shard):
+        parser.error("--listen and --daemon cannot be combined with --incremental, --resume or --shard")
+    if args.incremental and not SYNC_STATE_PATH:
+        parser.error("--incremental requires SYNC_STATE_PATH to be set")
+    return args
 
-if __name__ == "__main__":
-    # Initialize Tableau API client
-    tableau_client = tableauClient(
-        TABLEAU_SERVER_URL,
-        TABLEAU_SITE_NAME,
-        TABLEAU_PAT_NAME,
-        TABLEAU_PAT
+async def sync_site(
+    site: siteConfig,
+    models_task: asyncio.Future,
+    index_task: asyncio.Future,
+    args: argparse.Namespace,
+    tracer: spanTracer,
+    metrics: Optional[metricsRegistry]
+    ) -> dict:
+    """
+    Syncs the dbt models to the tables of one Tableau site.
+    args:
+        models_task: the dbt models, fetched once for all sites.
+        index_task: the mergeIndex of all the models shared by the sites, None for an
+            incremental sync.
+        metrics: registry of the requests of the site, REGISTRY when None.
+
+    Returns: the success, failure and unchanged counts of the site, with the
+        seconds and requests its sync took.
+    """
+    start = time.perf_counter()
+    # A table always falls into the same shard, so each shard keeps its own sync state and watermarks
+    clients = siteClients(
+        site,
+        site_path(shard_path(SYNC_STATE_PATH, args.shard), site) if SYNC_STATE_PATH else None,
+        TABLEAU_TOKEN_CACHE_PATH,
+        metrics
     )
-    # Need to specify dbt cloud PROD environment ID 1939
-    # jobs = get_dbt_jobs(account_id)
-    # Returns metadata on all models ran in
-    models = get_models_for_job(METADATA_API_URL, DBT_API_KEY, )
-
-    # The "PRODUCTION" database in the Tableau Catalog is the only one containing
-    # tables associated to workbooks
-    tableau_creds = tableau_client.authenticate()
-    tableau_databases = tableau_client.get_databases(tableau_creds, ["PRODUCTION"])
-    tableau_database_tables = restore_full_model_name(tableau_databases[1])
-    merged_tables = tableau_client.merge_table_metadata(
-        tableau_databases[1],
-        tableau_database_tables,
-        models
+    tableau_client, async_client, state_store = clients.tableau_client, clients.async_client, clients.state_store
+    site_tracer = tracer.with_metrics(tableau_client.metrics)
+    journal = None
+    failure_count = None
+    try:
+        with site_tracer.span("tableau.site", **{"tableau.site": site.label}):
+            # Signing in to Tableau overlaps with the dbt fetch
+            tableau_creds = await clients.authenticate()
+            # Journal of the operations completed by this run, so an interrupted run can be
+            # resumed. It is only resumed while the dbt runs of the models are unchanged
+            journal = runJournal(
+                site_path(shard_path(RUN_JOURNAL_PATH, args.shard), site),
+                "|".join([
+                    site.server_url,
+                    site.site_name,
+                    str(DBT_ENVIRONMENT_ID or DBT_JOB_ID),
+                    ",".join(site.databases),
+                    dbt_runs_key(await models_task)
+                ]),
+                resume=args.resume
+            )
+            if args.incremental:
+                # Each site has its own watermarks, so the models changed since its last sync are indexed for it alone
+                models, new_watermarks = filter_models_since_watermarks(
+                    await models_task, state_store.get_watermarks()
+                )
+                with site_tracer.span("dbt.index_models", profile=True):
+                    merge_index = mergeIndex(models)
+            else:
+                merge_index = await index_task
+            # Tables are streamed page by page through the merge, the column fetch and the
+            # publishers, so writes start with the first page and memory is bounded by the
+            # pipeline queues. Names without a database are resolved against the database
+            # they are listed in
+            pipeline = syncPipeline(async_client, merge_index, tableau_creds, tracer=site_tracer, journal=journal)
+            success_count, failure_count, unchanged_count = await pipeline.run(
+                lambda: shard_tables(tableau_client.iter_database_tables(
+                    tableau_creds, site.databases
+                ), args.shard)
+            )
+            # Only move the watermarks forward when every change landed, so failed
+            # writes are retried by the next incremental run
+            if args.incremental and failure_count == 0:
+                for (job_id, environment_id), watermark in new_watermarks.items():
+                    state_store.set_watermark(job_id, environment_id, watermark)
+    finally:
+        clients.close()
+        if journal is not None:
+            journal.close(completed=failure_count == 0)
+        if metrics is not None:
+            logging.info("Request metrics of site %s by endpoint:\n%s", site.label, metrics.summary())
+            if METRICS_PATH:
+                metrics.write(site_path(METRICS_PATH, site))
+    return {
+        "success": success_count,
+        "failure": failure_count,
+        "unchanged": unchanged_count,
+        "seconds": time.perf_counter() - start,
+        "requests": tableau_client.metrics.request_count()
+    }
+
+async def timed_site_result(sync: Awaitable[dict]) -> dict:
+    """
+    Returns the results of the sync of a site, or the error that stopped it with
+    the seconds it ran for, so a failing site does not stop the others.
+    """
+    start = time.perf_counter()
+    try:
+        return await sync
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}", "seconds": time.perf_counter() - start}
+
+async def main(args: argparse.Namespace):
+    sites = load_site_configs()
+    # With several sites, each records its requests in its own registry so its
+    # results and metrics file only count its own requests. The shared REGISTRY
+    # then holds the dbt requests, and serves and writes those of the sites too,
+    # labelled with their site
+    multi_site = len(sites) > 1 or sites[0].name is not None
+    dbt_session = create_session(retry_policy=retryPolicy())
+    metrics_server = REGISTRY.serve(int(METRICS_PORT)) if METRICS_PORT else None
+    # Timing spans of each stage, exported with --trace (and profiled with --profile)
+    tracer = spanTracer(profile_dir=args.profile, metrics=REGISTRY)
+    # The dbt lookup is built once and shared by the tables of all databases and sites.
+    # Incremental syncs index the models changed since the last sync of each site instead
+    merge_index = mergeIndex() if not args.incremental else None
+
+    def fetch_models():
+        # Runs on a worker thread and is profiled there, since cProfile only sees its own thread
+        with tracer.span("dbt.fetch_models", profile=True) as stage:
+            if DBT_ENVIRONMENT_ID:
+                models = iter_applied_models(
+                    METADATA_API_URL, DBT_API_KEY, int(DBT_ENVIRONMENT_ID),
+                    partitions=DBT_MODEL_PARTITIONS, session=dbt_session
+                )
+            else:
+                models = get_models_for_job(
+                    METADATA_API_URL, DBT_API_KEY, int(DBT_JOB_ID), session=dbt_session
+                )
+            # Models are indexed as their pages arrive, so indexing overlaps the fetch
+            fetched_models = []
+            for model in models:
+                fetched_models.append(model)
+                if merge_index is not None:
+                    merge_index.add_model(model)
+            stage.set_attribute("dbt.models", len(fetched_models))
+        return fetched_models
+
+    async def index_models():
+        await models_task
+        return merge_index
+
+    models_task = asyncio.ensure_future(asyncio.to_thread(fetch_models))
+    index_task = asyncio.ensure_future(index_models()) if not args.incremental else None
+    try:
+        if multi_site:
+            # Every site signs in and syncs concurrently, bounded by its own concurrency limit.
+            # A failing site does not stop the others
+            outcomes = await asyncio.gather(*(
+                timed_site_result(sync_site(site, models_task, index_task, args, tracer, REGISTRY.child({"site": site.label})))
+                for site in sites
+            ))
+        else:
+            outcomes = [await sync_site(sites[0], models_task, index_task, args, tracer, None)]
+    finally:
+        pending = [task for task in (models_task, index_task) if task is not None]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        dbt_session.close()
+        logging.info("Request metrics by endpoint:\n%s", REGISTRY.summary())
+        if METRICS_PATH:
+            REGISTRY.write(METRICS_PATH)
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        if args.trace or args.profile:
+            tracer.write(args.trace or os.path.join(args.profile, "trace.json"))
+
+    results = {site.label: outcome for site, outcome in zip(sites, outcomes)}
+    if multi_site:
+        log_site_results(results)
+    # A run with failed writes exits non-zero, like one that failed outright
+    if any(result.get("error") or result.get("failure") for result in results.values()):
+        sys.exit(1)
+
+def open_site_clients() -> list:
+    """
+    Opens the clients of every configured site, for the modes keeping them between syncs.
+    """
+    sites = load_site_configs()
+    multi_site = len(sites) > 1 or sites[0].name is not None
+    return [
+        siteClients(
+            site,
+            site_path(SYNC_STATE_PATH, site) if SYNC_STATE_PATH else None,
+            TABLEAU_TOKEN_CACHE_PATH,
+            REGISTRY.child({"site": site.label}) if multi_site else None
+        )
+        for site in sites
+    ]
+
+def stop_on_signals(loop: asyncio.AbstractEventLoop) -> asyncio.Event:
+    """
+    Returns an event set on SIGINT or SIGTERM, so long running modes stop between syncs.
+    """
+    stopping = asyncio.Event()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signal_number, stopping.set)
+    return stopping
+
+async def sync_sites(site_clients: list, merge_index: mergeIndex, table_names: Optional[list] = None) -> dict:
+    """
+    Syncs the indexed dbt models to every site concurrently, keeping the site clients open.
+    args:
+        table_names: only fetch the Tableau tables with these names. None fetches every table.
+
+    Returns: the results of each site, as logged by log_site_results.
+    """
+    async def sync_site_tables(clients: siteClients) -> dict:
+        start = time.perf_counter()
+        requests_before = clients.metrics.request_count()
+        tableau_creds = await clients.authenticate()
+        pipeline = syncPipeline(clients.async_client, merge_index, tableau_creds)
+        success_count, failure_count, unchanged_count = await pipeline.run(
+            lambda: clients.tableau_client.iter_database_tables(
+                tableau_creds, clients.site.databases, table_names=table_names
+            )
+        )
+        return {
+            "success": success_count,
+            "failure": failure_count,
+            "unchanged": unchanged_count,
+            "seconds": time.perf_counter() - start,
+            "requests": clients.metrics.request_count() - requests_before
+        }
+
+    outcomes = await asyncio.gather(
+        *(timed_site_result(sync_site_tables(clients)) for clients in site_clients)
     )
-    # for table in merged_tables:
-    #     table_cols = tableau_client.get_column_metadata(table, tableau_creds)
-    #     tableau_client.publish_column_descriptions(table, table_cols, tableau_creds)
-    #     tableau_client.publish_table_description(table, table["description"], tableau_creds)
+    return {clients.site.label: outcome for clients, outcome in zip(site_clients, outcomes)}
+
+async def sync_runs(runs: list, site_clients: list, dbt_session) -> dict:
+    """
+    Syncs the models built by a batch of dbt runs to the matching tables of every site.
+    Returns: the results of each site, as logged by log_site_results.
+    """
+    models = await fetch_run_models(METADATA_API_URL, DBT_API_KEY, runs, dbt_session)
+    if not models:
+        logging.info("Runs %s built no models", [run["run_id"] for run in runs])
+        return {}
+    # Only the tables named like the models are fetched from Tableau, instead of every table
+    return await sync_sites(site_clients, mergeIndex(models), model_table_names(models))
 
+async def listen(args: argparse.Namespace):
+    """
+    Serves the dbt Cloud webhook endpoint until SIGINT or SIGTERM, and syncs the
+    models of every completed run to the matching tables of each site. Runs received
+    while a batch waits or syncs are coalesced into the next batch. A batch that fails
+    on any site is queued again with an exponential backoff, up to MAX_RUN_ATTEMPTS
+    times. Runs of other jobs or environments than the configured ones are ignored.
+    The site clients stay signed in with their connections open between batches.
+    """
+    loop = asyncio.get_running_loop()
+    dbt_session = create_session(retry_policy=retryPolicy())
+    site_clients = open_site_clients()
+    queue = runQueue(loop)
+    stopping = stop_on_signals(loop)
+    metrics_server = REGISTRY.serve(int(METRICS_PORT)) if METRICS_PORT else None
+    webhook_server = None
+    try:
+        # Signing in before the first event keeps it off the latency of the first sync
+        await asyncio.gather(*(clients.authenticate() for clients in site_clients))
+        # Only the runs of the synced jobs (and environment) are queued
+        webhook_server = serve_webhooks(
+            queue.put, DBT_WEBHOOK_SECRET, WEBHOOK_PORT, WEBHOOK_HOST,
+            job_ids=DBT_JOB_IDS or None, environment_id=DBT_ENVIRONMENT_ID
+        )
+        while not stopping.is_set():
+            next_batch = asyncio.ensure_future(queue.get_batch(WEBHOOK_COALESCE_SECONDS))
+            stop = asyncio.ensure_future(stopping.wait())
+            done, _ = await asyncio.wait({next_batch, stop}, return_when=asyncio.FIRST_COMPLETED)
+            if next_batch not in done:
+                next_batch.cancel()
+                break
+            stop.cancel()
+            runs = next_batch.result()
+            start = time.perf_counter()
+            logging.info("Syncing runs %s", [run["run_id"] for run in runs])
+            try:
+                results = await sync_runs(runs, site_clients, dbt_session)
+                log_site_results(results)
+                failed = any(result.get("error") or result.get("failure") for result in results.values())
+            except Exception as e:
+                # A failed dbt fetch fails the batch rather than the listener
+                logging.exception("Could not sync runs %s: %s", [run["run_id"] for run in runs], str(e))
+                failed = True
+            if failed:
+                # The runs are synced again later, so their updates are not lost. Sites
+                # that synced them skip the unchanged descriptions the next time
+                retried = [run for run in runs if run.get("attempts", 1) < MAX_RUN_ATTEMPTS]
+                given_up = [run["run_id"] for run in runs if run.get("attempts", 1) >= MAX_RUN_ATTEMPTS]
+                if given_up:
+                    logging.error("Giving up on runs %s after %s attempts", given_up, MAX_RUN_ATTEMPTS)
+                if retried:
+                    delay = retry_delay(max(run.get("attempts", 1) for run in retried) + 1)
+                    logging.warning(
+                        "Syncing runs %s again in %.0fs", [run["run_id"] for run in retried], delay
+                    )
+                    queue.requeue(retried, delay)
+                continue
+            logging.info(
+                "Synced %s runs in %.1fs, %s runs queued meanwhile",
+                len(runs), time.perf_counter() - start, len(queue)
+            )
+    finally:
+        # The batch in progress finishes before the listener stops
+        logging.info("Stopping webhook listener")
+        if webhook_server is not None:
+            webhook_server.shutdown()
+        for clients in site_clients:
+            clients.close()
+        dbt_session.close()
+        if METRICS_PATH:
+            REGISTRY.write(METRICS_PATH)
+        if metrics_server is not None:
+            metrics_server.shutdown()
+
+async def fetch_job_models(job_ids: list, dbt_session) -> list:
+    """
+    Fetches the models of the latest run of every job concurrently, keeping the
+    latest run of a model built by several jobs.
+    """
+    job_models = await asyncio.gather(*(
+        get_models_for_job_async(METADATA_API_URL, DBT_API_KEY, job_id, session=dbt_session)
+        for job_id in job_ids
+    ))
+    return latest_models([model for models in job_models for model in models])
+
+async def poll_new_runs(job_ids: list, last_run_ids: dict, dbt_session) -> list:
+    """
+    Returns the runs of the jobs finished since the last synced run of each.
+    """
+    job_runs = await asyncio.gather(*(
+        asyncio.to_thread(
+            get_completed_runs, API_BASE_URL, DBT_API_KEY, int(DBT_ACCOUNT_ID), job_id,
+            last_run_ids.get(job_id), dbt_session
+        )
+        for job_id in job_ids
+    ))
+    return [
+        {"job_id": job_id, "run_id": run["id"], "status": run.get("status_humanized")}
+        for job_id, runs in zip(job_ids, job_runs) for run in runs
+    ]
+
+async def daemon(args: argparse.Namespace):
+    """
+    Runs until SIGINT or SIGTERM, syncing every DAEMON_INTERVAL_SECONDS. The first
+    cycle syncs the latest run of every job and indexes its models. Later cycles
+    poll the dbt Cloud runs of the jobs and only sync the models of the runs that
+    finished since, to the tables named like them, adding the models to the index.
+    The index, the site clients (session tokens and connection pools), the dbt
+    session and the last synced run of each job are kept between cycles. Runs are
+    only marked synced once every site synced them without failures, so the next
+    cycle retries them otherwise.
+    """
+    loop = asyncio.get_running_loop()
+    job_ids = [int(job_id) for job_id in DBT_JOB_IDS]
+    dbt_session = create_session(retry_policy=retryPolicy())
+    site_clients = open_site_clients()
+    # The sites share REGISTRY when there is a single one
+    registries = list({id(registry): registry for registry in [REGISTRY] + [clients.metrics for clients in site_clients]}.values())
+    stopping = stop_on_signals(loop)
+    metrics_server = REGISTRY.serve(int(METRICS_PORT)) if METRICS_PORT else None
+    merge_index = None
+    last_run_ids = {}
+    cycle = 0
+    try:
+        await asyncio.gather(*(clients.authenticate() for clients in site_clients))
+        while not stopping.is_set():
+            cycle += 1
+            start = time.perf_counter()
+            requests_before = sum(registry.request_count() for registry in registries)
+            model_count = 0
+            try:
+                if merge_index is None:
+                    models = await fetch_job_models(job_ids, dbt_session)
+                    index = mergeIndex(models)
+                    table_names = None
+                    synced_run_ids = {}
+                    for model in models:
+                        job_id = int(model["jobId"])
+                        synced_run_ids[job_id] = max(synced_run_ids.get(job_id, 0), int(model["runId"]))
+                else:
+                    runs = await poll_new_runs(job_ids, last_run_ids, dbt_session)
+                    models = await fetch_run_models(METADATA_API_URL, DBT_API_KEY, runs, dbt_session) if runs else []
+                    # The kept index only gets the models once every site synced them
+                    index = merge_index.copy() if models else merge_index
+                    index.add_models(models)
+                    table_names = model_table_names(models)
+                    synced_run_ids = {}
+                    for run in runs:
+                        synced_run_ids[run["job_id"]] = max(synced_run_ids.get(run["job_id"], 0), run["run_id"])
+                    if runs:
+                        logging.info("Cycle %s: new dbt runs %s", cycle, [run["run_id"] for run in runs])
+                model_count = len(models)
+                results = await sync_sites(site_clients, index, table_names) if models else {}
+                log_site_results(results)
+                if all(not result.get("error") and not result.get("failure") for result in results.values()):
+                    merge_index = index
+                    last_run_ids.update(synced_run_ids)
+            except Exception as e:
+                # A failed cycle is retried by the next one instead of stopping the daemon
+                logging.exception("Cycle %s failed: %s", cycle, str(e))
+            logging.info(
+                "Cycle %s took %.1fs and %s requests, synced %s dbt models",
+                cycle, time.perf_counter() - start,
+                sum(registry.request_count() for registry in registries) - requests_before, model_count
+            )
+            if METRICS_PATH:
+                REGISTRY.write(METRICS_PATH)
+            try:
+                await asyncio.wait_for(stopping.wait(), DAEMON_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        logging.info("Stopping daemon after %s cycles", cycle)
+        for clients in site_clients:
+            clients.close()
+        dbt_session.close()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.listen:
+        asyncio.run(listen(args))
+    elif args.daemon:
+        asyncio.run(daemon(args))
+    else:
+        asyncio.run(main(args))
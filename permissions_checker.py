@@ -4,19 +4,21 @@ import logging
 import xml.etree.ElementTree as ET
 from typing import Dict
 from dotenv import load_dotenv
-from dbt_tableau.tableau import authenticate_tableau
+from dbt_tableau.tableau import tableauClient
 
 def check_user_role_and_permissions(
     tableau_server: str,
     site_id: str,
     token: str,
-    api_version: str = "3.17"
+    api_version: str = "3.17",
+    session: requests.Session = None
 ) -> Dict:
     """
     Checks the current user's role and permissions using the users/current endpoint.
     """
     logger = logging.getLogger(__name__)
     tableau_server = tableau_server.rstrip('/')
+    http = session if session is not None else requests
     
     try:
         headers = {
@@ -28,7 +30,7 @@ def check_user_role_and_permissions(
         user_url = f"{tableau_server}/api/{api_version}/sites/{site_id}/users/current"
         logger.info(f"Checking user info at: {user_url}")
         
-        response = requests.get(user_url, headers=headers)
+        response = http.get(user_url, headers=headers)
         response.raise_for_status()
         
         # Log full response for debugging
@@ -69,13 +71,15 @@ def check_metadata_api_access(
     tableau_server: str,
     site_id: str,
     token: str,
-    api_version: str = "3.17"
+    api_version: str = "3.17",
+    session: requests.Session = None
 ) -> Dict:
     """
     Checks access to metadata API endpoints.
     """
     logger = logging.getLogger(__name__)
     tableau_server = tableau_server.rstrip('/')
+    http = session if session is not None else requests
     results = {}
     
     try:
@@ -94,7 +98,7 @@ def check_metadata_api_access(
         for name, url in endpoints.items():
             try:
                 logger.info(f"Checking {name} endpoint at: {url}")
-                response = requests.get(url, headers=headers)
+                response = http.get(url, headers=headers)
                 results[name] = {
                     'status_code': response.status_code,
                     'has_access': response.status_code == 200
@@ -112,13 +116,15 @@ def check_site_status(
     tableau_server: str,
     site_id: str,
     token: str,
-    api_version: str = "3.17"
+    api_version: str = "3.17",
+    session: requests.Session = None
 ) -> Dict:
     """
     Checks site status and settings.
     """
     logger = logging.getLogger(__name__)
     tableau_server = tableau_server.rstrip('/')
+    http = session if session is not None else requests
     
     try:
         headers = {
@@ -129,7 +135,7 @@ def check_site_status(
         site_url = f"{tableau_server}/api/{api_version}/sites/{site_id}"
         logger.info(f"Checking site status at: {site_url}")
         
-        response = requests.get(site_url, headers=headers)
+        response = http.get(site_url, headers=headers)
         response.raise_for_status()
         
         # Log full response for debugging
@@ -172,8 +178,17 @@ def check_all_permissions():
         print("Error: Missing required environment variables")
         return
     
+    # All checks reuse the client's pooled session and its keep-alive connections, and
+    # the session token cached by the sync so that checking does not end its session
+    tableau_client = tableauClient(
+        tableau_server,
+        tableau_site,
+        tableau_pat_name,
+        tableau_pat,
+        token_cache_path=os.getenv("TABLEAU_TOKEN_CACHE_PATH")
+    )
     try:
-        auth = authenticate_tableau(tableau_server, tableau_site, tableau_pat_name, tableau_pat)
+        auth = tableau_client.authenticate()
     except Exception as e:
         print(f"Error authenticating: {str(e)}")
         return
@@ -183,17 +198,20 @@ def check_all_permissions():
         'user_info': check_user_role_and_permissions(
             tableau_server, 
             auth['site']['id'], 
-            auth['token']
+            auth['token'],
+            session=tableau_client.session
         ),
         'metadata_access': check_metadata_api_access(
             tableau_server, 
             auth['site']['id'], 
-            auth['token']
+            auth['token'],
+            session=tableau_client.session
         ),
         'site_status': check_site_status(
             tableau_server, 
             auth['site']['id'], 
-            auth['token']
+            auth['token'],
+            session=tableau_client.session
         )
     }
     
@@ -0,0 +1,85 @@
+"""
+Runs a sync sharded across N worker processes on this machine.
+
+Each worker runs the sync script with --shard i/N and publishes only the tables
+whose luid hashes to its shard. Once every worker succeeded, the exposures of
+the legacy dbt_tabcatalog.py script are generated once by its reduce step
+(--reduce-exposures N) from the workbook files the shards wrote. The reduce step
+gets the same script arguments as the workers and reads the same settings, so in
+plan mode (TABLEAU_SYNC_MODE: plan) it adds the exposure commit to a plan instead
+of committing the exposures.
+
+Usage:
+    python run_shards.py --shards 4
+    python run_shards.py --shards 4 --script main.py -- --incremental
+"""
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import time
+
+LEGACY_SCRIPT="dbt_tabcatalog.py"
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run a Tableau sync sharded across local worker processes.")
+    parser.add_argument("--shards", type=int, required=True, help="number of worker processes")
+    parser.add_argument("--script", default=LEGACY_SCRIPT, help=f"sync script to run (default: {LEGACY_SCRIPT})")
+    parser.add_argument("--log-dir", default="shard_logs", help="directory of the worker logs")
+    parser.add_argument("--skip-reduce", action="store_true", help="do not generate exposures after the shards finished")
+    parser.add_argument("script_args", nargs="*", help="arguments passed to every worker, after --")
+    args = parser.parse_args()
+    if args.shards < 1:
+        parser.error("--shards must be at least 1")
+    return args
+
+def run_shards(script: str, shard_count: int, script_args: list, log_dir: str) -> list:
+    """
+    Starts one worker per shard and waits for all of them.
+    Returns the exit code of each shard.
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    workers = []
+    for index in range(shard_count):
+        log_path = os.path.join(log_dir, f"shard-{index}-of-{shard_count}.log")
+        log_file = open(log_path, "w")
+        process = subprocess.Popen(
+            [sys.executable, script, "--shard", f"{index}/{shard_count}"] + script_args,
+            stdout=log_file,
+            stderr=subprocess.STDOUT
+        )
+        workers.append((index, process, log_file, log_path))
+        logger.info("Started shard %s/%s (pid %s), logging to %s", index, shard_count, process.pid, log_path)
+
+    exit_codes = []
+    for index, process, log_file, log_path in workers:
+        exit_codes.append(process.wait())
+        log_file.close()
+        if exit_codes[-1] != 0:
+            logger.error("Shard %s/%s failed with exit code %s, see %s", index, shard_count, exit_codes[-1], log_path)
+    return exit_codes
+
+def main():
+    args = parse_args()
+    start = time.perf_counter()
+    exit_codes = run_shards(args.script, args.shards, args.script_args, args.log_dir)
+    failed = [index for index, exit_code in enumerate(exit_codes) if exit_code != 0]
+    logger.info(
+        "%s of %s shards finished in %.1fs", args.shards - len(failed), args.shards, time.perf_counter() - start
+    )
+    if failed:
+        # Exposures generated from a subset of the shards would drop the workbooks of the others
+        logger.error("Not generating exposures, shards %s failed", failed)
+        sys.exit(1)
+    if os.path.basename(args.script) == LEGACY_SCRIPT and not args.skip_reduce:
+        reduce = subprocess.run(
+            [sys.executable, args.script, "--reduce-exposures", str(args.shards)] + args.script_args
+        )
+        sys.exit(reduce.returncode)
+
+if __name__ == "__main__":
+    main()
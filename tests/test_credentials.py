@@ -0,0 +1,159 @@
+import json
+import os
+import stat
+
+import pytest
+import requests
+
+from dbt_tableau import credentials
+from dbt_tableau.credentials import credentialManager, parse_time_to_expiration, EXPIRY_MARGIN
+from dbt_tableau.http_session import pooledSession
+
+TABLE_URL="https://tableau.example.com/api/3.23/sites/site-id/tables/t1"
+
+class stubbedSignIn:
+    """
+    Returns credentials with a new token on every sign-in.
+    """
+    def __init__(self, time_to_expiration="002:00:00"):
+        self.time_to_expiration=time_to_expiration
+        self.count=0
+
+    def __call__(self):
+        self.count += 1
+        return {"token": f"token-{self.count}", "site": {"id": "site-id"}, "estimatedTimeToExpiration": self.time_to_expiration}
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(credentials.time, "time", lambda: now[0])
+    return now
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "token_cache.json")
+
+def test_parse_time_to_expiration():
+    assert parse_time_to_expiration("239:59:30") == 239 * 3600 + 59 * 60 + 30
+    assert parse_time_to_expiration(None) is None
+    assert parse_time_to_expiration("soon") is None
+
+@pytest.mark.skipif(os.name != "posix", reason="file modes are only checked on POSIX")
+def test_cache_file_is_only_readable_by_the_owner(cache_path, clock):
+    manager = credentialManager(stubbedSignIn(), "server|site|pat", cache_path)
+    manager.get_credentials()
+    assert stat.S_IMODE(os.stat(cache_path).st_mode) == 0o600
+    with open(cache_path) as cache_file:
+        assert json.load(cache_file)["server|site|pat"]["credentials"]["token"] == "token-1"
+
+def test_cached_token_is_reused_by_the_next_run(cache_path, clock):
+    credentialManager(stubbedSignIn(), "server|site|pat", cache_path).get_credentials()
+    sign_in = stubbedSignIn()
+    assert credentialManager(sign_in, "server|site|pat", cache_path).get_credentials()["token"] == "token-1"
+    assert sign_in.count == 0
+    # Another site or token does not get it
+    assert credentialManager(sign_in, "server|other|pat", cache_path).get_credentials()["token"] == "token-1"
+    assert sign_in.count == 1
+
+@pytest.mark.skipif(os.name != "posix", reason="file modes are only checked on POSIX")
+def test_cache_readable_by_others_is_ignored(cache_path, clock):
+    credentialManager(stubbedSignIn(), "server|site|pat", cache_path).get_credentials()
+    os.chmod(cache_path, 0o644)
+    sign_in = stubbedSignIn()
+    credentialManager(sign_in, "server|site|pat", cache_path).get_credentials()
+    assert sign_in.count == 1
+
+def test_expiring_token_is_renewed(cache_path, clock):
+    sign_in = stubbedSignIn(time_to_expiration="000:30:00")
+    manager = credentialManager(sign_in, "server|site|pat", cache_path)
+    assert manager.get_credentials()["token"] == "token-1"
+    clock[0] += 30 * 60 - EXPIRY_MARGIN - 1
+    assert manager.get_credentials()["token"] == "token-1"
+    clock[0] += 2
+    assert manager.get_credentials()["token"] == "token-2"
+    # The expired cache entry is not reused either
+    assert credentialManager(stubbedSignIn(), "server|site|pat", cache_path).get_credentials()["token"] == "token-2"
+
+def test_token_ttl_is_used_without_an_expiration(clock):
+    manager = credentialManager(stubbedSignIn(time_to_expiration=None), "key", None, token_ttl=600)
+    manager.get_credentials()
+    assert manager.expires_at == clock[0] + 600
+
+def test_refresh_signs_in_once_for_concurrent_401s(clock):
+    sign_in = stubbedSignIn()
+    manager = credentialManager(sign_in, "key", None)
+    tableau_creds = manager.get_credentials()
+    assert manager.refresh("token-1") == "token-2"
+    # A thread that sent the old token before the renewal gets the new one without a sign-in
+    assert manager.refresh("token-1") == "token-2"
+    assert manager.refresh("someone-elses-token") is None
+    assert sign_in.count == 2
+    # The dict handed out earlier is updated in place
+    assert tableau_creds["token"] == "token-2"
+
+def test_invalidate_drops_the_cached_token(cache_path, clock):
+    manager = credentialManager(stubbedSignIn(), "server|site|pat", cache_path)
+    manager.get_credentials()
+    manager.invalidate()
+    with open(cache_path) as cache_file:
+        assert json.load(cache_file) == {}
+
+def response(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = b""
+    response._content_consumed = True
+    return response
+
+class stubbedTableau:
+    """
+    Answers 401 to requests sent with a rejected token and 200 otherwise.
+    """
+    def __init__(self, rejected_tokens):
+        self.rejected_tokens=set(rejected_tokens)
+        self.tokens=[]
+
+    def __call__(self, method, url, **kwargs):
+        token = kwargs["headers"]["X-Tableau-Auth"]
+        self.tokens.append(token)
+        return response(401 if token in self.rejected_tokens else 200)
+
+@pytest.fixture
+def tableau_session(monkeypatch):
+    def session_with(manager, tableau):
+        # pooledSession sends its requests with requests.Session.request
+        monkeypatch.setattr(requests.Session, "request", tableau)
+        session = pooledSession()
+        session.credential_manager = manager
+        return session
+    return session_with
+
+def test_session_signs_in_again_once_on_401(clock, tableau_session):
+    sign_in = stubbedSignIn()
+    manager = credentialManager(sign_in, "key", None)
+    tableau_creds = manager.get_credentials()
+    tableau = stubbedTableau(["token-1"])
+    result = tableau_session(manager, tableau).request("PUT", TABLE_URL, headers={"X-Tableau-Auth": tableau_creds["token"]})
+    assert result.status_code == 200
+    assert tableau.tokens == ["token-1", "token-2"]
+    assert sign_in.count == 2
+
+def test_session_does_not_loop_on_401(clock, tableau_session):
+    sign_in = stubbedSignIn()
+    manager = credentialManager(sign_in, "key", None)
+    tableau_creds = manager.get_credentials()
+    # The renewed token is rejected too, e.g. the PAT was revoked
+    tableau = stubbedTableau(["token-1", "token-2", "token-3"])
+    result = tableau_session(manager, tableau).request("PUT", TABLE_URL, headers={"X-Tableau-Auth": tableau_creds["token"]})
+    assert result.status_code == 401
+    assert tableau.tokens == ["token-1", "token-2"]
+    assert sign_in.count == 2
+
+def test_session_without_tableau_token_is_not_renewed(clock, tableau_session):
+    sign_in = stubbedSignIn()
+    manager = credentialManager(sign_in, "key", None)
+    manager.get_credentials()
+    tableau = stubbedTableau(["dbt-token"])
+    result = tableau_session(manager, tableau).request("GET", TABLE_URL, headers={"X-Tableau-Auth": "dbt-token"})
+    assert result.status_code == 401
+    assert sign_in.count == 1
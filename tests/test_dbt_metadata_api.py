@@ -0,0 +1,148 @@
+import pytest
+import requests
+
+from dbt_tableau import dbt_metadata_api, retry
+from dbt_tableau.dbt_metadata_api import (
+    filter_models_since_watermarks,
+    iter_applied_models,
+    latest_models,
+    get_completed_runs,
+    get_models_for_job,
+    get_applied_models_page
+)
+from dbt_tableau.http_session import pooledSession
+from dbt_tableau.retry import retryPolicy
+
+def model(unique_id, completed_at, run_id, job_id=12, environment_id=3):
+    return {
+        "uniqueId": unique_id,
+        "jobId": job_id,
+        "environmentId": environment_id,
+        "runId": run_id,
+        "executeCompletedAt": completed_at
+    }
+
+def test_models_without_a_watermark_are_all_changed():
+    models = [model("model.shop.orders", "2024-05-01T10:00:00Z", 100), model("model.shop.customers", None, 100)]
+    changed, watermarks = filter_models_since_watermarks(models, {})
+    assert changed == models
+    assert watermarks == {("12", "3"): {"executeCompletedAt": "2024-05-01T10:00:00Z", "runId": 100}}
+
+def test_models_executed_after_the_watermark_are_changed():
+    watermarks = {("12", "3"): {"executeCompletedAt": "2024-05-01T10:00:00.000Z", "runId": 100}}
+    models = [
+        model("model.shop.orders", "2024-05-02T10:00:00Z", 101),
+        # Built by the watermarked run, or skipped by the newer one
+        model("model.shop.customers", "2024-05-01T10:00:00Z", 100),
+        model("model.shop.payments", "2024-04-30T10:00:00Z", 99),
+        # Another job has no watermark yet
+        model("model.shop.refunds", "2024-04-30T10:00:00Z", 50, job_id=13)
+    ]
+    changed, new_watermarks = filter_models_since_watermarks(models, watermarks)
+    assert [changed_model["uniqueId"] for changed_model in changed] == ["model.shop.orders", "model.shop.refunds"]
+    assert new_watermarks == {
+        ("12", "3"): {"executeCompletedAt": "2024-05-02T10:00:00Z", "runId": 101},
+        ("13", "3"): {"executeCompletedAt": "2024-04-30T10:00:00Z", "runId": 50}
+    }
+
+def test_iter_applied_models_pages_every_partition(monkeypatch):
+    pages = {
+        "marts": [([{"uniqueId": "a"}], {"hasNextPage": True, "endCursor": "1"}), ([{"uniqueId": "b"}], {"hasNextPage": False, "endCursor": "2"})],
+        "staging": [([{"uniqueId": "c"}], {"hasNextPage": False, "endCursor": "1"})]
+    }
+    cursors = []
+
+    def get_page(discovery_api_url, api_key, environment_id, first, after, model_filter, *args):
+        cursors.append((model_filter["schema"], after))
+        return pages[model_filter["schema"]].pop(0)
+
+    monkeypatch.setattr(dbt_metadata_api, "get_applied_models_page", get_page)
+    partitions = [{"schema": "marts"}, {"schema": "staging"}]
+    models = iter_applied_models("url", "key", 3, page_size=1, partitions=partitions)
+    assert sorted(model["uniqueId"] for model in models) == ["a", "b", "c"]
+    # The cursor of a partition's page is the end cursor of its previous page
+    assert [after for schema, after in cursors if schema == "marts"] == [None, "1"]
+    assert [after for schema, after in cursors if schema == "staging"] == [None]
+
+def test_iter_applied_models_raises_a_failed_page(monkeypatch):
+    def get_page(*args):
+        raise ConnectionError("dbt Cloud unavailable")
+
+    monkeypatch.setattr(dbt_metadata_api, "get_applied_models_page", get_page)
+    with pytest.raises(ConnectionError):
+        list(iter_applied_models("url", "key", 3))
+
+def test_latest_models_keeps_the_latest_run_of_each_model():
+    hourly = model("model.shop.orders", "2024-05-02T10:00:00Z", 101, job_id=12)
+    nightly = model("model.shop.orders", "2024-05-02T02:00:00Z", 90, job_id=13)
+    never_run = model("model.shop.orders", None, None, job_id=14)
+    assert latest_models([nightly, never_run, hourly]) == [hourly]
+    assert latest_models([never_run, nightly]) == [nightly]
+
+def test_latest_models_keeps_each_environment():
+    production = model("model.shop.orders", "2024-05-02T10:00:00Z", 101, environment_id=3)
+    staging = model("model.shop.orders", "2024-05-01T10:00:00Z", 80, environment_id=4)
+    assert latest_models([production, staging]) == [production, staging]
+
+class stubbedRunsApi:
+    """
+    Answers the runs endpoint with the pages of runs, newest first, as the dbt Cloud API orders them.
+    """
+    def __init__(self, run_ids, incomplete_run_ids=()):
+        self.runs=[{"id": run_id, "is_complete": run_id not in incomplete_run_ids} for run_id in sorted(run_ids, reverse=True)]
+        self.offsets=[]
+
+    def __call__(self, session, url, params, **kwargs):
+        offset = params.get("offset", 0)
+        self.offsets.append(offset)
+        page = self.runs[offset:offset + params["limit"]]
+        return stubbedResponse({"data": page})
+
+class stubbedResponse:
+    """
+    Response with a JSON body.
+    """
+    def __init__(self, body):
+        self.body=body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.body
+
+def test_completed_runs_newer_than_the_last_synced_run(monkeypatch):
+    runs_api = stubbedRunsApi(range(1, 11), incomplete_run_ids=[10])
+    monkeypatch.setattr(dbt_metadata_api, "_get", runs_api)
+    runs = get_completed_runs("https://cloud.getdbt.com", "key", 1, 12, after_run_id=6)
+    assert [run["id"] for run in runs] == [7, 8, 9]
+
+def test_completed_runs_are_paged_back_to_the_last_synced_run(monkeypatch):
+    runs_api = stubbedRunsApi(range(1, 251))
+    monkeypatch.setattr(dbt_metadata_api, "_get", runs_api)
+    runs = get_completed_runs("https://cloud.getdbt.com", "key", 1, 12, after_run_id=20, limit=100)
+    assert [run["id"] for run in runs] == list(range(21, 251))
+    assert runs_api.offsets == [0, 100, 200]
+    # Without a last synced run only the latest page is read
+    runs_api.offsets.clear()
+    assert len(get_completed_runs("https://cloud.getdbt.com", "key", 1, 12, limit=100)) == 100
+    assert runs_api.offsets == [0]
+
+def test_timed_out_job_models_are_not_requested_again(monkeypatch):
+    monkeypatch.setattr(retry.time, "sleep", lambda seconds: None)
+    attempts = []
+
+    def send_once(method, url, **kwargs):
+        attempts.append(kwargs["timeout"])
+        raise requests.exceptions.ReadTimeout("slow")
+
+    session = pooledSession(retry_policy=retryPolicy(max_retries=5))
+    session._send_once = send_once
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        get_models_for_job("https://metadata.cloud.getdbt.com/graphql", "key", 12, session)
+    assert attempts == [3600]
+    # A timed out page is retried by the session only, not by the loader as well
+    attempts.clear()
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        get_applied_models_page("https://metadata.cloud.getdbt.com/graphql", "key", 3, 500, session=session)
+    assert len(attempts) == 6
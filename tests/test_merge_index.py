@@ -0,0 +1,82 @@
+import pytest
+
+from dbt_tableau.merge_index import mergeIndex, normalize_account, normalize_identifier, split_qualified_name
+
+def model(unique_id, database="ANALYTICS", schema="MARTS", name="orders", alias=None):
+    return {"uniqueId": unique_id, "database": database, "schema": schema, "name": name, "alias": alias}
+
+@pytest.mark.parametrize("host, account", [
+    ("xy12345.snowflakecomputing.com", "xy12345"),
+    ("https://XY12345.eu-west-1.snowflakecomputing.com:443", "xy12345.eu-west-1"),
+    ("xy12345.eu-west-1.privatelink.snowflakecomputing.com", "xy12345.eu-west-1"),
+    ("xy12345.privatelink.snowflakecomputing.com", "xy12345"),
+    ("warehouse.internal", "warehouse.internal"),
+    ("", None),
+])
+def test_normalize_account_strips_host_suffixes(host, account):
+    assert normalize_account(host) == account
+
+def test_normalize_identifier():
+    assert normalize_identifier(' "Orders" ') == "orders"
+    assert normalize_identifier("[Orders]") == "orders"
+    assert normalize_identifier(None) is None
+
+def test_split_qualified_name_keeps_quoted_dots():
+    assert split_qualified_name('[ANALYTICS].[MARTS].[ORDERS]') == ["analytics", "marts", "orders"]
+    assert split_qualified_name('"analytics"."my.schema".orders') == ["analytics", "my.schema", "orders"]
+
+def test_privatelink_host_matches_the_account():
+    orders = model("model.shop.orders")
+    index = mergeIndex([orders], account="xy12345.eu-west-1")
+    table = {"name": "ORDERS", "fullName": "[ANALYTICS].[MARTS].[ORDERS]"}
+    assert index.match_table(table, host="xy12345.eu-west-1.privatelink.snowflakecomputing.com") is orders
+    assert index.match_table(table, host="xy12345.eu-west-1.snowflakecomputing.com") is orders
+    assert index.match_table(table, host="other.snowflakecomputing.com") is None
+
+def test_host_matches_a_shorter_account():
+    orders = model("model.shop.orders")
+    index = mergeIndex([orders], account="xy12345")
+    table = {"name": "ORDERS", "fullName": "ANALYTICS.MARTS.ORDERS"}
+    assert index.match_table(table, host="xy12345.eu-west-1.snowflakecomputing.com") is orders
+
+def test_model_without_account_matches_any_host():
+    orders = model("model.shop.orders")
+    index = mergeIndex([orders])
+    assert index.match("analytics", "marts", "orders", host="xy12345.snowflakecomputing.com") is orders
+
+def test_alias_is_matched_instead_of_the_name():
+    orders = model("model.shop.orders", name="fct_orders", alias="orders")
+    index = mergeIndex([orders])
+    assert index.match("ANALYTICS", "MARTS", "ORDERS") is orders
+    assert index.match("ANALYTICS", "MARTS", "FCT_ORDERS") is None
+
+def test_ambiguous_schema_match_returns_none():
+    index = mergeIndex([model("model.a.orders", database="A"), model("model.b.orders", database="B")])
+    assert index.match(None, "marts", "orders") is None
+    assert index.match("a", "marts", "orders")["uniqueId"] == "model.a.orders"
+
+def test_database_is_taken_from_the_listing():
+    orders = model("model.shop.orders")
+    index = mergeIndex([orders])
+    assert index.match_table({"name": "ORDERS", "schema": "MARTS"}, database_name="ANALYTICS") is orders
+
+def test_copy_leaves_the_index_unchanged():
+    orders = model("model.shop.orders")
+    index = mergeIndex([orders])
+    copy = index.copy()
+    customers = model("model.shop.customers", name="customers")
+    copy.add_models([customers, model("model.other.orders")], account="xy12345")
+    assert len(index) == 1
+    assert index.match("analytics", "marts", "customers") is None
+    assert index.match("analytics", "marts", "orders") is orders
+    assert copy.match("analytics", "marts", "customers") is customers
+
+def test_merge_tables_yields_matched_tables_only():
+    index = mergeIndex([model("model.shop.orders", name="orders")])
+    tables = [
+        {"name": "ORDERS", "fullName": "ANALYTICS.MARTS.ORDERS", "luid": "t1"},
+        {"name": "CUSTOMERS", "fullName": "ANALYTICS.MARTS.CUSTOMERS", "luid": "t2"},
+    ]
+    merged_tables = list(index.merge_tables(tables))
+    assert [merged_table["luid"] for merged_table in merged_tables] == ["t1"]
+    assert merged_tables[0]["uniqueId"] == "model.shop.orders"
@@ -0,0 +1,84 @@
+import json
+import os
+
+import pytest
+
+from dbt_tableau.metrics import metricsRegistry, endpoint_family
+
+TABLEAU="https://tableau.example.com/api/3.23/sites/site-id"
+BUCKETS=(0.1, 1.0, 10.0)
+
+@pytest.mark.parametrize("method, url, family", [
+    ("POST", "https://tableau.example.com/api/3.23/auth/signin", "signin"),
+    ("POST", "https://tableau.example.com/api/metadata/graphql", "metadata_graphql"),
+    ("POST", "https://metadata.cloud.getdbt.com/graphql/", "dbt_graphql"),
+    ("POST", f"{TABLEAU}/dataQualityWarnings/table/t1", "data_quality_warning"),
+    ("PUT", f"{TABLEAU}/tables/t1/tags", "tags"),
+    ("PUT", f"{TABLEAU}/tables/t1/columns/c1", "column_update"),
+    ("PUT", f"{TABLEAU}/tables/t1", "table_update"),
+    ("GET", "https://api.github.com/repos/org/dbt/contents/models/exposures.yml", "github"),
+    ("GET", "https://cloud.getdbt.com/api/v2/accounts/1/runs/", "dbt_cloud"),
+    ("GET", "https://example.com/health", "other")
+])
+def test_endpoint_family(method, url, family):
+    assert endpoint_family(method, url) == family
+
+def registry():
+    metrics = metricsRegistry(BUCKETS)
+    metrics.observe_request("table_update", 0.05, 200, request_bytes=100, response_bytes=300)
+    metrics.observe_request("table_update", 0.5, 429)
+    metrics.observe_request("table_update", 5.0, None, error="ReadTimeout")
+    metrics.record_retry("table_update")
+    return metrics
+
+def test_quantiles_are_bucket_bounds():
+    endpoint = registry().to_dict()["endpoints"]["table_update"]
+    assert endpoint["latency_seconds"]["p50"] == 1.0
+    assert endpoint["latency_seconds"]["p99"] == 10.0
+    assert endpoint["requests"] == {"2xx": 1, "4xx": 1, "none": 1}
+    assert endpoint["errors"] == {"429": 1, "ReadTimeout": 1}
+    assert metricsRegistry(BUCKETS).to_dict()["endpoints"] == {}
+
+def test_prometheus_exposition_format():
+    lines = registry().to_prometheus().splitlines()
+    assert "# TYPE dbt_tableau_request_duration_seconds histogram" in lines
+    assert [line for line in lines if line.startswith("dbt_tableau_request_duration_seconds")] == [
+        'dbt_tableau_request_duration_seconds_bucket{endpoint="table_update",le="0.1"} 1',
+        'dbt_tableau_request_duration_seconds_bucket{endpoint="table_update",le="1.0"} 2',
+        'dbt_tableau_request_duration_seconds_bucket{endpoint="table_update",le="10.0"} 3',
+        'dbt_tableau_request_duration_seconds_bucket{endpoint="table_update",le="+Inf"} 3',
+        'dbt_tableau_request_duration_seconds_sum{endpoint="table_update"} 5.550000',
+        'dbt_tableau_request_duration_seconds_count{endpoint="table_update"} 3'
+    ]
+    assert 'dbt_tableau_requests_total{endpoint="table_update",status="4xx"} 1' in lines
+    assert 'dbt_tableau_request_errors_total{endpoint="table_update",error="ReadTimeout"} 1' in lines
+    assert 'dbt_tableau_request_retries_total{endpoint="table_update"} 1' in lines
+    assert 'dbt_tableau_request_bytes_total{endpoint="table_update"} 100' in lines
+    # Every sample follows the HELP and TYPE lines of its metric
+    metric_names = [line.split()[2] for line in lines if line.startswith("# TYPE")]
+    assert len(metric_names) == len(set(metric_names)) == 7
+
+def test_write_replaces_the_file_atomically(tmp_path):
+    prometheus_path = str(tmp_path / "requests.prom")
+    json_path = str(tmp_path / "requests.json")
+    metrics = registry()
+    metrics.write(prometheus_path)
+    metrics.write(json_path)
+    with open(prometheus_path) as metrics_file:
+        assert metrics_file.read() == metrics.to_prometheus()
+    with open(json_path) as metrics_file:
+        assert json.load(metrics_file)["endpoints"]["table_update"]["retries"] == 1
+    # No temporary file is left behind
+    assert sorted(os.listdir(tmp_path)) == ["requests.json", "requests.prom"]
+
+def test_child_registries_are_exported_under_their_labels():
+    metrics = metricsRegistry(BUCKETS)
+    metrics.observe_request("dbt_graphql", 0.05, 200)
+    site_metrics = metrics.child({"site": "finance"})
+    site_metrics.observe_request("table_update", 0.05, 200)
+    lines = metrics.to_prometheus().splitlines()
+    assert 'dbt_tableau_requests_total{endpoint="dbt_graphql",status="2xx"} 1' in lines
+    assert 'dbt_tableau_requests_total{site="finance",endpoint="table_update",status="2xx"} 1' in lines
+    # The requests of a site are not counted by its parent
+    assert metrics.request_count() == 1
+    assert metrics.to_dict()["children"][0]["labels"] == {"site": "finance"}
@@ -0,0 +1,61 @@
+import pytest
+
+from dbt_tableau.multi_site import load_site_configs, site_path
+
+SERVER="https://tableau.example.com"
+
+def test_single_site_of_the_unprefixed_settings():
+    environ = {"TABLEAU_SERVER": SERVER, "TABLEAU_SITE": "prod", "TABLEAU_PAT_NAME": "sync", "TABLEAU_PAT": "secret"}
+    sites = load_site_configs(environ)
+    assert [(site.name, site.label, site.site_name, site.databases) for site in sites] == [
+        (None, "prod", "prod", ["PRODUCTION"])
+    ]
+    assert site_path("state.db", sites[0]) == "state.db"
+
+def test_sites_fall_back_to_the_shared_settings():
+    environ = {
+        "TABLEAU_SITES": "finance, eu",
+        "TABLEAU_SERVER": SERVER,
+        "TABLEAU_DATABASES": "ANALYTICS",
+        "TABLEAU_FINANCE_SITE": "finance",
+        "TABLEAU_FINANCE_PAT_NAME": "finance-sync",
+        "TABLEAU_FINANCE_PAT": "secret",
+        "TABLEAU_EU_SERVER": "https://eu.tableau.example.com",
+        "TABLEAU_EU_SITE": "eu",
+        "TABLEAU_EU_PAT_NAME": "eu-sync",
+        "TABLEAU_EU_PAT": "secret",
+        "TABLEAU_EU_DATABASES": "ANALYTICS_EU, RAW_EU",
+        "TABLEAU_EU_MAX_CONCURRENCY": "4"
+    }
+    finance, eu = load_site_configs(environ)
+    assert (finance.server_url, finance.databases) == (SERVER, ["ANALYTICS"])
+    assert (eu.server_url, eu.databases, eu.max_concurrency) == ("https://eu.tableau.example.com", ["ANALYTICS_EU", "RAW_EU"], 4)
+    assert site_path("state.db", finance) == "state.finance.db"
+    assert site_path(None, finance) is None
+
+def test_missing_site_settings_are_named():
+    environ = {"TABLEAU_SITES": "finance", "TABLEAU_SERVER": SERVER, "TABLEAU_FINANCE_PAT_NAME": "sync", "TABLEAU_FINANCE_PAT": "secret"}
+    with pytest.raises(ValueError, match="TABLEAU_FINANCE_SITE"):
+        load_site_configs(environ)
+
+def test_sites_do_not_share_a_pat():
+    environ = {
+        "TABLEAU_SITES": "finance,eu",
+        "TABLEAU_SERVER": SERVER,
+        "TABLEAU_PAT_NAME": "sync",
+        "TABLEAU_PAT": "secret",
+        "TABLEAU_FINANCE_SITE": "finance",
+        "TABLEAU_EU_SITE": "eu"
+    }
+    # The unprefixed PAT is not used by the sites of TABLEAU_SITES
+    with pytest.raises(ValueError, match="TABLEAU_FINANCE_PAT_NAME"):
+        load_site_configs(environ)
+    environ.update({
+        "TABLEAU_FINANCE_PAT_NAME": "sync", "TABLEAU_FINANCE_PAT": "secret",
+        "TABLEAU_EU_PAT_NAME": "sync", "TABLEAU_EU_PAT": "secret"
+    })
+    with pytest.raises(ValueError, match="same PAT"):
+        load_site_configs(environ)
+    # The same PAT name on another server is another token
+    environ["TABLEAU_EU_SERVER"] = "https://eu.tableau.example.com"
+    assert len(load_site_configs(environ)) == 2
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from dbt_tableau.merge_index import mergeIndex
+from dbt_tableau.pipeline import syncPipeline
+from dbt_tableau.run_journal import runJournal, JOURNAL_TABLE_DESCRIPTION, JOURNAL_COLUMN_DESCRIPTIONS
+from dbt_tableau.tableau import tableauClient, PUBLISH_UPDATED, PUBLISH_FAILED
+
+TABLE_COUNT=100
+
+class fakeAsyncClient:
+    """
+    Stands in for asyncTableauClient: columns and publishes are answered right
+    away, and fail_on names the call that raises.
+    """
+    def __init__(self, fail_on=None, table_status=PUBLISH_UPDATED):
+        self.tableau_client=tableauClient.__new__(tableauClient)
+        self.fail_on=fail_on
+        self.table_status=table_status
+        self.column_batches=[]
+        self.published=[]
+
+    async def get_columns_for_tables(self, tables, tableau_creds):
+        if self.fail_on == "columns":
+            raise RuntimeError("column fetch failed")
+        self.column_batches.append([table["luid"] for table in tables])
+        return {table["luid"]: [{"name": "ID"}] for table in tables}
+
+    async def publish_column_descriptions(self, merged_table, tableau_columns, tableau_creds):
+        if self.fail_on == "publish":
+            raise RuntimeError("publish failed")
+        return (len(tableau_columns), 0, 0)
+
+    async def publish_table_description(self, merged_table, description, tableau_creds):
+        self.published.append(merged_table["luid"])
+        return self.table_status
+
+def models():
+    return mergeIndex([
+        {"uniqueId": f"model.shop.t{index}", "database": "ANALYTICS", "schema": "MARTS", "name": f"t{index}",
+         "description": f"Table {index}"}
+        for index in range(TABLE_COUNT)
+    ])
+
+def tables():
+    for index in range(TABLE_COUNT):
+        yield {"name": f"T{index}", "fullName": f"ANALYTICS.MARTS.T{index}", "luid": f"luid-{index}"}
+
+def run_pipeline(pipeline, tableau_tables=tables):
+    # A pipeline stuck on a full queue would hang the test instead of failing it
+    return asyncio.run(asyncio.wait_for(pipeline.run(tableau_tables), timeout=30))
+
+def test_pipeline_publishes_every_merged_table():
+    client = fakeAsyncClient()
+    pipeline = syncPipeline(client, models(), {}, merged_queue_size=4, publish_queue_size=4, column_batch_size=10)
+    assert run_pipeline(pipeline) == (2 * TABLE_COUNT, 0, 0)
+    assert sorted(client.published) == sorted(f"luid-{index}" for index in range(TABLE_COUNT))
+    assert all(len(batch) <= 10 for batch in client.column_batches)
+
+@pytest.mark.parametrize("fail_on", ["columns", "publish"])
+def test_failed_stage_stops_the_pipeline(fail_on):
+    client = fakeAsyncClient(fail_on=fail_on)
+    pipeline = syncPipeline(client, models(), {}, merged_queue_size=2, publish_queue_size=2)
+    with pytest.raises(RuntimeError):
+        run_pipeline(pipeline)
+    # The merge worker blocked on the full queue gives up instead of merging every
+    # table (asyncio.run waits for it to return)
+    assert pipeline._stop.is_set()
+    assert pipeline.merged_count < TABLE_COUNT
+
+def test_failed_table_fetch_stops_the_pipeline():
+    def failing_tables():
+        yield from list(tables())[:5]
+        raise ConnectionError("metadata API unavailable")
+
+    client = fakeAsyncClient()
+    pipeline = syncPipeline(client, models(), {}, merged_queue_size=2, publish_queue_size=2)
+    with pytest.raises(ConnectionError):
+        run_pipeline(pipeline, failing_tables)
+
+def test_resumed_run_skips_journaled_tables(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = runJournal(path, "site")
+    for index in range(10):
+        journal.record(f"luid-{index}", JOURNAL_TABLE_DESCRIPTION)
+        journal.record(f"luid-{index}", JOURNAL_COLUMN_DESCRIPTIONS)
+    journal.close()
+
+    journal = runJournal(path, "site", resume=True)
+    client = fakeAsyncClient()
+    pipeline = syncPipeline(client, models(), {}, journal=journal)
+    run_pipeline(pipeline)
+    journal.close()
+    assert pipeline.resumed_count == 10
+    assert len(client.published) == TABLE_COUNT - 10
+
+def test_failed_table_description_is_not_journaled(tmp_path):
+    journal = runJournal(str(tmp_path / "journal.jsonl"), "site")
+    client = fakeAsyncClient(table_status=PUBLISH_FAILED)
+    pipeline = syncPipeline(client, models(), {}, journal=journal)
+    assert run_pipeline(pipeline) == (TABLE_COUNT, TABLE_COUNT, 0)
+    assert not journal.is_done("luid-0", JOURNAL_TABLE_DESCRIPTION)
+    assert journal.is_done("luid-0", JOURNAL_COLUMN_DESCRIPTIONS)
+    journal.close()
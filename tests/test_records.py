@@ -0,0 +1,75 @@
+from collections.abc import MutableMapping
+
+import pytest
+
+from dbt_tableau.records import columnRecord, mergedTableRecord, modelRecord, tableRecord
+
+def test_record_reads_like_a_dict():
+    record = tableRecord({"name": "ORDERS", "schema": "MARTS", "luid": "t1"})
+    assert record["name"] == "ORDERS"
+    assert record.get("databaseName") is None
+    assert record.get("databaseName", "ANALYTICS") == "ANALYTICS"
+    assert "luid" in record
+    assert "fullName" not in record
+    assert len(record) == 3
+    assert dict(record) == {"name": "ORDERS", "schema": "MARTS", "luid": "t1"}
+    assert record == {"name": "ORDERS", "schema": "MARTS", "luid": "t1"}
+    assert isinstance(record, MutableMapping)
+
+def test_missing_field_raises_key_error():
+    record = tableRecord({"name": "ORDERS"})
+    with pytest.raises(KeyError):
+        record["schema"]
+    with pytest.raises(KeyError):
+        del record["schema"]
+
+def test_fields_outside_the_slots_are_kept_in_extra():
+    record = columnRecord({"name": "ID"})
+    assert record._extra is None
+    record["dataType"] = "NUMBER"
+    assert record._extra == {"dataType": "NUMBER"}
+    assert record["dataType"] == "NUMBER"
+    assert list(record) == ["name", "dataType"]
+    del record["dataType"]
+    assert "dataType" not in record
+
+def test_pop():
+    record = columnRecord({"name": "ID", "description": "Order id", "dataType": "NUMBER"})
+    assert record.pop("description") == "Order id"
+    assert "description" not in record
+    assert record.pop("dataType") == "NUMBER"
+    assert record.pop("description", None) is None
+    with pytest.raises(KeyError):
+        record.pop("description")
+
+def test_pop_returns_falsy_defaults():
+    record = columnRecord({"name": "ID"})
+    assert record.pop("description", "") == ""
+    assert record.pop("luid", 0) == 0
+    assert record.pop("dataType", None) is None
+
+def test_model_columns_become_column_records():
+    model = modelRecord({"uniqueId": "model.shop.orders", "columns": [{"name": "ID"}, columnRecord(name="STATUS")]})
+    assert all(isinstance(column, columnRecord) for column in model["columns"])
+    assert [column["name"] for column in model["columns"]] == ["ID", "STATUS"]
+
+def test_copy_is_independent():
+    record = tableRecord({"name": "ORDERS", "owner": "finance"})
+    copy = record.copy()
+    copy["name"] = "CUSTOMERS"
+    assert record["name"] == "ORDERS"
+    assert copy["owner"] == "finance"
+
+def test_merged_table_reads_through_model_then_table():
+    table = tableRecord({"name": "ORDERS", "luid": "t1", "description": "Tableau description"})
+    model = modelRecord({"uniqueId": "model.shop.orders", "name": "orders", "description": "dbt description"})
+    merged_table = mergedTableRecord(table, model)
+    assert merged_table["luid"] == "t1"
+    assert merged_table["description"] == "dbt description"
+    assert merged_table["uniqueId"] == "model.shop.orders"
+    merged_table["description"] = "published"
+    assert merged_table["description"] == "published"
+    assert model["description"] == "dbt description"
+    assert list(merged_table) == ["name", "luid", "description", "uniqueId"]
+    with pytest.raises(TypeError):
+        del merged_table["luid"]
@@ -0,0 +1,142 @@
+import email.utils
+import time
+
+import pytest
+import requests
+
+from dbt_tableau import retry
+from dbt_tableau.retry import retryPolicy, adaptiveConcurrencyLimiter, parse_retry_after, send_with_retry
+
+TABLEAU_URL="https://tableau.example.com/api/3.23/sites/site-id/tables/t1"
+METADATA_URL="https://tableau.example.com/api/metadata/graphql"
+SIGNIN_URL="https://tableau.example.com/api/3.23/auth/signin"
+
+def response(status_code, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    response._content = b""
+    response._content_consumed = True
+    return response
+
+class stubbedSend:
+    """
+    Answers each attempt with the next response, or raises it if it is an exception.
+    """
+    def __init__(self, *outcomes):
+        self.outcomes=list(outcomes)
+        self.calls=[]
+
+    def __call__(self, method, url, **kwargs):
+        self.calls.append((method, url))
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    monkeypatch.setattr(retry.time, "sleep", slept.append)
+    return slept
+
+def test_parse_retry_after_seconds_and_dates():
+    assert parse_retry_after("120") == 120.0
+    assert parse_retry_after("-5") == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    in_a_minute = email.utils.formatdate(time.time() + 60, usegmt=True)
+    assert 55 <= parse_retry_after(in_a_minute) <= 60
+    assert parse_retry_after(email.utils.formatdate(time.time() - 60, usegmt=True)) == 0.0
+
+def test_idempotent_requests():
+    policy = retryPolicy()
+    assert policy.is_idempotent("get", TABLEAU_URL)
+    assert policy.is_idempotent("PUT", TABLEAU_URL)
+    assert policy.is_idempotent("POST", METADATA_URL)
+    assert policy.is_idempotent("POST", "https://metadata.cloud.getdbt.com/graphql/")
+    assert not policy.is_idempotent("POST", SIGNIN_URL)
+    assert not policy.is_idempotent("POST", "https://tableau.example.com/api/3.23/sites/s/dataQualityWarnings/table/t1")
+
+def test_only_idempotent_requests_are_retried_after_errors():
+    policy = retryPolicy(max_retries=2)
+    assert policy.should_retry_response("PUT", TABLEAU_URL, response(503), 0)
+    assert not policy.should_retry_response("POST", SIGNIN_URL, response(503), 0)
+    # A 429 was rejected before being processed, whatever the method
+    assert policy.should_retry_response("POST", SIGNIN_URL, response(429), 0)
+    assert not policy.should_retry_response("PUT", TABLEAU_URL, response(404), 0)
+    assert not policy.should_retry_response("PUT", TABLEAU_URL, response(503), 2)
+
+    read_timeout = requests.exceptions.ReadTimeout()
+    assert policy.should_retry_exception("PUT", TABLEAU_URL, read_timeout, 0)
+    assert not policy.should_retry_exception("POST", SIGNIN_URL, read_timeout, 0)
+    assert policy.should_retry_exception("POST", SIGNIN_URL, requests.exceptions.ConnectTimeout(), 0)
+    assert not policy.should_retry_exception("PUT", TABLEAU_URL, ValueError(), 0)
+
+def test_delay_honors_retry_after_up_to_the_cap():
+    policy = retryPolicy(backoff_base=0.5, max_retry_after=30)
+    assert 10 <= policy.delay(0, response(429, {"Retry-After": "10"})) <= 10.5
+    assert 30 <= policy.delay(0, response(429, {"Retry-After": "3600"})) <= 30.5
+    assert 0 <= policy.delay(3, response(503)) <= 4
+
+def test_send_with_retry_waits_for_retry_after(sleeps):
+    send = stubbedSend(response(429, {"Retry-After": "7"}), response(503), response(200))
+    retried = []
+    result = send_with_retry(send, "PUT", TABLEAU_URL, retryPolicy(backoff_base=0.1), on_retry=lambda: retried.append(1))
+    assert result.status_code == 200
+    assert len(send.calls) == 3
+    assert 7 <= sleeps[0] <= 7.1
+    assert len(retried) == 2
+
+def test_send_with_retry_returns_the_last_response(sleeps):
+    send = stubbedSend(response(503), response(503), response(503))
+    result = send_with_retry(send, "GET", TABLEAU_URL, retryPolicy(max_retries=2, backoff_base=0.1))
+    assert result.status_code == 503
+    assert len(send.calls) == 3
+
+def test_send_with_retry_raises_non_retryable_errors(sleeps):
+    send = stubbedSend(requests.exceptions.ReadTimeout("slow"))
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        send_with_retry(send, "POST", SIGNIN_URL, retryPolicy())
+    assert len(send.calls) == 1
+    assert sleeps == []
+
+def test_limiter_raises_the_limit_additively():
+    limiter = adaptiveConcurrencyLimiter(max_limit=10, initial_limit=4)
+    for _ in range(4):
+        limiter.acquire()
+    for _ in range(4):
+        limiter.release()
+    # Each success adds increase / limit, so a full round of requests adds about one
+    assert 4.9 < limiter.limit < 5.0
+    assert limiter.in_flight == 0
+
+def test_limiter_halves_the_limit_once_per_cooldown(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(retry.time, "monotonic", lambda: now[0])
+    limiter = adaptiveConcurrencyLimiter(max_limit=16, cooldown=1.0)
+    for _ in range(3):
+        limiter.acquire()
+    limiter.release(throttled=True)
+    limiter.release(throttled=True)
+    assert limiter.limit == 8
+    now[0] += 1.0
+    limiter.release(throttled=True)
+    assert limiter.limit == 4
+
+def test_limiter_stays_within_its_bounds():
+    limiter = adaptiveConcurrencyLimiter(max_limit=2, min_limit=1, cooldown=0)
+    for _ in range(5):
+        limiter.acquire()
+        limiter.release(throttled=True)
+    assert limiter.limit == 1
+    for _ in range(50):
+        limiter.acquire()
+        limiter.release()
+    assert limiter.limit == 2
+
+def test_read_timeouts_are_not_retried_when_turned_off():
+    policy = retryPolicy().without_read_timeout_retries()
+    assert not policy.should_retry_exception("POST", METADATA_URL, requests.exceptions.ReadTimeout(), 0)
+    assert policy.should_retry_exception("POST", METADATA_URL, requests.exceptions.ConnectTimeout(), 0)
+    assert retryPolicy().retry_read_timeouts
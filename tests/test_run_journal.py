@@ -0,0 +1,76 @@
+import json
+import os
+
+from dbt_tableau.run_journal import runJournal, dbt_runs_key, JOURNAL_TABLE_DESCRIPTION, JOURNAL_COLUMN_DESCRIPTIONS
+
+def test_resume_skips_completed_operations(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = runJournal(path, "site|runs:1")
+    journal.record("t1", JOURNAL_TABLE_DESCRIPTION)
+    journal.record("t2", JOURNAL_COLUMN_DESCRIPTIONS)
+    journal.close()
+
+    resumed = runJournal(path, "site|runs:1", resume=True)
+    assert resumed.resumed_count == 2
+    assert resumed.is_done("t1", JOURNAL_TABLE_DESCRIPTION)
+    assert resumed.is_done("t2", JOURNAL_COLUMN_DESCRIPTIONS)
+    assert not resumed.is_done("t1", JOURNAL_COLUMN_DESCRIPTIONS)
+    resumed.close()
+
+def test_journal_of_another_run_is_not_resumed(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = runJournal(path, "site|runs:1")
+    journal.record("t1", JOURNAL_TABLE_DESCRIPTION)
+    journal.close()
+
+    resumed = runJournal(path, "site|runs:2", resume=True)
+    assert resumed.resumed_count == 0
+    assert not resumed.is_done("t1", JOURNAL_TABLE_DESCRIPTION)
+    resumed.close()
+    with open(path) as journal_file:
+        assert json.loads(journal_file.readline())["run_key"] == "site|runs:2"
+
+def test_without_resume_the_journal_starts_over(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = runJournal(path, "site")
+    journal.record("t1", JOURNAL_TABLE_DESCRIPTION)
+    journal.close()
+
+    journal = runJournal(path, "site")
+    assert not journal.is_done("t1", JOURNAL_TABLE_DESCRIPTION)
+    journal.close()
+
+def test_truncated_last_line_is_skipped(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = runJournal(path, "site")
+    journal.record("t1", JOURNAL_TABLE_DESCRIPTION)
+    journal.close()
+    with open(path, "a") as journal_file:
+        journal_file.write('{"luid": "t2", "o')
+
+    resumed = runJournal(path, "site", resume=True)
+    assert resumed.completed == {("t1", JOURNAL_TABLE_DESCRIPTION)}
+    resumed.close()
+
+def test_completed_run_deletes_the_journal(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = runJournal(path, "site")
+    journal.record("t1", JOURNAL_TABLE_DESCRIPTION)
+    journal.close(completed=True)
+    assert not os.path.exists(path)
+
+def test_operations_are_flushed_in_batches(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = runJournal(path, "site", flush_every=2, flush_interval=3600)
+    journal.record("t1", JOURNAL_TABLE_DESCRIPTION)
+    with open(path) as journal_file:
+        assert len(journal_file.readlines()) == 1
+    journal.record("t2", JOURNAL_TABLE_DESCRIPTION)
+    with open(path) as journal_file:
+        assert len(journal_file.readlines()) == 3
+    journal.close()
+
+def test_dbt_runs_key_depends_on_the_runs_only():
+    models = [{"uniqueId": "a", "runId": 2}, {"uniqueId": "b", "runId": 1}, {"uniqueId": "c", "runId": 2}]
+    assert dbt_runs_key(models) == dbt_runs_key(list(reversed(models)))
+    assert dbt_runs_key(models) != dbt_runs_key(models + [{"uniqueId": "d", "runId": 3}])
@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from dbt_tableau.sharding import parse_shard, shard_of, shard_tables, shard_path
+
+LUIDS=[f"5f1c2a9e-0000-4000-8000-{index:012d}" for index in range(200)]
+
+def test_parse_shard():
+    assert parse_shard("0/4") == (0, 4)
+    assert parse_shard("3/4") == (3, 4)
+    for value in ("4/4", "-1/4", "0/0", "1", "a/b"):
+        with pytest.raises(ValueError):
+            parse_shard(value)
+
+def test_every_table_belongs_to_exactly_one_shard():
+    tables = [{"luid": luid} for luid in LUIDS]
+    shards = [list(shard_tables(tables, (index, 4))) for index in range(4)]
+    assert sorted(table["luid"] for shard in shards for table in shard) == sorted(LUIDS)
+    assert all(shard for shard in shards)
+    assert list(shard_tables(tables, None)) == tables
+
+def test_shard_assignment_is_stable_across_processes():
+    # hash() of a str differs between processes, the shard of a luid must not
+    script = (
+        "import sys; from dbt_tableau.sharding import shard_of; "
+        "print(','.join(str(shard_of(luid, 7)) for luid in sys.argv[1:]))"
+    )
+    shards = [
+        subprocess.run(
+            [sys.executable, "-c", script] + LUIDS[:20],
+            capture_output=True, text=True, check=True, env=dict(os.environ, PYTHONHASHSEED=seed),
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        ).stdout.strip()
+        for seed in ("1", "2")
+    ]
+    assert shards[0] == shards[1] == ",".join(str(shard_of(luid, 7)) for luid in LUIDS[:20])
+
+def test_shard_of_known_values():
+    # Changing the hash would move tables between shards and orphan their sync state
+    assert [shard_of(luid, 8) for luid in "abcdefgh"] == [7, 5, 3, 3, 7, 3, 4, 0]
+    assert all(0 <= shard_of(luid, 4) < 4 for luid in LUIDS)
+
+def test_shard_path():
+    assert shard_path("state.db", (1, 4)) == "state.shard-1-of-4.db"
+    assert shard_path("state.db", None) == "state.db"
@@ -0,0 +1,116 @@
+import json
+
+import pytest
+
+from dbt_tableau.sync_plan import (
+    syncPlan,
+    apply_plan,
+    PLAN_VERSION,
+    OP_TABLE_DESCRIPTION,
+    OP_COLUMN_DESCRIPTION,
+    OP_TABLE_TAGS,
+    OP_EXPOSURES_COMMIT
+)
+
+SERVER_URL="https://tableau.example.com"
+SITE_ID="site-id"
+TABLEAU_CREDS={"token": "token", "site": {"id": SITE_ID}}
+
+class stubbedStateStore:
+    """
+    Keeps the recorded sync state in a list.
+    """
+    def __init__(self):
+        self.records=[]
+
+    def record(self, luid, aspect, content, parent_luid=None):
+        self.records.append((luid, aspect, content, parent_luid))
+
+class stubbedTableauClient:
+    """
+    Stands in for tableauClient: failing_luids names the assets whose update fails.
+    """
+    def __init__(self, failing_luids=()):
+        self.failing_luids=set(failing_luids)
+        self.state_store=stubbedStateStore()
+        self.updates=[]
+
+    def update_table(self, luid, tableau_creds, **fields):
+        self.updates.append((luid, fields))
+        return luid not in self.failing_luids
+
+    def update_column_description(self, table_luid, column_luid, description, tableau_creds):
+        if column_luid in self.failing_luids:
+            raise RuntimeError("column update failed")
+        self.updates.append((column_luid, {"description": description}))
+        return True
+
+def plan():
+    sync_plan = syncPlan(SERVER_URL, SITE_ID, created_at=1000.0)
+    sync_plan.add(OP_TABLE_DESCRIPTION, "t1", "ORDERS", {"description": "Orders"}, "description", "Orders")
+    sync_plan.add(OP_TABLE_DESCRIPTION, "t2", "CUSTOMERS", {"description": "Customers"}, "description", "Customers")
+    sync_plan.add(
+        OP_COLUMN_DESCRIPTION, "c1", "ORDERS.ID", {"description": "Order id"}, "description", "Order id", parent_luid="t1"
+    )
+    return sync_plan
+
+def test_add_rejects_unknown_operations():
+    with pytest.raises(ValueError):
+        syncPlan(SERVER_URL, SITE_ID).add("table_owner", "t1", "ORDERS")
+
+def test_estimate_counts_requests_per_operation():
+    sync_plan = plan()
+    sync_plan.add(OP_EXPOSURES_COMMIT, None, "exposures", {"project_id": 1})
+    estimate = sync_plan.estimate(max_workers=2, request_seconds=1.0)
+    assert estimate["operations"] == {OP_TABLE_DESCRIPTION: 2, OP_COLUMN_DESCRIPTION: 1, OP_EXPOSURES_COMMIT: 1}
+    assert estimate["write_requests"] == 6
+    assert estimate["estimated_apply_seconds"] == 3.0
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "plan.json")
+    sync_plan = plan()
+    sync_plan.watermarks.append({"job_id": 12, "environment_id": 3, "run_id": 100})
+    sync_plan.save(path)
+    loaded = syncPlan.load(path)
+    assert loaded.to_dict() == sync_plan.to_dict()
+    assert loaded.operations[2]["parent_luid"] == "t1"
+
+def test_load_rejects_other_plan_versions(tmp_path):
+    path = str(tmp_path / "plan.json")
+    plan().save(path)
+    with open(path) as plan_file:
+        data = json.load(plan_file)
+    data["version"] = PLAN_VERSION + 1
+    with open(path, "w") as plan_file:
+        json.dump(data, plan_file)
+    with pytest.raises(ValueError):
+        syncPlan.load(path)
+
+def test_apply_rejects_a_plan_of_another_site():
+    with pytest.raises(ValueError):
+        apply_plan(plan(), stubbedTableauClient(), {"token": "token", "site": {"id": "other-site"}})
+
+def test_apply_rejects_operations_without_a_handler():
+    sync_plan = plan()
+    sync_plan.add(OP_EXPOSURES_COMMIT, None, "exposures", {"project_id": 1})
+    client = stubbedTableauClient()
+    with pytest.raises(ValueError):
+        apply_plan(sync_plan, client, TABLEAU_CREDS)
+    assert client.updates == []
+
+def test_apply_records_state_of_applied_operations_only():
+    client = stubbedTableauClient(failing_luids=["t2", "c1"])
+    result = apply_plan(plan(), client, TABLEAU_CREDS, max_workers=4)
+    assert result == {"applied": 1, "failed": 2, "failed_ids": [1, 2]}
+    assert client.state_store.records == [("t1", "description", "Orders", None)]
+
+def test_apply_uses_extra_handlers():
+    sync_plan = plan()
+    sync_plan.add(OP_TABLE_TAGS, "t1", "ORDERS", {"tags": ["dbt"]}, "tags", ["dbt"])
+    tagged = []
+    client = stubbedTableauClient()
+    handlers = {OP_TABLE_TAGS: lambda operation, creds: tagged.append(operation["luid"]) or True}
+    assert apply_plan(sync_plan, client, TABLEAU_CREDS, handlers=handlers)["failed"] == 0
+    assert tagged == ["t1"]
+    assert ("t1", "tags", ["dbt"], None) in client.state_store.records
+    assert ("c1", "description", "Order id", "t1") in client.state_store.records
@@ -0,0 +1,98 @@
+import sqlite3
+
+import pytest
+
+from dbt_tableau import sync_state
+from dbt_tableau.sync_state import syncStateStore, ASPECT_DESCRIPTION, ASPECT_TAGS
+
+DAY=86400
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000 * DAY]
+    monkeypatch.setattr(sync_state.time, "time", lambda: now[0])
+    return now
+
+@pytest.fixture
+def store(tmp_path):
+    store = syncStateStore(str(tmp_path / "state.db"), flush_every=2)
+    yield store
+    store.close()
+
+def test_is_current_compares_the_published_content(store):
+    store.record("t1", ASPECT_DESCRIPTION, "Orders")
+    assert store.is_current("t1", ASPECT_DESCRIPTION, "Orders")
+    assert not store.is_current("t1", ASPECT_DESCRIPTION, "All orders")
+    assert not store.is_current("t1", ASPECT_TAGS, ["finance"])
+    store.flush()
+    assert store.is_current("t1", ASPECT_DESCRIPTION, "Orders")
+
+def test_hash_of_dicts_ignores_key_order(store):
+    store.record("t1", ASPECT_TAGS, {"a": 1, "b": 2})
+    assert store.is_current("t1", ASPECT_TAGS, {"b": 2, "a": 1})
+
+def test_compact_keeps_entries_found_current(store, clock):
+    store.record("seen", ASPECT_DESCRIPTION, "Orders")
+    store.record("dropped", ASPECT_DESCRIPTION, "Customers")
+    store.flush()
+    clock[0] += 30 * DAY
+    # Unchanged since published 30 days ago, but still synced
+    assert store.is_current("seen", ASPECT_DESCRIPTION, "Orders")
+    clock[0] += 1 * DAY
+    assert store.compact(max_age_days=7) == 1
+    assert store.is_current("seen", ASPECT_DESCRIPTION, "Orders")
+    assert not store.is_current("dropped", ASPECT_DESCRIPTION, "Customers")
+
+def test_compact_without_max_age_keeps_everything(store, clock):
+    store.record("t1", ASPECT_DESCRIPTION, "Orders")
+    clock[0] += 365 * DAY
+    assert store.compact() == 0
+    assert store.is_current("t1", ASPECT_DESCRIPTION, "Orders")
+
+def test_store_without_last_seen_is_migrated(tmp_path, clock):
+    path = str(tmp_path / "state.db")
+    connection = sqlite3.connect(path)
+    connection.execute("""
+        CREATE TABLE sync_state (
+            luid TEXT NOT NULL,
+            aspect TEXT NOT NULL,
+            parent_luid TEXT,
+            content_hash TEXT NOT NULL,
+            synced_at REAL NOT NULL,
+            PRIMARY KEY (luid, aspect)
+        )
+    """)
+    connection.execute(
+        "INSERT INTO sync_state VALUES (?, ?, NULL, ?, ?)",
+        ("t1", ASPECT_DESCRIPTION, sync_state.content_hash("Orders"), clock[0] - 2 * DAY)
+    )
+    connection.commit()
+    connection.close()
+
+    store = syncStateStore(path)
+    assert store.is_current("t1", ASPECT_DESCRIPTION, "Orders")
+    assert store.compact(max_age_days=1) == 0
+    store.close()
+
+def test_forget_removes_the_columns_of_a_table(store):
+    store.record("t1", ASPECT_DESCRIPTION, "Orders")
+    store.record("c1", ASPECT_DESCRIPTION, "Order id", parent_luid="t1")
+    store.forget("t1")
+    assert not store.is_current("t1", ASPECT_DESCRIPTION, "Orders")
+    assert not store.is_current("c1", ASPECT_DESCRIPTION, "Order id")
+
+def test_watermarks(store):
+    assert store.get_watermarks() == {}
+    store.set_watermark(12, 3, {"executeCompletedAt": "2024-01-01T00:00:00Z", "runId": 100})
+    store.set_watermark(12, 3, {"executeCompletedAt": "2024-01-02T00:00:00Z", "runId": 101})
+    assert store.get_watermarks() == {("12", "3"): {"executeCompletedAt": "2024-01-02T00:00:00Z", "runId": "101"}}
+
+def test_binding_another_site_invalidates_the_state(store):
+    store.bind_site("https://tableau.example.com/", "site-1")
+    store.record("t1", ASPECT_DESCRIPTION, "Orders")
+    store.set_watermark(12, 3, {"executeCompletedAt": None, "runId": 100})
+    store.bind_site("https://tableau.example.com", "site-1")
+    assert store.is_current("t1", ASPECT_DESCRIPTION, "Orders")
+    store.bind_site("https://tableau.example.com", "site-2")
+    assert not store.is_current("t1", ASPECT_DESCRIPTION, "Orders")
+    assert store.get_watermarks() == {}
@@ -0,0 +1,79 @@
+from dbt_tableau.tableau import tableauClient, chunk_list
+
+TABLEAU_CREDS={"token": "token", "site": {"id": "site-id"}}
+
+def client(metadata_api):
+    tableau_client = tableauClient.__new__(tableauClient)
+    tableau_client._query_metadata_api = metadata_api
+    return tableau_client
+
+def columns(table_luid, count, start=0):
+    return [{"name": f"C{index}", "luid": f"{table_luid}-c{index}"} for index in range(start, start + count)]
+
+class stubbedColumnsApi:
+    """
+    Answers the column queries of the metadata API, paging the columns of each table.
+    """
+    def __init__(self, column_counts):
+        self.column_counts=column_counts
+        self.queries=[]
+
+    def __call__(self, query, variables, tableau_creds):
+        self.queries.append(variables)
+        first = variables["first"]
+        if "luids" in variables:
+            return {"databaseTables": [
+                {"luid": luid, "columnsConnection": self.page(luid, 0, first)} for luid in variables["luids"]
+            ]}
+        return {"databaseTables": [{"columnsConnection": self.page(variables["luid"], int(variables["after"]), first)}]}
+
+    def page(self, luid, start, first):
+        count = min(first, self.column_counts[luid] - start)
+        return {
+            "nodes": columns(luid, count, start),
+            "pageInfo": {"hasNextPage": start + count < self.column_counts[luid], "endCursor": str(start + count)}
+        }
+
+def test_chunk_list():
+    assert chunk_list(list(range(5)), 2) == [[0, 1], [2, 3], [4]]
+    assert chunk_list([], 2) == []
+
+def test_columns_are_fetched_in_chunks_of_tables():
+    column_counts = {f"t{index}": 3 for index in range(25)}
+    metadata_api = stubbedColumnsApi(column_counts)
+    # A table listed twice is requested once
+    merged_tables = [{"luid": luid} for luid in column_counts] + [{"luid": "t0"}]
+    columns_by_luid = client(metadata_api).get_columns_for_tables(merged_tables, TABLEAU_CREDS, chunk_size=10)
+    assert [len(query["luids"]) for query in metadata_api.queries] == [10, 10, 5]
+    assert columns_by_luid["t24"] == columns("t24", 3)
+
+def test_chunks_stay_within_the_node_limit_and_wide_tables_are_paged():
+    metadata_api = stubbedColumnsApi({"narrow": 2, "wide": 2500})
+    columns_by_luid = client(metadata_api).get_columns_for_tables(
+        [{"luid": "narrow"}, {"luid": "wide"}], TABLEAU_CREDS, chunk_size=100, column_page_size=1000
+    )
+    assert metadata_api.queries[0] == {"luids": ["narrow", "wide"], "first": 1000}
+    assert [query.get("after") for query in metadata_api.queries[1:]] == ["1000", "2000"]
+    assert columns_by_luid["wide"] == columns("wide", 2500)
+    assert len(columns_by_luid["narrow"]) == 2
+    # 20 tables of 1000 columns already reach the 20000 node limit of a query
+    metadata_api = stubbedColumnsApi({f"t{index}": 1 for index in range(30)})
+    client(metadata_api).get_columns_for_tables([{"luid": f"t{index}"} for index in range(30)], TABLEAU_CREDS)
+    assert [len(query["luids"]) for query in metadata_api.queries] == [20, 10]
+
+def test_downstream_workbooks_are_returned_once():
+    queries = []
+
+    def metadata_api(query, variables, tableau_creds):
+        queries.append(variables["luids"])
+        return {"databaseTables": [
+            {"luid": luid, "downstreamWorkbooks": [{"luid": "shared", "name": "Sales"}, {"luid": f"w-{luid}", "name": luid}]}
+            for luid in variables["luids"]
+        ]}
+
+    merged_tables = [{"luid": f"t{index}"} for index in range(3)]
+    workbooks = client(metadata_api).get_downstream_workbooks_for_tables(merged_tables, TABLEAU_CREDS, chunk_size=2)
+    assert queries == [["t0", "t1"], ["t2"]]
+    assert sorted(workbooks) == ["shared", "w-t0", "w-t1", "w-t2"]
+    assert workbooks["shared"]["downstreamOfTables"] == ["t0", "t1", "t2"]
+    assert workbooks["w-t1"]["downstreamOfTables"] == ["t1"]
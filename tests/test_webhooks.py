@@ -0,0 +1,137 @@
+import asyncio
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from dbt_tableau.webhooks import (
+    runQueue,
+    serve_webhooks,
+    sign_payload,
+    verify_signature,
+    parse_run_completed,
+    is_configured_run,
+    retry_delay,
+    model_table_names,
+    DEFAULT_WEBHOOK_PATH,
+    EVENT_RUN_COMPLETED
+)
+
+SECRET="webhook-secret"
+
+def run_completed(job_id=12, run_id=100, environment_id="3"):
+    return {
+        "eventId": f"event-{run_id}",
+        "eventType": EVENT_RUN_COMPLETED,
+        "data": {"jobId": str(job_id), "runId": str(run_id), "environmentId": environment_id, "runStatus": "Success"}
+    }
+
+def run(run_id, job_id=12):
+    return {"job_id": job_id, "run_id": run_id}
+
+def test_verify_signature():
+    body = json.dumps(run_completed()).encode("utf-8")
+    assert verify_signature(SECRET, body, sign_payload(SECRET, body))
+    assert verify_signature(SECRET, body, " " + sign_payload(SECRET, body) + "\n")
+    assert not verify_signature(SECRET, body, sign_payload("other-secret", body))
+    assert not verify_signature(SECRET, body + b" ", sign_payload(SECRET, body))
+    assert not verify_signature(SECRET, body, None)
+    assert not verify_signature(SECRET, body, "")
+
+def test_parse_run_completed():
+    assert parse_run_completed(run_completed()) == {
+        "job_id": 12, "run_id": 100, "environment_id": "3", "status": "Success", "event_id": "event-100"
+    }
+    assert parse_run_completed({"eventType": "job.run.started", "data": {}}) is None
+
+def test_is_configured_run():
+    received = parse_run_completed(run_completed(job_id=12, environment_id="3"))
+    assert is_configured_run(received)
+    assert is_configured_run(received, ["12", "13"], 3)
+    assert not is_configured_run(received, ["13"])
+    assert not is_configured_run(received, None, "4")
+
+def test_retry_delay_doubles_up_to_the_cap():
+    assert [retry_delay(attempt, 10, 60) for attempt in range(2, 7)] == [10, 20, 40, 60, 60]
+
+def test_model_table_names():
+    models = [{"name": "fct_orders", "alias": "Orders"}, {"name": "customers", "alias": None}]
+    assert model_table_names(models) == ["CUSTOMERS", "ORDERS", "Orders", "customers", "orders"]
+    assert model_table_names(models, max_names=4) is None
+
+def test_queue_coalesces_runs_and_duplicates():
+    async def coalesce():
+        queue = runQueue(asyncio.get_running_loop())
+        queue.put(run(1))
+        queue.put(run(2, job_id=13))
+        # dbt Cloud delivers a webhook again when it timed out
+        queue.put(run(1))
+        batch = await queue.get_batch(coalesce_seconds=0.01)
+        queue.put(run(3))
+        return batch, await queue.get_batch(coalesce_seconds=0)
+
+    first_batch, second_batch = asyncio.run(coalesce())
+    assert [queued["run_id"] for queued in first_batch] == [1, 2]
+    assert [queued["run_id"] for queued in second_batch] == [3]
+
+def test_queue_batches_at_most_max_runs():
+    async def batches():
+        queue = runQueue(asyncio.get_running_loop())
+        for run_id in range(5):
+            queue.put(run(run_id))
+        first_batch = await queue.get_batch(coalesce_seconds=0.01, max_runs=3)
+        return first_batch, await queue.get_batch(coalesce_seconds=0, max_runs=3), len(queue)
+
+    first_batch, second_batch, left = asyncio.run(batches())
+    assert [queued["run_id"] for queued in first_batch] == [0, 1, 2]
+    assert [queued["run_id"] for queued in second_batch] == [3, 4]
+    assert left == 0
+
+def test_requeued_runs_count_their_attempts():
+    async def requeue():
+        queue = runQueue(asyncio.get_running_loop())
+        queue.requeue([run(1), dict(run(2), attempts=3)], delay=0.01)
+        assert len(queue) == 0
+        return await asyncio.wait_for(queue.get_batch(coalesce_seconds=0), timeout=5)
+
+    batch = asyncio.run(requeue())
+    assert [(queued["run_id"], queued["attempts"]) for queued in batch] == [(1, 2), (2, 4)]
+
+@pytest.fixture
+def webhook_server():
+    received = []
+    server = serve_webhooks(received.append, SECRET, 0, job_ids=["12"], environment_id="3")
+    yield f"http://127.0.0.1:{server.server_address[1]}", received
+    server.shutdown()
+    server.server_close()
+
+def post(url, payload, secret=SECRET):
+    body = json.dumps(payload).encode("utf-8")
+    request = urllib.request.Request(
+        url + DEFAULT_WEBHOOK_PATH,
+        data=body,
+        headers={"Authorization": sign_payload(secret, body), "Content-Type": "application/json"}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, json.loads(response.read())["message"]
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())["message"]
+
+def test_server_queues_signed_runs_of_the_synced_jobs(webhook_server):
+    url, received = webhook_server
+    assert post(url, run_completed()) == (200, "queued")
+    assert [queued["run_id"] for queued in received] == [100]
+
+def test_server_rejects_a_wrong_signature(webhook_server):
+    url, received = webhook_server
+    assert post(url, run_completed(), secret="other-secret") == (401, "invalid signature")
+    assert received == []
+
+def test_server_ignores_other_jobs_and_environments(webhook_server):
+    url, received = webhook_server
+    assert post(url, run_completed(job_id=99)) == (200, "ignored")
+    assert post(url, run_completed(environment_id="4")) == (200, "ignored")
+    assert post(url, {"eventType": "job.run.started", "data": {}}) == (200, "ignored")
+    assert received == []
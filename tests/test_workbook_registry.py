@@ -0,0 +1,48 @@
+from dbt_tableau.workbook_registry import workbookRegistry
+
+def workbook(luid, *upstream_luids):
+    return {
+        "luid": luid,
+        "name": f"Workbook {luid}",
+        "upstreamTables": [{"luid": table_luid, "name": table_luid.upper()} for table_luid in upstream_luids]
+    }
+
+def test_workbook_found_through_several_tables_is_stored_once():
+    registry = workbookRegistry()
+    registry.add(workbook("w1", "t1"), [(1, 10)], ["t1"])
+    registry.add(workbook("w1", "t1", "t2"), [(1, 10), (2, 20)], ["t2"])
+    assert len(registry) == 1
+    assert "w1" in registry and "w2" not in registry
+    merged = registry.get("w1")
+    assert merged["name"] == "Workbook w1"
+    assert [table["luid"] for table in merged["upstreamTables"]] == ["t1", "t2"]
+    assert merged["downstreamOfTables"] == ["t1", "t2"]
+    assert merged["dbt_projects"] == [(1, 10), (2, 20)]
+
+def test_add_downstream_workbooks_uses_the_projects_of_their_tables():
+    merged_tables_by_luid = {
+        "t1": {"luid": "t1", "projectId": 1, "environmentId": 10},
+        "t2": {"luid": "t2", "projectId": 2}
+    }
+    downstream_workbooks = {
+        "w1": dict(workbook("w1", "t1"), downstreamOfTables=["t1", "t2"]),
+        "w2": dict(workbook("w2", "t2"), downstreamOfTables=["t2"])
+    }
+    registry = workbookRegistry()
+    registry.add_downstream_workbooks(downstream_workbooks, merged_tables_by_luid)
+    assert registry.get("w1")["dbt_projects"] == [(1, 10), (2, None)]
+    assert registry.get("w2")["dbt_projects"] == [(2, None)]
+    assert registry.project_ids() == [1, 2]
+
+def test_workbooks_are_grouped_by_project():
+    registry = workbookRegistry()
+    # The workbooks of a project are not added next to each other
+    registry.add(workbook("w1", "t1"), [(1, 10)])
+    registry.add(workbook("w2", "t2"), [(2, 20)])
+    registry.add(workbook("w3", "t3"), [(1, 10), (1, 11), (2, 20)])
+    grouped = registry.workbooks_by_project()
+    assert {project_id: [workbook["luid"] for workbook in workbooks] for project_id, workbooks in grouped.items()} == {
+        1: ["w1", "w3"],
+        2: ["w2", "w3"]
+    }
+    assert [workbook["luid"] for workbook in registry] == ["w1", "w2", "w3"]